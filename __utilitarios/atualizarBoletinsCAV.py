@@ -8,15 +8,35 @@ pip install supabase python-dotenv
 
 Uso:
 python atualizarBoletinsCAV.py
+
+Para rodar sem interação (cron, vários arquivos de uma vez), veja importacao.py.
 """
 
+import io
 import os
 import sys
-import csv
-from typing import List, Dict, Any
+import math
+import hashlib
+from decimal import Decimal, ROUND_HALF_UP
+from contextlib import redirect_stdout
+from functools import partial
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import TYPE_CHECKING, List, Dict, Set, Any, Iterable, Iterator, Callable, Optional, Tuple
 from datetime import datetime
-from supabase import create_client, Client
+from supabase import Client
 from dotenv import load_dotenv
+from ingestaoCSV import abrir_csv
+import validacaoColunar
+from checkpointImportacao import CheckpointImportacao, impressao_arquivo
+from instrumentacao import metricas
+from armazenamento import (BackendArmazenamento, BackendSupabase, BackendPostgres, COLUNAS_HORAS_AGREGADO, backend_local_configurado,
+                           backend_postgres_configurado, cliente_supabase_configurado, como_backend, falha_de_conexao)
+from referenciasCAV import ReferenciasCAV, REFERENCIAS_PADRAO, LAMINA_ALVO_PADRAO, DICA_REFERENCIA_DESCONHECIDA, carregar_referencias
+from horasFrotaCAV import IndiceHorasFrota, calcular_utilizacao
+
+if TYPE_CHECKING:  # só nas anotações: quem usa o snapshot o abre (abrir_snapshot)
+    from snapshotBoletinsCAV import SnapshotBoletins
 
 # Carrega variáveis de ambiente do arquivo .env.local da raiz do projeto
 # Obtém o diretório raiz do projeto (um nível acima da pasta __utilitarios)
@@ -24,31 +44,49 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 env_path = os.path.join(project_root, '.env.local')
 load_dotenv(env_path)
 
+# Chave de agrupamento dos agregados: (data, frente, codigo, setor)
+ChaveGrupo = Tuple[str, str, str, str]
+
+# Linhas por bloco no motor de validação colunar
+TAMANHO_BLOCO_VALIDACAO = 50000
+
+# Linhas lidas por vez no motor linha a linha (pequeno, para o preview e o envio começarem logo)
+TAMANHO_BLOCO_LINHA = 1000
+
+# Processos usados para ler e validar vários arquivos ao mesmo tempo
+PROCESSOS_PADRAO = os.cpu_count() or 1
+
+# Quantidade de registros enviados por requisição nas inserções em lote
+TAMANHO_LOTE_PADRAO = 500
+
+# Execução concorrente dos lotes: threads simultâneas
+WORKERS_PADRAO = 4
+
+# Onde os agregados são calculados: 'cliente' (neste script, calcular_agregados) ou
+# 'servidor' (função recalcular_agregados_cav no banco, a partir dos boletins gravados)
+MODOS_AGREGACAO = ('cliente', 'servidor')
+AGREGACAO_PADRAO = 'cliente'
+
+# Chaves (data, frente, codigo, setor) enviadas por chamada de recalcular_agregados_cav
+CHAVES_POR_RECALCULO = 5000
+
+# Campos que identificam um boletim em hash_boletim (mesma ordem da migração que criou a coluna)
+CAMPOS_HASH_BOLETIM = ('data', 'codigo', 'frente', 'setor', 'frota', 'turno', 'operador', 'producao')
+
+# Linhas por requisição na leitura dos hashes já gravados (limite padrão de linhas do PostgREST)
+TAMANHO_PAGINA_HASHES = 1000
+
+# Lotes sem nenhum boletim de uma data após os quais os hashes da data (vistos no arquivo e já
+# gravados no banco) saem da memória: a deduplicação da importação fica limitada às datas recentes
+LOTES_JANELA_DEDUPLICACAO = 4
+
 def get_supabase_client() -> Client:
-    """Cria e retorna cliente do Supabase"""
-    
-    # Configurações do Supabase
-    url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
-    service_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-    
-    if not url:
-        print("❌ ERRO: NEXT_PUBLIC_SUPABASE_URL não encontrada nas variáveis de ambiente")
-        print("Configure as variáveis de ambiente ou crie um arquivo .env.local com:")
-        print("NEXT_PUBLIC_SUPABASE_URL=sua_url_aqui")
-        print("SUPABASE_SERVICE_ROLE_KEY=sua_service_key_aqui")
-        sys.exit(1)
-    
-    if not service_key:
-        print("❌ ERRO: SUPABASE_SERVICE_ROLE_KEY não encontrada nas variáveis de ambiente")
-        print("Configure as variáveis de ambiente ou crie um arquivo .env.local com:")
-        print("NEXT_PUBLIC_SUPABASE_URL=sua_url_aqui")
-        print("SUPABASE_SERVICE_ROLE_KEY=sua_service_key_aqui")
-        sys.exit(1)
+    """Retorna o cliente do Supabase compartilhado pelos scripts (conexões reutilizadas, timeouts e retry)"""
     
-    return create_client(url, service_key)
+    return cliente_supabase_configurado()
 
-def ler_boletins_csv() -> List[Dict[str, Any]]:
-    """Lê o arquivo CSV de boletins CAV e retorna lista de boletins"""
+def localizar_arquivo_boletins() -> str:
+    """Procura o arquivo CSV de boletins CAV na pasta __utilitarios/"""
     
     # Procura por arquivos CSV com padrões comuns para boletins
     possibles_files = [
@@ -58,144 +96,242 @@ def ler_boletins_csv() -> List[Dict[str, Any]]:
         'dados_cav.csv'
     ]
     
-    arquivo_csv = None
     for filename in possibles_files:
         filepath = os.path.join(os.path.dirname(__file__), filename)
         if os.path.exists(filepath):
-            arquivo_csv = filepath
-            break
-    
-    if not arquivo_csv:
-        print("❌ ERRO: Nenhum arquivo CSV encontrado")
-        print("Arquivos procurados:")
-        for filename in possibles_files:
-            print(f"  - {filename}")
-        print("\nCertifique-se de que o arquivo CSV está na pasta __utilitarios/")
-        sys.exit(1)
+            return filepath
     
-    print(f"📁 Usando arquivo: {os.path.basename(arquivo_csv)}")
-    
-    boletins = []
+    print("❌ ERRO: Nenhum arquivo CSV encontrado")
+    print("Arquivos procurados:")
+    for filename in possibles_files:
+        print(f"  - {filename}")
+    print("\nCertifique-se de que o arquivo CSV está na pasta __utilitarios/")
+    sys.exit(1)
+
+def _validar_boletim(i: int, row: Dict[str, str], referencias: ReferenciasCAV = REFERENCIAS_PADRAO) -> Optional[Dict[str, Any]]:
+    """Normaliza e valida uma linha do CSV; retorna None (com aviso) se a linha deve ser pulada"""
     
     try:
-        # Tenta várias codificações comuns
-        encodings = ['utf-8', 'windows-1252', 'iso-8859-1', 'cp1252']
-        file_content = None
-        used_encoding = None
+        # Adapte estas colunas conforme o CSV que você fornecerá
+        boletim = {
+            'data': row.get('data', '').strip(),
+            'codigo': row.get('codigo', '').strip(),
+            'frente': row.get('frente', '').strip(),
+            'setor': row.get('setor', '').strip().upper(),
+            'frota': int(row.get('frota', 0)) if row.get('frota', '').strip() else None,
+            'turno': row.get('turno', '').strip().upper(),
+            'operador': row.get('operador', '').strip(),
+            'producao': float(row.get('producao', 0)) if row.get('producao', '').strip() else 0.0,
+            'observacoes': row.get('observacoes', '').strip() if row.get('observacoes') else None
+        }
         
-        for encoding in encodings:
-            try:
-                with open(arquivo_csv, 'r', encoding=encoding) as file:
-                    file_content = file.read()
-                    used_encoding = encoding
-                    break
-            except UnicodeDecodeError:
-                continue
+        # Valida dados obrigatórios
+        if not boletim['data']:
+            metricas.detalhe(f"⚠️  Linha {i}: Data vazia, pulando...")
+            return None
+            
+        if not boletim['codigo']:
+            metricas.detalhe(f"⚠️  Linha {i}: Código vazio, pulando...")
+            return None
+            
+        if not boletim['frente']:
+            metricas.detalhe(f"⚠️  Linha {i}: Frente vazia, pulando...")
+            return None
+            
+        if not boletim['setor']:
+            metricas.detalhe(f"⚠️  Linha {i}: Setor vazio, pulando...")
+            return None
         
-        if file_content is None:
-            raise Exception("Não foi possível decodificar o arquivo CSV com nenhuma codificação testada")
+        if boletim['frota'] is None:
+            metricas.detalhe(f"⚠️  Linha {i}: Frota vazia, pulando...")
+            return None
         
-        print(f"📝 Arquivo CSV lido com codificação: {used_encoding}")
+        if not boletim['turno']:
+            metricas.detalhe(f"⚠️  Linha {i}: Turno vazio, pulando...")
+            return None
         
-        # Agora processa o conteúdo
-        from io import StringIO
-        file = StringIO(file_content)
+        # Valida setor (um valor desconhecido faz as referências serem relidas do banco uma vez)
+        if not referencias.aceita('setor', boletim['setor']):
+            metricas.detalhe(f"⚠️  Linha {i}: Setor inválido '{boletim['setor']}' ({DICA_REFERENCIA_DESCONHECIDA}), pulando...")
+            return None
         
-        # Detecta o delimitador (pode ser ; ou ,)
-        sample = file.read(1024)
-        file.seek(0)
+        # Valida frente
+        if not referencias.aceita('frente', boletim['frente']):
+            metricas.detalhe(f"⚠️  Linha {i}: Frente inválida '{boletim['frente']}' ({DICA_REFERENCIA_DESCONHECIDA}), pulando...")
+            return None
         
-        if ';' in sample:
-            delimiter = ';'
-        else:
-            delimiter = ','
+        # Valida turno
+        if not referencias.aceita('turno', boletim['turno']):
+            metricas.detalhe(f"⚠️  Linha {i}: Turno inválido '{boletim['turno']}' ({DICA_REFERENCIA_DESCONHECIDA}), pulando...")
+            return None
         
-        print(f"🔍 Delimitador detectado: '{delimiter}'")
+        # Valida produção (o banco exige producao >= 0)
+        if not math.isfinite(boletim['producao']) or boletim['producao'] < 0:
+            metricas.detalhe(f"⚠️  Linha {i}: Produção inválida '{boletim['producao']}', pulando...")
+            return None
         
-        reader = csv.DictReader(file, delimiter=delimiter)
+        # Converte data para formato ISO se necessário
+        # Assumindo formato dd/MM/yyyy ou yyyy-MM-dd
+        try:
+            if '/' in boletim['data']:
+                # Formato dd/MM/yyyy
+                data_obj = datetime.strptime(boletim['data'], '%d/%m/%Y')
+                boletim['data'] = data_obj.strftime('%Y-%m-%d')
+            elif '-' in boletim['data'] and len(boletim['data']) == 10:
+                # Formato yyyy-MM-dd (já correto)
+                datetime.strptime(boletim['data'], '%Y-%m-%d')  # Valida apenas
+            else:
+                raise ValueError("Formato de data não reconhecido")
+        except ValueError as e:
+            metricas.detalhe(f"⚠️  Linha {i}: Data inválida '{boletim['data']}', pulando...")
+            return None
         
-        print("📋 Colunas encontradas no CSV:")
-        for col in reader.fieldnames:
-            print(f"  - {col}")
-        print()
+        return boletim
         
-        for i, row in enumerate(reader, 1):
-            try:
-                # Adapte estas colunas conforme o CSV que você fornecerá
-                boletim = {
-                    'data': row.get('data', '').strip(),
-                    'codigo': row.get('codigo', '').strip(),
-                    'frente': row.get('frente', '').strip(),
-                    'setor': row.get('setor', '').strip().upper(),
-                    'frota': int(row.get('frota', 0)) if row.get('frota', '').strip() else None,
-                    'turno': row.get('turno', '').strip().upper(),
-                    'operador': row.get('operador', '').strip(),
-                    'producao': float(row.get('producao', 0)) if row.get('producao', '').strip() else 0.0,
-                    'observacoes': row.get('observacoes', '').strip() if row.get('observacoes') else None
-                }
-                
-                # Valida dados obrigatórios
-                if not boletim['data']:
-                    print(f"⚠️  Linha {i}: Data vazia, pulando...")
-                    continue
-                    
-                if not boletim['codigo']:
-                    print(f"⚠️  Linha {i}: Código vazio, pulando...")
-                    continue
-                    
-                if not boletim['frente']:
-                    print(f"⚠️  Linha {i}: Frente vazia, pulando...")
-                    continue
-                    
-                if not boletim['setor']:
-                    print(f"⚠️  Linha {i}: Setor vazio, pulando...")
-                    continue
-                
-                # Valida setor
-                if boletim['setor'] not in ['GUA', 'MOE', 'ALE']:
-                    print(f"⚠️  Linha {i}: Setor inválido '{boletim['setor']}', pulando...")
-                    continue
-                
-                # Valida frente
-                frentes_validas = ['Frente 1', 'Frente 2', 'Frente 3', 'Iturama', 'Ouroeste']
-                if boletim['frente'] not in frentes_validas:
-                    print(f"⚠️  Linha {i}: Frente inválida '{boletim['frente']}', pulando...")
-                    continue
-                
-                # Valida turno
-                if boletim['turno'] and boletim['turno'] not in ['A', 'B', 'C']:
-                    print(f"⚠️  Linha {i}: Turno inválido '{boletim['turno']}', pulando...")
-                    continue
-                
-                # Converte data para formato ISO se necessário
-                # Assumindo formato dd/MM/yyyy ou yyyy-MM-dd
-                try:
-                    if '/' in boletim['data']:
-                        # Formato dd/MM/yyyy
-                        data_obj = datetime.strptime(boletim['data'], '%d/%m/%Y')
-                        boletim['data'] = data_obj.strftime('%Y-%m-%d')
-                    elif '-' in boletim['data'] and len(boletim['data']) == 10:
-                        # Formato yyyy-MM-dd (já correto)
-                        datetime.strptime(boletim['data'], '%Y-%m-%d')  # Valida apenas
-                    else:
-                        raise ValueError("Formato de data não reconhecido")
-                except ValueError as e:
-                    print(f"⚠️  Linha {i}: Data inválida '{boletim['data']}', pulando...")
-                    continue
-                
-                boletins.append(boletim)
-                
-            except Exception as e:
-                print(f"❌ Linha {i}: Erro ao processar linha: {e}")
-                continue
+    except Exception as e:
+        metricas.detalhe(f"❌ Linha {i}: Erro ao processar linha: {e}")
+        return None
+
+def iterar_boletins_csv(arquivo_csv: str, exibir_cabecalho: bool = True, motor: str = 'linha',
+                        referencias: Optional[ReferenciasCAV] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lê o CSV de boletins em streaming, produzindo cada boletim válido assim que é lido.
+    Com motor='colunar', valida blocos de linhas coluna a coluna (validacaoColunar),
+    com os mesmos boletins aceitos e as mesmas mensagens de rejeição.
+    Frentes, setores e turnos aceitos vêm de `referencias` (padrão: REFERENCIAS_PADRAO).
+    """
+    
+    if motor not in ('linha', 'colunar'):
+        raise ValueError(f"Motor de validação desconhecido: {motor}")
+    
+    referencias = referencias or REFERENCIAS_PADRAO
+    validar_linha = partial(_validar_boletim, referencias=referencias)
+    
+    if exibir_cabecalho:
+        print(f"📁 Usando arquivo: {os.path.basename(arquivo_csv)}")
+    
+    try:
+        with abrir_csv(arquivo_csv) as (reader, used_encoding, delimiter):
+            if exibir_cabecalho:
+                print(f"📝 Arquivo CSV lido com codificação: {used_encoding}")
+                print(f"🔍 Delimitador detectado: '{delimiter}'")
+                print("📋 Colunas encontradas no CSV:")
+                for col in reader.fieldnames or []:
+                    print(f"  - {col}")
+                if motor == 'colunar':
+                    print("🧮 Validação colunar ativada")
+                print()
+            
+            # Decodificação e validação são lidas/medidas por bloco, não por linha
+            if motor == 'linha':
+                for bloco in metricas.medir_iteracao('leitura_csv', _em_lotes(enumerate(reader, 1), TAMANHO_BLOCO_LINHA)):
+                    with metricas.cronometro('validacao'):
+                        validos = [boletim for boletim in (validar_linha(i, row) for i, row in bloco) if boletim is not None]
+                    metricas.contar('linhas_lidas', len(bloco))
+                    metricas.contar('linhas_rejeitadas', len(bloco) - len(validos))
+                    yield from validos
+                return
+            
+            # Lê blocos direto do csv.reader (linhas em branco não contam, como no DictReader)
+            cabecalho = reader.fieldnames or []
+            linhas_nao_vazias = (linha for linha in reader.reader if linha)
+            primeira_linha = 1
+            for bloco in metricas.medir_iteracao('leitura_csv', _em_lotes(linhas_nao_vazias, TAMANHO_BLOCO_VALIDACAO)):
+                with metricas.cronometro('validacao'):
+                    validos = validacaoColunar.validar_bloco(
+                        cabecalho, bloco, primeira_linha,
+                        referencias.setores, referencias.frentes, referencias.turnos, validar_linha
+                    )
+                metricas.contar('linhas_lidas', len(bloco))
+                metricas.contar('linhas_rejeitadas', len(bloco) - len(validos))
+                yield from validos
+                primeira_linha += len(bloco)
                 
     except Exception as e:
         print(f"❌ ERRO ao ler arquivo CSV: {e}")
         sys.exit(1)
+
+def ler_boletins_csv() -> List[Dict[str, Any]]:
+    """Lê o arquivo CSV de boletins CAV e retorna lista de boletins"""
+    
+    return list(iterar_boletins_csv(localizar_arquivo_boletins()))
+
+def _ler_arquivo_em_processo(arquivo_csv: str, motor: str, referencias: Optional[ReferenciasCAV]) -> Tuple[Optional[List[Tuple]], str, Dict[str, Any]]:
+    """
+    Lê e valida um arquivo dentro de um processo do pool. Retorna os boletins como tuplas
+    (na ordem de validacaoColunar.CAMPOS, mais baratas de enviar entre processos), as
+    mensagens impressas e as métricas do processo; boletins é None se o arquivo não pôde ser lido.
+    """
     
-    return boletins
+    saida = io.StringIO()
+    metricas.reiniciar()
+    boletins = None
+    with redirect_stdout(saida):
+        try:
+            boletins = [
+                tuple(boletim[campo] for campo in validacaoColunar.CAMPOS)
+                for boletim in iterar_boletins_csv(arquivo_csv, exibir_cabecalho=False, motor=motor, referencias=referencias)
+            ]
+        except SystemExit:
+            pass
+    return boletins, saida.getvalue(), metricas.resumo()
 
-def verificar_tabelas_cav(supabase: Client):
+def ler_boletins_arquivos(arquivos_csv: List[str], motor: str = 'linha', processos: int = PROCESSOS_PADRAO,
+                          referencias: Optional[ReferenciasCAV] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lê e valida vários CSVs de boletins em paralelo (um arquivo por processo) e retorna os
+    boletins de todos eles, na ordem dos arquivos, para uma única importação: os grupos
+    (data, frente, codigo, setor) que aparecem em mais de um arquivo viram um só agregado.
+    Arquivos com conteúdo idêntico são lidos uma única vez. Todos os arquivos são lidos antes
+    de qualquer gravação; se algum falhar, encerra sem gravar nada.
+    """
+    
+    # Descarta cópias do mesmo arquivo (ex.: o mesmo dia exportado duas vezes)
+    unicos = []
+    impressoes = {}
+    for arquivo in arquivos_csv:
+        impressao = impressao_arquivo(arquivo)
+        if impressao in impressoes:
+            print(f"⏭️  {os.path.basename(arquivo)} é idêntico a {os.path.basename(impressoes[impressao])}, ignorado")
+            continue
+        impressoes[impressao] = arquivo
+        unicos.append(arquivo)
+    
+    # Nos processos do pool as referências não podem ser relidas do banco ao surgir um valor
+    # desconhecido (ReferenciasCAV.aceita); as que vieram do cache são conferidas antes
+    if referencias is not None and referencias.do_cache:
+        referencias.recarregar()
+    
+    processos = max(1, min(processos, len(unicos)))
+    print(f"⚙️  Lendo {len(unicos)} arquivo(s) com {processos} processo(s)...")
+    
+    with metricas.cronometro('leitura_paralela'), ProcessPoolExecutor(max_workers=processos) as executor:
+        resultados = list(executor.map(_ler_arquivo_em_processo, unicos, [motor] * len(unicos), [referencias] * len(unicos)))
+    
+    falhas = []
+    lidos = []
+    for arquivo, (boletins, mensagens, resumo) in zip(unicos, resultados):
+        metricas.mesclar(resumo)
+        if mensagens:
+            print(mensagens, end='')
+        if boletins is None:
+            falhas.append(arquivo)
+            continue
+        lidos.append(boletins)
+        print(f"✅ {os.path.basename(arquivo)}: {len(boletins)} boletins válidos")
+    
+    if falhas:
+        print(f"❌ {len(falhas)} arquivo(s) não puderam ser lidos; nada foi gravado:")
+        for arquivo in falhas:
+            print(f"  - {arquivo}")
+        sys.exit(1)
+    
+    total = sum(len(boletins) for boletins in lidos)
+    print(f"📋 {total} boletins válidos em {len(lidos)} arquivo(s)")
+    
+    return (dict(zip(validacaoColunar.CAMPOS, valores)) for boletins in lidos for valores in boletins)
+
+def verificar_tabelas_cav(backend: BackendArmazenamento):
     """Verifica se as tabelas CAV existem"""
     
     print("🔍 Verificando se as tabelas CAV existem...")
@@ -204,7 +340,7 @@ def verificar_tabelas_cav(supabase: Client):
     
     # Verifica boletins_cav
     try:
-        result = supabase.table('boletins_cav').select('id').limit(1).execute()
+        backend.verificar_tabela('boletins_cav')
         print("✅ Tabela 'boletins_cav' encontrada!")
     except Exception as e:
         print(f"⚠️  Tabela 'boletins_cav' não encontrada: {e}")
@@ -212,7 +348,7 @@ def verificar_tabelas_cav(supabase: Client):
     
     # Verifica boletins_cav_agregado
     try:
-        result = supabase.table('boletins_cav_agregado').select('id').limit(1).execute()
+        backend.verificar_tabela('boletins_cav_agregado')
         print("✅ Tabela 'boletins_cav_agregado' encontrada!")
     except Exception as e:
         print(f"⚠️  Tabela 'boletins_cav_agregado' não encontrada: {e}")
@@ -225,14 +361,17 @@ def verificar_tabelas_cav(supabase: Client):
     
     return True
 
-def calcular_agregados(boletins_por_grupo: Dict) -> Dict[str, Any]:
+def calcular_agregados(boletins_por_grupo: Dict, lamina_alvo: float = LAMINA_ALVO_PADRAO) -> Dict[str, Any]:
     """Calcula os valores agregados para um grupo de boletins"""
     
-    lamina_alvo = 2.5  # Valor padrão usado no sistema
-    
     # Soma a produção total
     total_producao = sum(b['producao'] for b in boletins_por_grupo)
     
+    return calcular_agregados_por_total(total_producao, lamina_alvo)
+
+def calcular_agregados_por_total(total_producao: float, lamina_alvo: float = LAMINA_ALVO_PADRAO) -> Dict[str, Any]:
+    """Calcula os valores agregados a partir da produção total já somada do grupo (lâmina alvo da frente)"""
+    
     # Para este script, assumimos que total_viagens_feitas será fornecido
     # ou calculado de alguma forma. Por agora, vamos usar um valor padrão
     # que pode ser ajustado conforme necessário
@@ -256,121 +395,674 @@ def calcular_agregados(boletins_por_grupo: Dict) -> Dict[str, Any]:
         'dif_lamina_perc': round(dif_lamina_perc, 2)
     }
 
-def inserir_boletins(supabase: Client, boletins: List[Dict[str, Any]]):
-    """Insere os boletins nas tabelas"""
+class AgregadorBoletins:
+    """
+    Acumula em uma única passada a produção de cada grupo (data, frente, codigo, setor),
+    usando tuplas como chave, e calcula os agregados de todos os grupos de uma vez.
+    A soma segue a ordem dos boletins, então os valores são idênticos aos de calcular_agregados.
+    A lâmina alvo de cada grupo é a da sua frente em `referencias`.
+    
+    Com `horas` (ler_horas_frota_csv), cada boletim é ligado às horas da sua frota no dia pelo
+    índice (data, frota), na mesma passada, e os agregados ganham as colunas de utilização
+    (calcular_utilizacao), com as horas de cada frota repartidas pela sua produção nos grupos.
+    """
+    
+    def __init__(self, referencias: Optional[ReferenciasCAV] = None, horas: Optional[IndiceHorasFrota] = None):
+        self.referencias = referencias or REFERENCIAS_PADRAO
+        self.producao: Dict[ChaveGrupo, float] = {}
+        self.registros: Dict[ChaveGrupo, List[Any]] = {}
+        self.horas = horas
+        # [produção, boletins] de cada frota com horas: por grupo e no dia (base da repartição)
+        self.frotas: Dict[ChaveGrupo, Dict[int, List[float]]] = {}
+        self.totais_frota: Dict[Tuple[str, int], List[float]] = {}
+        self.boletins_com_horas = 0
+    
+    def adicionar(self, boletim: Dict[str, Any]) -> ChaveGrupo:
+        """Soma o boletim ao seu grupo (e guarda o id, se houver) e retorna a chave do grupo"""
+        
+        chave = (boletim['data'], boletim['frente'], boletim['codigo'], boletim['setor'])
+        self.producao[chave] = self.producao.get(chave, 0) + boletim['producao']
+        
+        if boletim.get('id') is not None:
+            self.registros.setdefault(chave, []).append(boletim['id'])
+        
+        frota_dia = (boletim['data'], boletim.get('frota'))
+        if self.horas is not None and frota_dia in self.horas:
+            parcial = self.frotas.setdefault(chave, {}).setdefault(boletim['frota'], [0.0, 0])
+            total = self.totais_frota.setdefault(frota_dia, [0.0, 0])
+            for acumulado in (parcial, total):
+                acumulado[0] += boletim['producao']
+                acumulado[1] += 1
+            self.boletins_com_horas += 1
+        
+        return chave
+    
+    def remover(self, boletim: Dict[str, Any]):
+        """Desfaz o adicionar de um boletim que não chegou a ser gravado (ex.: recusado pelo banco)"""
+        
+        chave = (boletim['data'], boletim['frente'], boletim['codigo'], boletim['setor'])
+        self.producao[chave] -= boletim['producao']
+        
+        frota_dia = (boletim['data'], boletim.get('frota'))
+        if self.horas is not None and frota_dia in self.horas:
+            frotas = self.frotas[chave]
+            for acumulados, chave_acumulado in ((frotas, boletim['frota']), (self.totais_frota, frota_dia)):
+                acumulado = acumulados[chave_acumulado]
+                acumulado[0] -= boletim['producao']
+                acumulado[1] -= 1
+                if acumulado[1] == 0:
+                    del acumulados[chave_acumulado]
+            if not frotas:
+                del self.frotas[chave]
+            self.boletins_com_horas -= 1
+    
+    def adicionar_registros(self, pares: Iterable[Tuple[ChaveGrupo, Any]]):
+        """Associa ids de boletins já gravados (ex.: retornados pelo insert) aos seus grupos"""
+        
+        for chave, registro_id in pares:
+            self.registros.setdefault(chave, []).append(registro_id)
+    
+    def agregados(self, chaves: Optional[Iterable[ChaveGrupo]] = None) -> Dict[ChaveGrupo, Dict[str, Any]]:
+        """Retorna {chave: registro de boletins_cav_agregado} para as chaves pedidas (padrão: todas)"""
+        
+        resultado = {}
+        for chave in (self.producao if chaves is None else chaves):
+            data, frente, codigo, setor = chave
+            agregado = {
+                'data': data,
+                'codigo': codigo,
+                'frente': frente,
+                'setor': setor,
+                **calcular_agregados_por_total(self.producao[chave], self.referencias.lamina_alvo(frente))
+            }
+            if chave in self.registros:
+                agregado['registros_granulares'] = {'uuids': self.registros[chave]}
+            if self.horas is not None:
+                agregado.update(self._utilizacao(chave))
+            resultado[chave] = agregado
+        
+        return resultado
+    
+    def _utilizacao(self, chave: ChaveGrupo) -> Dict[str, Any]:
+        """Colunas de utilização do grupo; None se nenhuma frota do grupo tem horas no dia"""
+        
+        frotas = self.frotas.get(chave)
+        if not frotas:
+            return {coluna: None for coluna in COLUNAS_HORAS_AGREGADO}
+        
+        data = chave[0]
+        producao = horas_motor = horas_ociosas = horas_trabalho = 0.0
+        for frota, (producao_frota, boletins_frota) in frotas.items():
+            producao_dia, boletins_dia = self.totais_frota[(data, frota)]
+            parte = producao_frota / producao_dia if producao_dia > 0 else boletins_frota / boletins_dia
+            motor, ociosas, trabalho = self.horas[(data, frota)]
+            horas_motor += motor * parte
+            horas_ociosas += ociosas * parte
+            horas_trabalho += trabalho * parte
+            producao += producao_frota
+        
+        return calcular_utilizacao(producao, horas_motor, horas_ociosas, horas_trabalho)
+
+def agregar_boletins(boletins: Iterable[Dict[str, Any]], referencias: Optional[ReferenciasCAV] = None,
+                     horas: Optional[IndiceHorasFrota] = None) -> Dict[ChaveGrupo, Dict[str, Any]]:
+    """
+    Calcula os agregados de todos os grupos (data, frente, codigo, setor) em uma única passada.
+    Boletins com 'id' (ex.: lidos do banco para reagregação) preenchem registros_granulares.
+    Com `horas`, inclui a utilização das frotas (ver AgregadorBoletins).
+    """
+    
+    agregador = AgregadorBoletins(referencias, horas)
+    for boletim in boletins:
+        agregador.adicionar(boletim)
+    return agregador.agregados()
+
+def _upsert_dividindo(backend: BackendArmazenamento, tabela: str, linhas: List[Dict[str, Any]],
+                      conflito: str) -> Tuple[List[Dict[str, Any]], Dict[int, Exception]]:
+    """
+    Upsert que isola as linhas recusadas pelo banco: se o lote falha (ex.: uma linha viola uma
+    constraint), cada metade é enviada de novo, até restarem só as linhas com erro. Retorna
+    (linhas gravadas, {posição em `linhas`: erro}). Falhas de conexão não são divididas e são levantadas.
+    """
+    
+    try:
+        return backend.upsert(tabela, linhas, conflito), {}
+    except Exception as e:
+        if falha_de_conexao(e):
+            raise
+        if len(linhas) == 1:
+            return [], {0: e}
+    
+    metricas.contar('lotes_divididos')
+    meio = len(linhas) // 2
+    gravados, recusadas = _upsert_dividindo(backend, tabela, linhas[:meio], conflito)
+    gravados_fim, recusadas_fim = _upsert_dividindo(backend, tabela, linhas[meio:], conflito)
+    recusadas.update({meio + posicao: erro for posicao, erro in recusadas_fim.items()})
+    return gravados + gravados_fim, recusadas
+
+def _executar_lotes(tarefa: Callable[[Any], Any], itens: Iterable[Any], workers: int) -> Iterator[Tuple[Any, Optional[Exception], Any]]:
+    """
+    Executa `tarefa` para cada item (ex.: (número, lote)) em um pool de threads, devolvendo
+    (item, erro, retorno da tarefa) conforme concluem. Os itens são consumidos sob demanda, com no máximo
+    2x`workers` em andamento, de modo que a leitura do arquivo e o envio acontecem ao mesmo
+    tempo sem acumular o arquivo em memória.
+    """
+    
+    workers = max(1, workers)
+    pendentes = {}
+    
+    def concluidos_ate(limite):
+        while len(pendentes) > limite:
+            concluidos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                erro = futuro.exception()
+                yield pendentes.pop(futuro), erro, None if erro is not None else futuro.result()
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for item in itens:
+            pendentes[executor.submit(tarefa, item)] = item
+            yield from concluidos_ate(2 * workers - 1)
+        
+        yield from concluidos_ate(0)
+
+def _em_lotes(itens: Iterable[Any], tamanho: int) -> Iterator[List[Any]]:
+    """Divide uma sequência (lista ou gerador) em blocos consecutivos de até `tamanho` itens"""
+    
+    iterador = iter(itens)
+    while True:
+        lote = list(islice(iterador, tamanho))
+        if not lote:
+            return
+        yield lote
+
+def _preparar_boletim_insert(boletim: Dict[str, Any], referencias: ReferenciasCAV = REFERENCIAS_PADRAO) -> Dict[str, Any]:
+    """Remove campos que não estão na tabela ou são calculados e grava a lâmina alvo da frente"""
+    
+    return {
+        'data': boletim['data'],
+        'codigo': boletim['codigo'],
+        'frente': boletim['frente'],
+        'setor': boletim['setor'],
+        'frota': boletim['frota'],
+        'turno': boletim['turno'],
+        'operador': boletim['operador'],
+        'producao': boletim['producao'],
+        'observacoes': boletim['observacoes'],
+        'lamina_alvo': referencias.lamina_alvo(boletim['frente']),
+        'hash_boletim': _hash_boletim(boletim)
+    }
+
+def _impressao_lote(lote: List[Tuple[ChaveGrupo, Dict[str, Any]]]) -> str:
+    """Hash SHA-1 dos hash_boletim do lote, em ordem: identifica o conteúdo do lote no checkpoint"""
+    
+    return hashlib.sha1('\n'.join(linha['hash_boletim'] for _, linha in lote).encode()).hexdigest()
+
+def _hash_boletim(boletim: Dict[str, Any]) -> str:
+    """
+    SHA-256 dos campos de CAMPOS_HASH_BOLETIM, separados por U+001F, com a produção arredondada
+    a 2 casas como na coluna NUMERIC(10,2). É o mesmo valor que a migração calcula no banco.
+    """
+    
+    valores = []
+    for campo in CAMPOS_HASH_BOLETIM:
+        valor = boletim[campo]
+        if campo == 'producao':
+            valor = format(Decimal(repr(float(valor))).quantize(Decimal('0.01'), ROUND_HALF_UP), 'f')
+        valores.append('' if valor is None else str(valor))
+    return hashlib.sha256('\x1f'.join(valores).encode('utf-8')).hexdigest()
+
+def buscar_hashes_boletins(backend: BackendArmazenamento, data_inicial: str, data_final: str,
+                           tamanho_pagina: int = TAMANHO_PAGINA_HASHES,
+                           grupos: Optional[Set[ChaveGrupo]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Retorna {data: {hash_boletim: id}} dos boletins já gravados entre as duas datas (inclusive), lidos em páginas.
+    Com `grupos`, acrescenta a ele a chave (data, frente, codigo, setor) de cada boletim lido.
+    """
+    
+    hashes = {}
+    apos = None
+    while True:
+        pagina = backend.buscar_pagina_ordenada('boletins_cav', 'id,data,frente,codigo,setor,hash_boletim', ('data', 'id'), apos,
+                                                tamanho_pagina, ('data', data_inicial, data_final))
+        for linha in pagina:
+            if linha['hash_boletim'] is not None:
+                hashes.setdefault(linha['data'], {})[linha['hash_boletim']] = linha['id']
+            if grupos is not None:
+                grupos.add((linha['data'], linha['frente'], linha['codigo'], linha['setor']))
+        if len(pagina) < tamanho_pagina:
+            return hashes
+        apos = [pagina[-1]['data'], pagina[-1]['id']]
+
+def _inserir_boletins_copy(backend: BackendPostgres, boletins: Iterable[Dict[str, Any]], checkpoint: Optional[CheckpointImportacao],
+                           referencias: ReferenciasCAV) -> Dict[str, int]:
+    """
+    Carga pela conexão direta ao Postgres (BackendPostgres.carregar_boletins_cav): todos os
+    boletins vão por COPY e são gravados, com os agregados, em uma única transação. Se algo
+    falhar, nada é gravado e a importação pode simplesmente ser repetida.
+    """
+    
+    print("📊 Processando boletins...")
+    print("🐘 Carga direta no Postgres: COPY para tabela temporária e gravação em uma única transação")
+    
+    lidos = 0
+    
+    def linhas():
+        nonlocal lidos
+        for boletim in boletins:
+            lidos += 1
+            yield _preparar_boletim_insert(boletim, referencias)
+    
+    totais = {'inseridos': 0, 'agregados': 0, 'ja_existentes': 0, 'duplicados': 0, 'grupos': 0}
+    erros = 0
+    try:
+        totais = backend.carregar_boletins_cav(linhas())
+    except Exception as e:
+        print(f"    ❌ Erro na carga via COPY; nenhum dos {lidos} boletins lidos foi gravado: {e}")
+        erros = lidos
+    
+    if checkpoint is not None and erros == 0:
+        checkpoint.concluir()
+    
+    print("\n" + "="*60)
+    print("📈 RESUMO DA OPERAÇÃO:")
+    print(f"   ✅ Boletins individuais inseridos: {totais['inseridos']}")
+    print(f"   ✅ Registros agregados criados: {totais['agregados']}")
+    print(f"   ⏭️  Boletins individuais já gravados no banco (pulados): {totais['ja_existentes']}")
+    if totais['duplicados']:
+        print(f"   🔁 Boletins repetidos na importação (gravados uma vez): {totais['duplicados']}")
+    print(f"   ❌ Erros: {erros}")
+    print(f"   📊 Total de grupos processados: {totais['grupos']}")
+    print("="*60)
+    
+    return {
+        'inseridos': totais['inseridos'],
+        'agregados': totais['agregados'],
+        'pulados_individuais': 0,
+        'pulados_agregados': 0,
+        'ja_existentes': totais['ja_existentes'],
+        'duplicados': totais['duplicados'],
+        'erros': erros,
+        'grupos': totais['grupos']
+    }
+
+def inserir_boletins(backend: BackendArmazenamento, boletins: Iterable[Dict[str, Any]], tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+                     workers: int = WORKERS_PADRAO, checkpoint: Optional[CheckpointImportacao] = None,
+                     referencias: Optional[ReferenciasCAV] = None, agregacao: str = AGREGACAO_PADRAO,
+                     horas: Optional[IndiceHorasFrota] = None, snapshot: Optional['SnapshotBoletins'] = None):
+    """
+    Insere os boletins nas tabelas, enviando até `tamanho_lote` registros por requisição.
+    Aceita uma lista ou um gerador (ex.: iterar_boletins_csv): os boletins individuais são
+    enviados à medida que são lidos e, de cada grupo, só a produção somada fica em memória
+    para o cálculo dos agregados no final. Os lotes são independentes entre si e são
+    enviados por `workers` threads sobre o mesmo backend (Supabase ou SQLite local;
+    um Client do Supabase também é aceito).
+    
+    Os ids devolvidos pelo insert dos boletins individuais preenchem registros_granulares
+    de cada agregado, ligando-o exatamente aos seus boletins.
+    
+    Com `checkpoint`, a importação é retomável: lotes já registrados com o mesmo conteúdo
+    (_impressao_lote) e agregados já registrados são pulados, e cada gravação bem-sucedida é
+    registrada. Um lote cujo conteúdo mudou (ex.: as referências passaram a aceitar outras
+    linhas) é reenviado; o que já estava gravado é reconhecido pelo hash_boletim.
+    
+    Reimportar boletins já gravados não os duplica: cada boletim leva seu hash_boletim
+    (_hash_boletim) e é gravado via upsert nessa coluna. Antes do primeiro lote de cada data, os
+    hashes já gravados na data são lidos uma vez (buscar_hashes_boletins); boletins conhecidos não
+    são reenviados e entram nos agregados com o id já gravado. Boletins repetidos dentro da própria
+    importação contam uma única vez. Os agregados são sempre gravados via upsert.
+    
+    Para a memória não crescer com o arquivo, esses hashes só ficam guardados para as datas dos
+    últimos LOTES_JANELA_DEDUPLICACAO lotes. Em arquivos ordenados por data isso não muda nada; se
+    uma data volta depois de sair da janela, repetições dela passam a ser resolvidas pelo upsert
+    em hash_boletim e os grupos da data são recalculados no banco.
+    
+    Se o banco recusar um lote de boletins (ex.: uma linha viola uma constraint), o lote é dividido
+    até isolar os recusados (_upsert_dividindo): os demais são gravados, e só os recusados contam
+    como erro e ficam fora dos agregados.
+    
+    O agregado calculado aqui só conhece os boletins desta importação; por isso, grupos que já
+    tinham boletins no banco (de outro arquivo, ou de lotes gravados antes de uma retomada) são
+    recalculados no banco (recalcular_agregados_cav), como no modo 'servidor', em vez de terem o
+    agregado sobrescrito. As colunas de horas desses grupos ficam como estavam.
+    
+    A lâmina alvo de boletins e agregados é a da frente em `referencias` (padrão: REFERENCIAS_PADRAO).
     
-    print(f"📊 Processando {len(boletins)} boletins...")
+    Com agregacao='servidor', só os boletins individuais são enviados; os agregados das chaves
+    afetadas são recalculados no banco (recalcular_agregados_cav) a partir de todos os boletins
+    gravados, em uma instrução por até CHAVES_POR_RECALCULO chaves.
+    
+    Com um BackendPostgres (conexão direta ao banco, para cargas muito grandes), os boletins vão
+    todos por COPY e são gravados junto com os agregados, recalculados no banco, em uma única
+    transação (_inserir_boletins_copy); `tamanho_lote`, `workers` e `agregacao` não se aplicam.
+    
+    Com `horas` (ler_horas_frota_csv), os agregados recebem as horas de motor das frotas (ver
+    AgregadorBoletins). Como as horas não ficam nos boletins gravados, só valem com agregacao='cliente'.
+    
+    Com `snapshot` (abrir_snapshot), os boletins gravados nesta execução, com os ids devolvidos pelo
+    banco, também vão para o snapshot Parquet local, gravado ao final. A carga por COPY não devolve
+    ids nem separa os boletins novos, e não grava snapshot.
+    
+    Retorna os totais exibidos no resumo (inseridos, agregados, pulados, já existentes, duplicados,
+    erros, grupos).
+    """
+    
+    if tamanho_lote < 1:
+        raise ValueError("tamanho_lote deve ser maior que zero")
+    if agregacao not in MODOS_AGREGACAO:
+        raise ValueError(f"Modo de agregação desconhecido: {agregacao}")
+    
+    backend = como_backend(backend)
+    if horas is not None and (agregacao == 'servidor' or isinstance(backend, BackendPostgres)):
+        raise ValueError("As horas das frotas só entram nos agregados calculados neste script (agregacao='cliente', sem Postgres direto)")
+    referencias = referencias or REFERENCIAS_PADRAO
+    
+    if isinstance(backend, BackendPostgres):
+        if snapshot is not None:
+            print("⚠️  A carga por COPY não grava o snapshot local")
+        return _inserir_boletins_copy(backend, boletins, checkpoint, referencias)
+    
+    print("📊 Processando boletins...")
     
     sucessos_individuais = 0
     sucessos_agregados = 0
+    pulados_individuais = 0
+    pulados_agregados = 0
+    ja_existentes = 0
+    duplicados = 0
     erros = 0
     
-    # Agrupa boletins por data + frente + codigo + setor para criar agregados
-    grupos = {}
+    # Produção somada por data + frente + codigo + setor (na ordem do arquivo) para criar agregados
+    agregador = AgregadorBoletins(referencias, horas)
+    inseridos_por_grupo = {}
+    inseridos_nesta_execucao = set()
     
-    for boletim in boletins:
-        chave = f"{boletim['data']}|{boletim['frente']}|{boletim['codigo']}|{boletim['setor']}"
-        if chave not in grupos:
-            grupos[chave] = []
-        grupos[chave].append(boletim)
+    # Ids gerados pelo banco para cada lote, usados para preencher registros_granulares
+    ids_por_lote: Dict[int, List[Tuple[ChaveGrupo, Any]]] = {}
     
-    print(f"📋 {len(grupos)} grupos agregados serão criados")
+    # Por data, na janela de deduplicação: hashes já vistos no arquivo, {hash_boletim: id} dos já
+    # gravados no banco e o último lote com boletins da data; datas que saíram da janela
+    vistos_por_data: Dict[str, Set[str]] = {}
+    gravados_por_data: Dict[str, Dict[str, Any]] = {}
+    ultimo_lote_da_data: Dict[str, int] = {}
+    datas_descartadas: Set[str] = set()
     
-    # Processa cada grupo
-    for i, (chave, boletins_grupo) in enumerate(grupos.items(), 1):
-        try:
-            data, frente, codigo, setor = chave.split('|')
-            
-            print(f"🔄 [{i:3d}/{len(grupos)}] Processando: {frente} - {data} - {codigo} - {setor}")
-            
-            # 1. Insere boletins individuais
-            boletins_inseridos = 0
-            for boletim in boletins_grupo:
-                try:
-                    # Remove campos que não estão na tabela ou são calculados
-                    boletim_insert = {
-                        'data': boletim['data'],
-                        'codigo': boletim['codigo'],
-                        'frente': boletim['frente'],
-                        'setor': boletim['setor'],
-                        'frota': boletim['frota'],
-                        'turno': boletim['turno'],
-                        'operador': boletim['operador'],
-                        'producao': boletim['producao'],
-                        'observacoes': boletim['observacoes']
-                    }
-                    
-                    result = supabase.table('boletins_cav').insert(boletim_insert).execute()
-                    boletins_inseridos += 1
-                    
-                except Exception as e:
-                    print(f"    ❌ Erro ao inserir boletim individual: {e}")
-                    erros += 1
+    # Grupos com boletins no banco antes desta execução (lidos com os hashes ou de lotes já concluídos)
+    grupos_no_banco: Set[ChaveGrupo] = set()
+    
+    # Datas cujos boletins já gravados não puderam ser lidos: todos os grupos delas são tratados como já no banco
+    datas_sem_consulta: Set[str] = set()
+    
+    def descartar_datas_antigas(n: int):
+        """Tira da memória os hashes das datas sem boletins nos últimos LOTES_JANELA_DEDUPLICACAO lotes"""
+        
+        antigas = [data for data, ultimo in ultimo_lote_da_data.items() if ultimo <= n - LOTES_JANELA_DEDUPLICACAO]
+        for data in antigas:
+            del ultimo_lote_da_data[data]
+            vistos_por_data.pop(data, None)
+            gravados_por_data.pop(data, None)
+        datas_descartadas.update(antigas)
+    
+    def lotes_do_arquivo():
+        nonlocal duplicados
+        for n, bloco in enumerate(_em_lotes(boletins, tamanho_lote), 1):
+            descartar_datas_antigas(n)
+            with metricas.cronometro('agrupamento'):
+                lote = []
+                for boletim in bloco:
+                    linha = _preparar_boletim_insert(boletim, referencias)
+                    ultimo_lote_da_data[linha['data']] = n
+                    vistos = vistos_por_data.setdefault(linha['data'], set())
+                    if linha['hash_boletim'] in vistos:
+                        duplicados += 1
+                        continue
+                    vistos.add(linha['hash_boletim'])
+                    chave = agregador.adicionar(boletim)
+                    if linha['data'] in datas_descartadas:
+                        # Repetições de antes da data sair da janela não são vistas aqui: o upsert evita a
+                        # duplicação no banco e o agregado do grupo é recalculado a partir dele
+                        grupos_no_banco.add(chave)
+                    lote.append((chave, linha))
+            yield lote
+    
+    def ids_ja_gravados(lote) -> Dict[int, Any]:
+        """{posição no lote: id} dos boletins do lote que já estão no banco"""
+        
+        datas = sorted({linha['data'] for _, linha in lote if linha['data'] not in gravados_por_data})
+        if datas:
+            lidos = {}
+            try:
+                with metricas.cronometro('busca_existentes'):
+                    lidos = buscar_hashes_boletins(backend, datas[0], datas[-1], grupos=grupos_no_banco)
+            except Exception as e:
+                # Sem a consulta, os boletins são enviados e o upsert em hash_boletim evita a duplicação; os
+                # agregados dessas datas são recalculados no banco, que tem os boletins que não foram lidos
+                print(f"    ⚠️  Não foi possível ler os boletins já gravados de {datas[0]} a {datas[-1]}: {e}")
+                datas_sem_consulta.update(datas)
+            for data in datas:
+                gravados_por_data[data] = lidos.get(data, {})
+        if datas_sem_consulta:
+            grupos_no_banco.update(chave for chave, linha in lote if linha['data'] in datas_sem_consulta)
+        return {i: gravados_por_data[linha['data']][linha['hash_boletim']] for i, (_, linha) in enumerate(lote)
+                if linha['hash_boletim'] in gravados_por_data[linha['data']]}
+    
+    def lotes_pendentes():
+        nonlocal pulados_individuais
+        for n, lote in enumerate(lotes_do_arquivo(), 1):
+            if checkpoint is not None and checkpoint.lote_concluido(n, _impressao_lote(lote)):
+                # Lote gravado em uma execução anterior: conta para os agregados, mas não é reenviado
+                for chave, _ in lote:
+                    inseridos_por_grupo[chave] = inseridos_por_grupo.get(chave, 0) + 1
+                    grupos_no_banco.add(chave)
+                ids = checkpoint.ids_lotes.get(n)
+                if ids is not None and len(ids) == len(lote):
+                    ids_por_lote[n] = [(chave, registro_id) for (chave, _), registro_id in zip(lote, ids) if registro_id is not None]
+                pulados_individuais += len(lote)
+                continue
+            yield n, lote, ids_ja_gravados(lote)
+    
+    # 1. Insere boletins individuais em lotes enquanto o arquivo é lido, mantendo a chave do grupo de cada linha
+    print(f"📦 Boletins individuais serão enviados em lotes de até {tamanho_lote}")
+    
+    def inserir_lote_boletins(item):
+        _, lote, existentes = item
+        posicoes_novos = [i for i in range(len(lote)) if i not in existentes]
+        ids_por_hash = {}
+        recusados = {}
+        if posicoes_novos:
+            with metricas.cronometro('gravacao_boletins'):
+                gravados, recusadas = _upsert_dividindo(backend, 'boletins_cav', [lote[i][1] for i in posicoes_novos], 'hash_boletim')
+            ids_por_hash = {registro.get('hash_boletim'): registro.get('id') for registro in gravados}
+            recusados = {posicoes_novos[posicao]: erro for posicao, erro in recusadas.items()}
+        
+        # Ids na ordem do lote: os já gravados e os devolvidos pelo upsert (pelo hash); None nos recusados
+        ids = [existentes[i] if i in existentes else ids_por_hash.get(linha['hash_boletim']) for i, (_, linha) in enumerate(lote)]
+        completos = all(registro_id is not None for i, registro_id in enumerate(ids) if i not in recusados)
+        return (ids if completos else None), recusados
+    
+    for (n, lote, existentes), erro, retorno in _executar_lotes(inserir_lote_boletins, lotes_pendentes(), workers):
+        if erro is None:
+            ids, recusados = retorno
             
-            if boletins_inseridos > 0:
-                sucessos_individuais += boletins_inseridos
-                
-                # 2. Calcula e insere agregado
-                try:
-                    agregado = calcular_agregados(boletins_grupo)
-                    
-                    agregado_insert = {
-                        'data': data,
-                        'codigo': codigo,
-                        'frente': frente,
-                        'setor': setor,
-                        **agregado
-                    }
-                    
-                    result = supabase.table('boletins_cav_agregado').insert(agregado_insert).execute()
-                    sucessos_agregados += 1
-                    print(f"    ✅ Agregado criado: {agregado['total_producao']}ha, {boletins_inseridos} boletins")
-                    
-                except Exception as e:
-                    print(f"    ❌ Erro ao inserir agregado: {e}")
-                    erros += 1
+            # Boletins recusados pelo banco saem dos agregados e contam como erro; os demais do lote seguem gravados
+            for i, motivo in recusados.items():
+                chave, linha = lote[i]
+                agregador.remover(linha)
+                metricas.detalhe(f"    ❌ [{n:3d}] Boletim recusado pelo banco ({linha['data']} | {chave[1]} | {chave[2]} | "
+                                 f"frota {linha['frota']} | turno {linha['turno']}): {motivo}")
+            if recusados:
+                print(f"    ❌ [{n:3d}] {len(recusados)} de {len(lote)} boletins recusados pelo banco; os demais foram gravados")
+                erros += len(recusados)
             
-        except Exception as e:
-            print(f"❌ [{i:3d}/{len(grupos)}] Erro ao processar grupo {chave}: {e}")
-            erros += 1
+            # Boletins já gravados entram nos agregados, mas não fazem o grupo ser regravado
+            for i, (chave, _) in enumerate(lote):
+                if i not in existentes and i not in recusados:
+                    inseridos_por_grupo[chave] = inseridos_por_grupo.get(chave, 0) + 1
+                    inseridos_nesta_execucao.add(chave)
+            sucessos_individuais += len(lote) - len(existentes) - len(recusados)
+            ja_existentes += len(existentes)
+            if snapshot is not None:
+                snapshot.gravar(linha if ids is None else {**linha, 'id': ids[i]}
+                                for i, (_, linha) in enumerate(lote) if i not in existentes and i not in recusados)
+            if ids is not None:
+                ids_por_lote[n] = [(chave, registro_id) for (chave, _), registro_id in zip(lote, ids) if registro_id is not None]
+            else:
+                print(f"    ⚠️  [{n:3d}] Banco não retornou os ids do lote; registros_granulares ficará incompleto")
+            if checkpoint is not None:
+                checkpoint.registrar_lote(n, len(lote), ids, _impressao_lote(lote))
+            metricas.detalhe(f"    ✅ [{n:3d}] Lote de boletins individuais inserido: {len(lote) - len(recusados)} registros")
+        else:
+            print(f"    ❌ [{n:3d}] Erro ao inserir lote de {len(lote)} boletins individuais: {erro}")
+            erros += len(lote)
+        metricas.progresso('boletins individuais', sucessos_individuais + pulados_individuais + ja_existentes + erros)
+    
+    if snapshot is not None:
+        snapshot.descarregar()
+    
+    print(f"📋 {len(agregador.producao)} grupos agregados encontrados")
+    
+    # Vincula os ids aos grupos na ordem dos lotes (ordem do arquivo), independentemente de qual terminou antes
+    for n in sorted(ids_por_lote):
+        agregador.adicionar_registros(ids_por_lote.pop(n))
+    
+    # 2. Calcula agregados apenas para grupos com ao menos um boletim inserido; na retomada, pula os
+    #    agregados já gravados cujo grupo não recebeu boletins novos nesta execução
+    chaves = [chave for chave in agregador.producao if inseridos_por_grupo.get(chave, 0) > 0]
+    if checkpoint is not None:
+        ja_gravados = {chave for chave in chaves if chave in checkpoint.agregados_concluidos and chave not in inseridos_nesta_execucao}
+        pulados_agregados = len(ja_gravados)
+        chaves = [chave for chave in chaves if chave not in ja_gravados]
+    
+    # Com agregacao='cliente', os grupos que já tinham boletins no banco também são recalculados lá:
+    # o agregado deste script só somaria os boletins do arquivo e apagaria os demais
+    if agregacao == 'servidor':
+        chaves_servidor, chaves_cliente = chaves, []
+    else:
+        chaves_servidor = [chave for chave in chaves if chave in grupos_no_banco]
+        chaves_cliente = [chave for chave in chaves if chave not in grupos_no_banco]
+        if chaves_servidor:
+            print(f"🔄 {len(chaves_servidor)} grupos já tinham boletins no banco e serão recalculados nele")
+            if horas is not None:
+                print("⚠️  As horas das frotas desses grupos não são recalculadas no banco e ficam como estavam")
+    
+    if chaves_servidor:
+        # 3. Recalcula os agregados no banco, junto dos boletins gravados (upsert por chave)
+        total_lotes = (len(chaves_servidor) + CHAVES_POR_RECALCULO - 1) // CHAVES_POR_RECALCULO
+        print(f"🗄️  Recalculando {len(chaves_servidor)} agregados no banco...")
+        
+        def recalcular_lote(item):
+            _, lote = item
+            with metricas.cronometro('recalculo_agregados'):
+                return backend.recalcular_agregados(
+                    [{'data': data, 'frente': frente, 'codigo': codigo, 'setor': setor} for data, frente, codigo, setor in lote]
+                )
+        
+        recalculados = 0
+        for (n, lote), erro, gravados in _executar_lotes(recalcular_lote, enumerate(_em_lotes(chaves_servidor, CHAVES_POR_RECALCULO), 1), workers):
+            if erro is None:
+                sucessos_agregados += gravados
+                recalculados += len(lote)
+                if checkpoint is not None:
+                    checkpoint.registrar_agregados(lote)
+                metricas.detalhe(f"    ✅ [{n:3d}/{total_lotes}] Agregados recalculados no banco: {gravados} registros")
+            else:
+                print(f"    ❌ [{n:3d}/{total_lotes}] Erro ao recalcular {len(lote)} agregados no banco: {erro}")
+                erros += len(lote)
+            metricas.progresso('agregados recalculados', recalculados, len(chaves_servidor))
+    
+    if chaves_cliente:
+        with metricas.cronometro('calculo_agregados'):
+            agregados = list(agregador.agregados(chaves_cliente).values())
+        
+        # 3. Grava agregados em lotes via upsert (o grupo pode já ter agregado de uma importação anterior)
+        total_lotes = (len(agregados) + tamanho_lote - 1) // tamanho_lote
+        
+        def inserir_lote_agregados(item):
+            _, lote = item
+            with metricas.cronometro('gravacao_agregados'):
+                return backend.upsert('boletins_cav_agregado', lote, 'data,frente,codigo,setor')
+        
+        inseridos_agregados = 0
+        for (n, lote), erro, _ in _executar_lotes(inserir_lote_agregados, enumerate(_em_lotes(agregados, tamanho_lote), 1), workers):
+            if erro is None:
+                sucessos_agregados += len(lote)
+                inseridos_agregados += len(lote)
+                if checkpoint is not None:
+                    checkpoint.registrar_agregados((a['data'], a['frente'], a['codigo'], a['setor']) for a in lote)
+                metricas.detalhe(f"    ✅ [{n:3d}/{total_lotes}] Lote de agregados inserido: {len(lote)} registros")
+            else:
+                print(f"    ❌ [{n:3d}/{total_lotes}] Erro ao inserir lote de {len(lote)} agregados: {erro}")
+                erros += len(lote)
+            metricas.progresso('agregados', inseridos_agregados, len(agregados))
+    
+    if checkpoint is not None and erros == 0:
+        checkpoint.concluir()
     
     print("\n" + "="*60)
     print("📈 RESUMO DA OPERAÇÃO:")
     print(f"   ✅ Boletins individuais inseridos: {sucessos_individuais}")
     print(f"   ✅ Registros agregados criados: {sucessos_agregados}")
+    if checkpoint is not None:
+        print(f"   ⏭️  Boletins individuais já importados (pulados): {pulados_individuais}")
+        print(f"   ⏭️  Agregados já importados (pulados): {pulados_agregados}")
+    print(f"   ⏭️  Boletins individuais já gravados no banco (pulados): {ja_existentes}")
+    if duplicados:
+        print(f"   🔁 Boletins repetidos na importação (gravados uma vez): {duplicados}")
+    if horas is not None:
+        print(f"   ⏱️  Boletins com horas de motor da frota: {agregador.boletins_com_horas}")
     print(f"   ❌ Erros: {erros}")
-    print(f"   📊 Total de grupos processados: {len(grupos)}")
+    print(f"   📊 Total de grupos processados: {len(agregador.producao)}")
     print("="*60)
+    
+    return {
+        'inseridos': sucessos_individuais,
+        'agregados': sucessos_agregados,
+        'pulados_individuais': pulados_individuais,
+        'pulados_agregados': pulados_agregados,
+        'ja_existentes': ja_existentes,
+        'duplicados': duplicados,
+        'erros': erros,
+        'grupos': len(agregador.producao)
+    }
 
 def main():
     """Função principal"""
     
     print("🚀 Iniciando importação de boletins CAV...\n")
+    metricas.configurar_do_ambiente()
     
-    # 1. Conecta ao Supabase
-    print("🔌 Conectando ao Supabase...")
-    supabase = get_supabase_client()
-    print("✅ Conectado ao Supabase com sucesso!\n")
+    # 1. Conecta ao Supabase (ou ao banco local de dry-run, se ARMAZENAMENTO_LOCAL estiver definida,
+    #    ou direto ao Postgres, se ARMAZENAMENTO_POSTGRES estiver definida)
+    backend = backend_local_configurado()
+    backend_postgres = backend_postgres_configurado() if backend is None else None
+    if backend is not None:
+        print(f"💾 Usando armazenamento local (dry-run): {backend.caminho}\n")
+    elif backend_postgres is not None:
+        backend = backend_postgres
+        print(f"🐘 Conectado direto ao Postgres: {backend.caminho}\n")
+    else:
+        print("🔌 Conectando ao Supabase...")
+        backend = BackendSupabase(get_supabase_client())
+        print("✅ Conectado ao Supabase com sucesso!\n")
     
     # 2. Verifica se tabelas existem
-    verificar_tabelas_cav(supabase)
+    verificar_tabelas_cav(backend)
+    referencias = carregar_referencias(backend)
     print()
     
-    # 3. Lê dados do CSV
+    # 3. Localiza o CSV e lê apenas o início para o preview (a importação lê o arquivo em streaming)
     print("📄 Lendo dados do arquivo CSV...")
-    boletins = ler_boletins_csv()
-    print(f"✅ {len(boletins)} boletins carregados do CSV\n")
+    arquivo_csv = localizar_arquivo_boletins()
+    leitura = iterar_boletins_csv(arquivo_csv, referencias=referencias)
+    preview = list(islice(leitura, 3))
+    leitura.close()
     
-    if len(boletins) == 0:
+    if len(preview) == 0:
         print("⚠️  Nenhum boletim válido encontrado no CSV.")
         sys.exit(0)
     
     # 4. Mostra preview dos dados
     print("👀 Preview dos primeiros 3 boletins:")
-    for i, boletim in enumerate(boletins[:3], 1):
+    for i, boletim in enumerate(preview, 1):
         print(f"   {i}. {boletim['data']} | {boletim['setor']} | {boletim['frente']} | {boletim['codigo']} | {boletim['operador']} | {boletim['producao']}ha")
-    if len(boletins) > 3:
-        print(f"   ... e mais {len(boletins) - 3} boletins")
     print()
     
     # 5. Confirma antes de prosseguir
@@ -381,8 +1073,19 @@ def main():
     
     print()
     
-    # 6. Insere boletins
-    inserir_boletins(supabase, boletins)
+    # 6. Insere boletins, lendo o arquivo em streaming e registrando o progresso para retomar se cair
+    checkpoint = CheckpointImportacao(arquivo_csv, TAMANHO_LOTE_PADRAO, destino=backend.destino_checkpoint,
+                                      configuracao=referencias.impressao())
+    if checkpoint.retomando:
+        print(f"♻️  Retomando importação anterior deste arquivo: {len(checkpoint.lotes_concluidos)} lote(s) já gravado(s)\n")
+    
+    metricas.reiniciar()
+    try:
+        inserir_boletins(backend, iterar_boletins_csv(arquivo_csv, exibir_cabecalho=False, referencias=referencias),
+                         checkpoint=checkpoint, referencias=referencias)
+    finally:
+        checkpoint.fechar()
+        metricas.gravar_resumo('boletins_cav')
     
     print("\n✅ Importação concluída!")
 
@@ -8,14 +8,19 @@ pip install supabase python-dotenv
 
 Uso:
 python atualizarListaFuncionarios.py
+
+Para rodar sem interação (cron, vários arquivos de uma vez), veja importacao.py.
 """
 
 import os
 import sys
-import csv
-from typing import List, Dict, Any
-from supabase import create_client, Client
+import hashlib
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from supabase import Client
 from dotenv import load_dotenv
+from ingestaoCSV import abrir_csv
+from instrumentacao import metricas
+from armazenamento import BackendArmazenamento, BackendSupabase, backend_local_configurado, cliente_supabase_configurado, como_backend
 
 # Carrega variáveis de ambiente do arquivo .env.local da raiz do projeto
 # Obtém o diretório raiz do projeto (um nível acima da pasta __utilitarios)
@@ -23,33 +28,25 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 env_path = os.path.join(project_root, '.env.local')
 load_dotenv(env_path)
 
+# Quantidade de registros enviados por requisição nas gravações em lote
+TAMANHO_LOTE_PADRAO = 500
+
+# Linhas por página nas leituras (limite padrão de resposta do PostgREST)
+TAMANHO_PAGINA = 1000
+
+# CPFs por requisição em filtros `in` (mantém a URL dentro do limite do gateway)
+TAMANHO_LOTE_FILTRO = 200
+
 def get_supabase_client() -> Client:
-    """Cria e retorna cliente do Supabase"""
-    
-    # Configurações do Supabase
-    url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
-    service_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-    
-    if not url:
-        print("❌ ERRO: NEXT_PUBLIC_SUPABASE_URL não encontrada nas variáveis de ambiente")
-        print("Configure as variáveis de ambiente ou crie um arquivo .env.local com:")
-        print("NEXT_PUBLIC_SUPABASE_URL=sua_url_aqui")
-        print("SUPABASE_SERVICE_ROLE_KEY=sua_service_key_aqui")
-        sys.exit(1)
+    """Retorna o cliente do Supabase compartilhado pelos scripts (conexões reutilizadas, timeouts e retry)"""
     
-    if not service_key:
-        print("❌ ERRO: SUPABASE_SERVICE_ROLE_KEY não encontrada nas variáveis de ambiente")
-        print("Configure as variáveis de ambiente ou crie um arquivo .env.local com:")
-        print("NEXT_PUBLIC_SUPABASE_URL=sua_url_aqui")
-        print("SUPABASE_SERVICE_ROLE_KEY=sua_service_key_aqui")
-        sys.exit(1)
-    
-    return create_client(url, service_key)
+    return cliente_supabase_configurado()
 
-def ler_funcionarios_csv() -> List[Dict[str, Any]]:
-    """Lê o arquivo funcionarios.csv e retorna lista de funcionários"""
+def ler_funcionarios_csv(arquivo_csv: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Lê o arquivo funcionarios.csv (ou o arquivo indicado) e retorna lista de funcionários"""
     
-    arquivo_csv = os.path.join(os.path.dirname(__file__), 'funcionarios.CSV')
+    if arquivo_csv is None:
+        arquivo_csv = os.path.join(os.path.dirname(__file__), 'funcionarios.CSV')
     
     if not os.path.exists(arquivo_csv):
         print(f"❌ ERRO: Arquivo {arquivo_csv} não encontrado")
@@ -58,60 +55,34 @@ def ler_funcionarios_csv() -> List[Dict[str, Any]]:
     funcionarios = []
     
     try:
-        # Tenta várias codificações comuns
-        encodings = ['utf-8', 'windows-1252', 'iso-8859-1', 'cp1252']
-        file_content = None
-        used_encoding = None
-        
-        for encoding in encodings:
-            try:
-                with open(arquivo_csv, 'r', encoding=encoding) as file:
-                    file_content = file.read()
-                    used_encoding = encoding
-                    break
-            except UnicodeDecodeError:
-                continue
-        
-        if file_content is None:
-            raise Exception("Não foi possível decodificar o arquivo CSV com nenhuma codificação testada")
-        
-        print(f"📝 Arquivo CSV lido com codificação: {used_encoding}")
-        
-        # Agora processa o conteúdo
-        from io import StringIO
-        file = StringIO(file_content)
-        
-        # Detecta o delimitador (pode ser ; ou ,)
-        sample = file.read(1024)
-        file.seek(0)
-        
-        if ';' in sample:
-            delimiter = ';'
-        else:
-            delimiter = ','
-        
-        reader = csv.DictReader(file, delimiter=delimiter)
-        
-        for i, row in enumerate(reader, 1):
-            # Limpa espaços em branco
-            funcionario = {
-                'nome': row['nome'].strip() if row['nome'] else '',
-                'cpf': row['cpf'].strip() if row['cpf'] else '',
-                'funcao': row['funcao'].strip() if row['funcao'] else '',
-                'ativo': row['ativo'].strip().upper() == 'SIM' if row['ativo'] else False,
-                'unidade': row['unidade'].strip() if row['unidade'] else ''
-            }
+        with abrir_csv(arquivo_csv) as (reader, used_encoding, delimiter), metricas.cronometro('leitura_validacao_csv'):
+            print(f"📝 Arquivo CSV lido com codificação: {used_encoding}")
+            
+            lidas = 0
+            for i, row in enumerate(reader, 1):
+                lidas = i
+                # Limpa espaços em branco
+                funcionario = {
+                    'nome': row['nome'].strip() if row['nome'] else '',
+                    'cpf': row['cpf'].strip() if row['cpf'] else '',
+                    'funcao': row['funcao'].strip() if row['funcao'] else '',
+                    'ativo': row['ativo'].strip().upper() == 'SIM' if row['ativo'] else False,
+                    'unidade': row['unidade'].strip() if row['unidade'] else ''
+                }
+            
+                # Valida dados obrigatórios
+                if not funcionario['nome']:
+                    metricas.detalhe(f"⚠️  Linha {i}: Nome vazio, pulando...")
+                    continue
             
-            # Valida dados obrigatórios
-            if not funcionario['nome']:
-                print(f"⚠️  Linha {i}: Nome vazio, pulando...")
-                continue
+                if not funcionario['cpf']:
+                    metricas.detalhe(f"⚠️  Linha {i}: CPF vazio para {funcionario['nome']}, pulando...")
+                    continue
             
-            if not funcionario['cpf']:
-                print(f"⚠️  Linha {i}: CPF vazio para {funcionario['nome']}, pulando...")
-                continue
+                funcionarios.append(funcionario)
             
-            funcionarios.append(funcionario)
+            metricas.contar('linhas_lidas', lidas)
+            metricas.contar('linhas_rejeitadas', lidas - len(funcionarios))
                 
     except Exception as e:
         print(f"❌ ERRO ao ler arquivo CSV: {e}")
@@ -119,14 +90,14 @@ def ler_funcionarios_csv() -> List[Dict[str, Any]]:
     
     return funcionarios
 
-def verificar_tabela_funcionarios(supabase: Client):
-    """Verifica se a tabela funcionarios existe"""
+def verificar_tabela_funcionarios(backend: BackendArmazenamento, interativo: bool = True):
+    """Verifica se a tabela funcionarios existe (fora do modo interativo, só mostra o SQL e retorna False)"""
     
     print("🔍 Verificando se a tabela 'funcionarios' existe...")
     
     try:
         # Tenta fazer uma query simples para verificar se a tabela existe
-        result = supabase.table('funcionarios').select('id').limit(1).execute()
+        backend.verificar_tabela('funcionarios')
         print("✅ Tabela 'funcionarios' encontrada!")
         return True
     except Exception as e:
@@ -156,6 +127,9 @@ CREATE INDEX idx_funcionarios_ativo ON funcionarios(ativo);
         print(sql_create_table)
         print("="*60)
         
+        if not interativo:
+            return False
+        
         resposta = input("\n✅ Após executar o SQL acima, pressione ENTER para continuar ou 'q' para sair: ").strip().lower()
         if resposta == 'q':
             print("❌ Operação cancelada.")
@@ -163,72 +137,170 @@ CREATE INDEX idx_funcionarios_ativo ON funcionarios(ativo);
             
         return False
 
-def atualizar_funcionarios(supabase: Client, funcionarios: List[Dict[str, Any]]):
-    """Atualiza a tabela funcionarios com os dados do CSV"""
+def _em_lotes(itens: List[Any], tamanho: int) -> Iterator[List[Any]]:
+    """Divide uma lista em blocos consecutivos de até `tamanho` itens"""
+    
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+def _hash_funcionario(funcionario: Dict[str, Any]) -> str:
+    """Calcula o hash do conteúdo sincronizado (nome/funcao/ativo/unidade); None equivale a vazio"""
+    
+    conteudo = '\x1f'.join((
+        funcionario.get('nome') or '',
+        funcionario.get('funcao') or '',
+        'SIM' if funcionario.get('ativo') else 'NAO',
+        funcionario.get('unidade') or ''
+    ))
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+
+def buscar_hashes_funcionarios(backend: BackendArmazenamento) -> Dict[str, Tuple[str, bool]]:
+    """Busca todos os funcionários cadastrados, paginando por CPF, e retorna {cpf: (hash, ativo)}"""
+    
+    existentes = {}
+    ultimo_cpf = None
+    
+    while True:
+        pagina = backend.buscar_pagina('funcionarios', 'cpf,nome,funcao,ativo,unidade', 'cpf', ultimo_cpf, TAMANHO_PAGINA)
+        for funcionario in pagina:
+            existentes[funcionario['cpf']] = (_hash_funcionario(funcionario), bool(funcionario.get('ativo')))
+        
+        if len(pagina) < TAMANHO_PAGINA:
+            break
+        ultimo_cpf = pagina[-1]['cpf']
+    
+    return existentes
+
+def atualizar_funcionarios(backend: BackendArmazenamento, funcionarios: List[Dict[str, Any]], tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+                           desativar_ausentes: bool = False):
+    """
+    Atualiza a tabela funcionarios com os dados do CSV, gravando apenas linhas novas ou alteradas
+    (comparadas por hash de conteúdo). Com `desativar_ausentes`, CPFs ativos no banco que não
+    constam no CSV são marcados como ativo=false.
+    
+    Retorna os totais exibidos no resumo (inseridos, atualizados, inalterados, desativados, erros).
+    """
+    
+    if tamanho_lote < 1:
+        raise ValueError("tamanho_lote deve ser maior que zero")
+    
+    backend = como_backend(backend)
     
     print(f"📊 Processando {len(funcionarios)} funcionários...")
     
+    # CPFs repetidos no CSV: prevalece a última ocorrência (mesmo efeito da gravação linha a linha)
+    por_cpf = {}
+    for funcionario in funcionarios:
+        por_cpf[funcionario['cpf']] = funcionario
+    
+    duplicados = len(funcionarios) - len(por_cpf)
+    if duplicados > 0:
+        print(f"⚠️  {duplicados} linha(s) com CPF repetido no CSV; a última ocorrência será usada")
+    
+    # 1. Busca o estado atual da tabela em uma leitura paginada
+    print("🔍 Buscando funcionários já cadastrados...")
+    with metricas.cronometro('busca_existentes'):
+        existentes = buscar_hashes_funcionarios(backend)
+    print(f"✅ {len(existentes)} funcionários encontrados no banco")
+    
+    # 2. Classifica cada funcionário em novo, alterado ou inalterado
+    alteracoes = []
+    inalterados = 0
+    
+    with metricas.cronometro('comparacao'):
+        for cpf, funcionario in por_cpf.items():
+            existente = existentes.get(cpf)
+            if existente is None:
+                alteracoes.append(('inserido', funcionario))
+            elif existente[0] != _hash_funcionario(funcionario):
+                alteracoes.append(('atualizado', funcionario))
+            else:
+                inalterados += 1
+    
+    print(f"📋 {len(alteracoes)} funcionário(s) novos ou alterados, {inalterados} inalterado(s)")
+    
+    # 3. Grava somente as alterações, em lotes, via upsert pelo CPF (sem mexer em timestamps)
     sucessos = 0
     erros = 0
     atualizados = 0
     inseridos = 0
+    total_lotes = (len(alteracoes) + tamanho_lote - 1) // tamanho_lote
     
-    for i, funcionario in enumerate(funcionarios, 1):
+    for n, lote in enumerate(_em_lotes(alteracoes, tamanho_lote), 1):
+        linhas = [{
+            'nome': funcionario['nome'],
+            'cpf': funcionario['cpf'],
+            'funcao': funcionario['funcao'],
+            'ativo': funcionario['ativo'],
+            'unidade': funcionario['unidade']
+        } for _, funcionario in lote]
+        
         try:
-            # Primeiro, tenta buscar se o funcionário já existe (por CPF)
-            result = supabase.table('funcionarios').select('id').eq('cpf', funcionario['cpf']).execute()
-            
-            if result.data and len(result.data) > 0:
-                # Funcionário existe, atualiza (sem mexer em timestamps)
-                funcionario_update = {
-                    'nome': funcionario['nome'],
-                    'funcao': funcionario['funcao'],
-                    'ativo': funcionario['ativo'],
-                    'unidade': funcionario['unidade']
-                }
-                result = supabase.table('funcionarios').update(funcionario_update).eq('cpf', funcionario['cpf']).execute()
-                atualizados += 1
-                print(f"🔄 [{i:4d}/{len(funcionarios)}] Atualizado: {funcionario['nome']}")
-            else:
-                # Funcionário não existe, insere (sem especificar timestamps)
-                funcionario_insert = {
-                    'nome': funcionario['nome'],
-                    'cpf': funcionario['cpf'],
-                    'funcao': funcionario['funcao'],
-                    'ativo': funcionario['ativo'],
-                    'unidade': funcionario['unidade']
-                }
-                result = supabase.table('funcionarios').insert(funcionario_insert).execute()
-                inseridos += 1
-                print(f"➕ [{i:4d}/{len(funcionarios)}] Inserido: {funcionario['nome']}")
-            
-            sucessos += 1
+            with metricas.cronometro('gravacao_funcionarios'):
+                backend.upsert('funcionarios', linhas, 'cpf')
             
+            novos = sum(1 for tipo, _ in lote if tipo == 'inserido')
+            inseridos += novos
+            atualizados += len(lote) - novos
+            sucessos += len(lote)
+            metricas.detalhe(f"✅ [{n:4d}/{total_lotes}] Lote gravado: {novos} inserido(s), {len(lote) - novos} atualizado(s)")
         except Exception as e:
-            erros += 1
-            print(f"❌ [{i:4d}/{len(funcionarios)}] Erro ao processar {funcionario['nome']}: {e}")
+            erros += len(lote)
+            print(f"❌ [{n:4d}/{total_lotes}] Erro ao gravar lote de {len(lote)} funcionários: {e}")
+        metricas.progresso('funcionários gravados', sucessos + erros, len(alteracoes))
+    
+    # 4. Opcionalmente desativa quem está ativo no banco mas não consta no CSV
+    desativados = 0
+    if desativar_ausentes:
+        ausentes = [cpf for cpf, (_, ativo) in existentes.items() if ativo and cpf not in por_cpf]
+        print(f"🚫 {len(ausentes)} funcionário(s) ativos ausentes do CSV serão desativados")
+        
+        for lote in _em_lotes(ausentes, TAMANHO_LOTE_FILTRO):
+            try:
+                with metricas.cronometro('desativacao'):
+                    backend.atualizar_onde_em('funcionarios', {'ativo': False}, 'cpf', lote)
+                desativados += len(lote)
+            except Exception as e:
+                erros += len(lote)
+                print(f"❌ Erro ao desativar lote de {len(lote)} funcionários: {e}")
     
     print("\n" + "="*60)
     print("📈 RESUMO DA OPERAÇÃO:")
     print(f"   ✅ Sucessos: {sucessos}")
     print(f"   ➕ Inseridos: {inseridos}")
     print(f"   🔄 Atualizados: {atualizados}")
+    print(f"   ⏸️  Inalterados: {inalterados}")
+    if desativar_ausentes:
+        print(f"   🚫 Desativados (ausentes do CSV): {desativados}")
     print(f"   ❌ Erros: {erros}")
     print(f"   📊 Total processado: {len(funcionarios)}")
     print("="*60)
+    
+    return {
+        'inseridos': inseridos,
+        'atualizados': atualizados,
+        'inalterados': inalterados,
+        'desativados': desativados,
+        'erros': erros
+    }
 
 def main():
     """Função principal"""
     
     print("🚀 Iniciando atualização da tabela 'funcionarios'...\n")
+    metricas.configurar_do_ambiente()
     
-    # 1. Conecta ao Supabase
-    print("🔌 Conectando ao Supabase...")
-    supabase = get_supabase_client()
-    print("✅ Conectado ao Supabase com sucesso!\n")
+    # 1. Conecta ao Supabase (ou ao banco local de dry-run, se ARMAZENAMENTO_LOCAL estiver definida)
+    backend = backend_local_configurado()
+    if backend is not None:
+        print(f"💾 Usando armazenamento local (dry-run): {backend.caminho}\n")
+    else:
+        print("🔌 Conectando ao Supabase...")
+        backend = BackendSupabase(get_supabase_client())
+        print("✅ Conectado ao Supabase com sucesso!\n")
     
     # 2. Verifica se tabela existe
-    verificar_tabela_funcionarios(supabase)
+    verificar_tabela_funcionarios(backend)
     print()
     
     # 3. Lê dados do CSV
@@ -242,10 +314,16 @@ def main():
         print("❌ Operação cancelada pelo usuário.")
         sys.exit(0)
     
+    resposta = input("🤔 Marcar como inativos os funcionários que não constam no CSV? (s/N): ").strip().lower()
+    desativar_ausentes = resposta in ['s', 'sim', 'y', 'yes']
+    
     print()
     
     # 5. Atualiza funcionários
-    atualizar_funcionarios(supabase, funcionarios)
+    try:
+        atualizar_funcionarios(backend, funcionarios, desativar_ausentes=desativar_ausentes)
+    finally:
+        metricas.gravar_resumo('funcionarios')
     
     print("\n✅ Atualização concluída!")
 
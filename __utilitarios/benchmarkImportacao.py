@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+"""
+Benchmark do pipeline de importação (boletins CAV e funcionários)
+
+Gera CSVs sintéticos de boletins CAV e de funcionários em vários tamanhos e mede, etapa
+por etapa, leitura, validação, agregação e gravação. A gravação usa um servidor PostgREST
+simulado local (nada é enviado ao Supabase) ou o banco SQLite local. Cada etapa roda em
+um processo separado, para que o pico de memória (RSS) seja o da própria etapa.
+
+Para cada tamanho e etapa são registrados linhas/s, pico de RSS e número de requisições
+HTTP, e o resultado vai para um JSON que pode ser comparado com o de outra versão.
+
+Uso:
+python benchmarkImportacao.py                                  # 1k, 100k e 1M linhas
+python benchmarkImportacao.py --tamanhos 1000,100000
+python benchmarkImportacao.py --backend sqlite                 # grava no SQLite local
+python benchmarkImportacao.py --comparar benchmark_anterior.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import bisect
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from urllib.parse import urlparse, parse_qs
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Quantidades de linhas geradas por padrão
+TAMANHOS_PADRAO = (1_000, 100_000, 1_000_000)
+
+# Semente dos geradores, para que os arquivos sejam os mesmos entre execuções
+SEMENTE_PADRAO = 42
+
+# Fração das linhas de boletins geradas com erro (setor, turno ou data inválidos)
+PROPORCAO_INVALIDAS = 0.01
+
+# Chave no formato esperado pelo cliente do Supabase, aceita pelo servidor simulado
+CHAVE_SIMULADA = 'benchmark.chave.simulada'
+
+# Arquivo de exemplo de onde vêm as frotas usadas nos boletins sintéticos
+ARQUIVO_EXEMPLO_CAV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'exemplo-diario-cav.csv')
+
+# Resultado gravado por padrão ao lado dos scripts
+ARQUIVO_RESULTADO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_importacao.json')
+
+# Queda de linhas/s, em relação ao JSON comparado, a partir da qual a etapa é apontada como regressão
+TOLERANCIA_REGRESSAO_PADRAO = 0.2
+
+# Tabelas que o servidor simulado mantém em memória (as demais só recebem ids e são descartadas)
+TABELAS_PERSISTIDAS = {'funcionarios'}
+
+CODIGOS_SINTETICOS = [f"C{numero:03d}" for numero in range(1, 41)]
+SETORES_SINTETICOS = ['GUA', 'MOE', 'ALE']
+FRENTES_SINTETICAS = ['Frente 1', 'Frente 2', 'Frente 3', 'Iturama', 'Ouroeste']
+TURNOS_SINTETICOS = ['A', 'B', 'C']
+OPERADORES_SINTETICOS = ['João', 'José', 'Antônio', 'Sebastião', 'Conceição', 'Márcia', 'Luís', 'Inês']
+FUNCOES_SINTETICAS = ['MOTORISTA', 'OPER DE MAQUINAS AGRICOLAS III', 'TRATORISTA', 'MECÂNICO', 'APONTADOR']
+UNIDADES_SINTETICAS = ['ITUIUTABA TRANSPORTE DE RESIDOS', 'ZIRLENO COLHEITA E PLANTIO', 'ITURAMA PLANTIO', 'OUROESTE CAV']
+
+# ---------------------------------------------------------------------------
+# Geração dos CSVs sintéticos
+# ---------------------------------------------------------------------------
+
+def _frotas_exemplo() -> List[int]:
+    """Frotas do exemplo-diario-cav.csv (ou um conjunto fixo, se o arquivo não existir)"""
+
+    from ingestaoCSV import abrir_csv
+
+    frotas = []
+    if os.path.exists(ARQUIVO_EXEMPLO_CAV):
+        with abrir_csv(ARQUIVO_EXEMPLO_CAV) as (reader, _, _):
+            for row in reader:
+                try:
+                    frotas.append(int(row.get('frota') or ''))
+                except ValueError:
+                    continue
+    return frotas or [6131, 6132, 6133]
+
+def gerar_csv_boletins(caminho: str, linhas: int, semente: int = SEMENTE_PADRAO):
+    """Gera um CSV de boletins CAV com as colunas lidas por iterar_boletins_csv"""
+
+    aleatorio = random.Random(semente)
+    frotas = _frotas_exemplo()
+    # Faixa de frotas em torno das do exemplo, para não agrupar tudo em três valores
+    frotas = [frota + deslocamento for frota in frotas for deslocamento in range(0, 300, 10)]
+    inicio = date(2024, 1, 1)
+
+    with open(caminho, 'w', encoding='utf-8', newline='') as arquivo:
+        arquivo.write('data;codigo;frente;setor;frota;turno;operador;producao;observacoes\r\n')
+        for i in range(linhas):
+            data = (inicio + timedelta(days=aleatorio.randrange(90))).strftime('%d/%m/%Y')
+            setor = aleatorio.choice(SETORES_SINTETICOS)
+            turno = aleatorio.choice(TURNOS_SINTETICOS)
+            if aleatorio.random() < PROPORCAO_INVALIDAS:
+                erro = aleatorio.randrange(3)
+                if erro == 0:
+                    setor = 'XYZ'
+                elif erro == 1:
+                    turno = 'D'
+                else:
+                    data = '31/02/2024'
+            observacoes = 'chuva' if i % 50 == 0 else ''
+            arquivo.write(
+                f"{data};{aleatorio.choice(CODIGOS_SINTETICOS)};{aleatorio.choice(FRENTES_SINTETICAS)};{setor};"
+                f"{aleatorio.choice(frotas)};{turno};{aleatorio.choice(OPERADORES_SINTETICOS)} {i % 997};"
+                f"{aleatorio.uniform(0, 300):.2f};{observacoes}\r\n"
+            )
+
+def gerar_csv_funcionarios(caminho: str, linhas: int, semente: int = SEMENTE_PADRAO):
+    """Gera um CSV de funcionários no formato de funcionarios.CSV, com CPFs únicos"""
+
+    aleatorio = random.Random(semente)
+
+    with open(caminho, 'w', encoding='utf-8', newline='') as arquivo:
+        arquivo.write('nome;cpf;funcao;ativo;unidade\r\n')
+        for i in range(linhas):
+            cpf = f"{i:09d}{i % 97:02d}"
+            cpf = f"{cpf[0:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:11]}"
+            ativo = 'SIM' if aleatorio.random() < 0.9 else 'NAO'
+            arquivo.write(
+                f"{aleatorio.choice(OPERADORES_SINTETICOS).upper()} SILVA {i};{cpf};"
+                f"{aleatorio.choice(FUNCOES_SINTETICAS)};{ativo};{aleatorio.choice(UNIDADES_SINTETICAS)}\r\n"
+            )
+
+# ---------------------------------------------------------------------------
+# Servidor PostgREST simulado
+# ---------------------------------------------------------------------------
+
+class _TabelaSimulada:
+    """Linhas de uma tabela persistida, indexadas pela coluna de conflito e ordenáveis por ela"""
+
+    def __init__(self):
+        self.linhas: Dict[Any, Dict[str, Any]] = {}
+        self._chaves_ordenadas: Optional[List[Any]] = None
+
+    def gravar(self, linha: Dict[str, Any], chave: Any):
+        if chave not in self.linhas:
+            self._chaves_ordenadas = None
+        self.linhas.setdefault(chave, {}).update(linha)
+        return self.linhas[chave]
+
+    def chaves_ordenadas(self) -> List[Any]:
+        if self._chaves_ordenadas is None:
+            self._chaves_ordenadas = sorted(self.linhas)
+        return self._chaves_ordenadas
+
+class _TratadorPostgREST(BaseHTTPRequestHandler):
+    """Subconjunto do PostgREST usado pelos importadores: select paginado, insert, upsert e update com in"""
+
+    protocol_version = 'HTTP/1.1'
+    tabelas: Dict[str, _TabelaSimulada] = {}
+    trava = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status: int, corpo: Any):
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _ler_requisicao(self) -> Tuple[str, Dict[str, List[str]], Any]:
+        url = urlparse(self.path)
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        corpo = json.loads(self.rfile.read(tamanho)) if tamanho else None
+        return url.path.rstrip('/').split('/')[-1], parse_qs(url.query), corpo
+
+    def do_GET(self):
+        tabela, parametros, _ = self._ler_requisicao()
+        simulada = self.tabelas.get(tabela)
+        if simulada is None:
+            return self._responder(200, [])
+
+        limite = int(parametros.get('limit', ['1000'])[0])
+        colunas = parametros.get('select', ['*'])[0]
+        # Paginação por chave (coluna=gt.valor), como em buscar_pagina
+        apos = None
+        for coluna, valores in parametros.items():
+            if coluna not in ('select', 'order', 'limit') and valores[0].startswith('gt.'):
+                apos = valores[0][3:]
+
+        with self.trava:
+            chaves = simulada.chaves_ordenadas()
+            inicio = bisect.bisect_right(chaves, apos) if apos is not None else 0
+            linhas = [simulada.linhas[chave] for chave in chaves[inicio:inicio + limite]]
+
+        if colunas != '*':
+            nomes = colunas.split(',')
+            linhas = [{nome: linha.get(nome) for nome in nomes} for linha in linhas]
+        self._responder(200, linhas)
+
+    def do_POST(self):
+        tabela, parametros, corpo = self._ler_requisicao()
+        linhas = corpo if isinstance(corpo, list) else [corpo]
+        conflito = parametros.get('on_conflict', [None])[0]
+
+        gravadas = []
+        with self.trava:
+            simulada = self.tabelas.setdefault(tabela, _TabelaSimulada()) if tabela in TABELAS_PERSISTIDAS else None
+            for linha in linhas:
+                linha = dict(linha)
+                if simulada is not None and conflito in linha and linha[conflito] in simulada.linhas:
+                    gravadas.append(simulada.gravar(linha, linha[conflito]))
+                    continue
+                linha['id'] = str(uuid.uuid4())
+                gravadas.append(simulada.gravar(linha, linha.get(conflito or 'id', linha['id'])) if simulada is not None else linha)
+
+        retorno = 'return=representation' in (self.headers.get('Prefer') or '')
+        self._responder(201, gravadas if retorno else [])
+
+    def do_PATCH(self):
+        tabela, parametros, corpo = self._ler_requisicao()
+        atualizadas = []
+        with self.trava:
+            simulada = self.tabelas.get(tabela)
+            for coluna, valores in parametros.items():
+                if simulada is None or not valores[0].startswith('in.('):
+                    continue
+                chaves = [valor.strip('"') for valor in valores[0][4:-1].split(',')]
+                for chave in chaves:
+                    if chave in simulada.linhas:
+                        atualizadas.append(simulada.gravar(corpo, chave))
+        self._responder(200, atualizadas)
+
+def _servir_postgrest(fila_porta):
+    """Processo do servidor simulado: escuta numa porta livre e informa a porta ao processo principal"""
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _TratadorPostgREST)
+    fila_porta.put(servidor.server_address[1])
+    servidor.serve_forever()
+
+class ServidorSupabaseSimulado:
+    """Servidor PostgREST simulado em processo separado (não disputa CPU nem memória com a etapa medida)"""
+
+    def __enter__(self) -> 'ServidorSupabaseSimulado':
+        contexto = multiprocessing.get_context('spawn')
+        fila_porta = contexto.Queue()
+        self.processo = contexto.Process(target=_servir_postgrest, args=(fila_porta,), daemon=True)
+        self.processo.start()
+        self.url = f"http://127.0.0.1:{fila_porta.get(timeout=30)}"
+        return self
+
+    def __exit__(self, *args):
+        self.processo.terminate()
+        self.processo.join()
+
+# ---------------------------------------------------------------------------
+# Etapas medidas (executadas em processos filhos)
+# ---------------------------------------------------------------------------
+
+def _pico_rss_mb() -> Optional[float]:
+    """Pico de memória residente do processo atual, em MB (None onde `resource` não existe)"""
+
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _criar_backend(tipo: str, destino: str, requisicoes: Counter):
+    """Backend da etapa de gravação; no Supabase simulado, conta as requisições por método e tabela"""
+
+    from armazenamento import BackendSupabase, BackendSQLite, criar_cliente_supabase
+
+    if tipo == 'sqlite':
+        return BackendSQLite(destino)
+
+    # Mesma sessão HTTP (pool, keep-alive, timeouts) usada pelos scripts
+    supabase = criar_cliente_supabase(destino, CHAVE_SIMULADA)
+    backend = BackendSupabase(supabase, requisicoes_por_segundo=None)
+
+    def contar(request):
+        requisicoes[f"{request.method} {request.url.path.rstrip('/').split('/')[-1]}"] += 1
+
+    sessao = supabase.postgrest.session
+    hooks = sessao.event_hooks
+    hooks['request'].append(contar)
+    sessao.event_hooks = hooks
+    return backend
+
+def _etapa_leitura(arquivo: str, **_) -> Dict[str, Any]:
+    """Apenas decodifica e separa as colunas do CSV"""
+
+    from ingestaoCSV import abrir_csv
+
+    inicio = time.perf_counter()
+    with abrir_csv(arquivo) as (reader, _, _):
+        linhas = sum(1 for _ in reader)
+    return {'linhas': linhas, 'segundos': time.perf_counter() - inicio}
+
+def _etapa_validacao(arquivo: str, motor: str = 'linha', **_) -> Dict[str, Any]:
+    """Validação e normalização; a leitura de cada bloco fica fora do tempo medido"""
+
+    import atualizarBoletinsCAV as cav
+    import validacaoColunar
+    from ingestaoCSV import abrir_csv
+    from referenciasCAV import REFERENCIAS_PADRAO as referencias
+
+    segundos = 0.0
+    linhas = aceitos = 0
+    with abrir_csv(arquivo) as (reader, _, _):
+        if motor == 'linha':
+            for bloco in cav._em_lotes(enumerate(reader, 1), cav.TAMANHO_BLOCO_VALIDACAO):
+                inicio = time.perf_counter()
+                aceitos += sum(1 for i, row in bloco if cav._validar_boletim(i, row) is not None)
+                segundos += time.perf_counter() - inicio
+                linhas += len(bloco)
+        else:
+            cabecalho = reader.fieldnames or []
+            for bloco in cav._em_lotes((linha for linha in reader.reader if linha), cav.TAMANHO_BLOCO_VALIDACAO):
+                inicio = time.perf_counter()
+                aceitos += len(validacaoColunar.validar_bloco(
+                    cabecalho, bloco, linhas + 1,
+                    referencias.setores, referencias.frentes, referencias.turnos, cav._validar_boletim
+                ))
+                segundos += time.perf_counter() - inicio
+                linhas += len(bloco)
+    return {'linhas': linhas, 'aceitos': aceitos, 'segundos': segundos}
+
+def _etapa_agregacao(arquivo: str, **_) -> Dict[str, Any]:
+    """Agrupamento e cálculo dos agregados; leitura e validação ficam fora do tempo medido"""
+
+    import atualizarBoletinsCAV as cav
+
+    agregador = cav.AgregadorBoletins()
+    segundos = 0.0
+    linhas = 0
+    boletins = cav.iterar_boletins_csv(arquivo, exibir_cabecalho=False, motor='colunar')
+    for bloco in cav._em_lotes(boletins, cav.TAMANHO_BLOCO_VALIDACAO):
+        inicio = time.perf_counter()
+        for boletim in bloco:
+            agregador.adicionar(boletim)
+        segundos += time.perf_counter() - inicio
+        linhas += len(bloco)
+
+    inicio = time.perf_counter()
+    grupos = len(agregador.agregados())
+    segundos += time.perf_counter() - inicio
+    return {'linhas': linhas, 'grupos': grupos, 'segundos': segundos}
+
+def _etapa_gravacao_boletins(arquivo: str, backend: str, destino: str, **_) -> Dict[str, Any]:
+    """Importação completa (leitura, validação, inserção em lote e agregados), como no main()"""
+
+    import atualizarBoletinsCAV as cav
+
+    requisicoes = Counter()
+    alvo = _criar_backend(backend, destino, requisicoes)
+    linhas = 0
+
+    def contar(boletins):
+        nonlocal linhas
+        for boletim in boletins:
+            linhas += 1
+            yield boletim
+
+    inicio = time.perf_counter()
+    cav.inserir_boletins(alvo, contar(cav.iterar_boletins_csv(arquivo, exibir_cabecalho=False, motor='colunar')))
+    return {'linhas': linhas, 'segundos': time.perf_counter() - inicio, 'requisicoes': dict(requisicoes)}
+
+def _etapa_gravacao_funcionarios(arquivo: str, backend: str, destino: str, **_) -> Dict[str, Any]:
+    """Leitura do CSV e sincronização da tabela funcionarios (carga inicial ou nova rodada sem mudanças)"""
+
+    import atualizarListaFuncionarios as func
+
+    requisicoes = Counter()
+    alvo = _criar_backend(backend, destino, requisicoes)
+
+    inicio = time.perf_counter()
+    funcionarios = func.ler_funcionarios_csv(arquivo)
+    func.atualizar_funcionarios(alvo, funcionarios)
+    return {'linhas': len(funcionarios), 'segundos': time.perf_counter() - inicio, 'requisicoes': dict(requisicoes)}
+
+def _medir_etapa(etapa: Callable[..., Dict[str, Any]], parametros: Dict[str, Any]) -> Dict[str, Any]:
+    """Executa a etapa no processo filho, sem as mensagens dos importadores, e anexa o pico de RSS e as métricas internas"""
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from instrumentacao import metricas
+
+    metricas.reiniciar()
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        resultado = etapa(**parametros)
+    resultado['pico_rss_mb'] = _pico_rss_mb()
+    resultado['instrumentacao'] = metricas.resumo()
+    return resultado
+
+def executar_etapa(nome: str, etapa: Callable[..., Dict[str, Any]], **parametros) -> Dict[str, Any]:
+    """Roda a etapa em um processo novo e calcula linhas/s"""
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        resultado = executor.submit(_medir_etapa, etapa, parametros).result()
+
+    segundos = resultado['segundos']
+    resultado['segundos'] = round(segundos, 4)
+    resultado['linhas_por_segundo'] = round(resultado['linhas'] / segundos, 1) if segundos > 0 else None
+    resultado.setdefault('requisicoes', {})
+    print(f"   ⏱️  {nome:<24} {resultado['linhas']:>9} linhas  {resultado['segundos']:>9.3f}s  "
+          f"{resultado['linhas_por_segundo'] or 0:>11.0f} linhas/s  pico RSS {resultado['pico_rss_mb']} MB  "
+          f"{sum(resultado['requisicoes'].values())} req")
+    return {'etapa': nome, **resultado}
+
+# ---------------------------------------------------------------------------
+# Execução e comparação
+# ---------------------------------------------------------------------------
+
+def executar_benchmark(tamanhos: List[int], backend: str, diretorio: str, semente: int = SEMENTE_PADRAO) -> List[Dict[str, Any]]:
+    """Gera os arquivos de cada tamanho e mede todas as etapas"""
+
+    resultados = []
+    for tamanho in tamanhos:
+        print(f"\n📏 {tamanho} linhas")
+        arquivo_boletins = os.path.join(diretorio, f"boletins_cav_{tamanho}.csv")
+        arquivo_funcionarios = os.path.join(diretorio, f"funcionarios_{tamanho}.csv")
+        gerar_csv_boletins(arquivo_boletins, tamanho, semente)
+        gerar_csv_funcionarios(arquivo_funcionarios, tamanho, semente)
+
+        etapas = [
+            ('leitura', _etapa_leitura, {'arquivo': arquivo_boletins}),
+            ('validacao_linha', _etapa_validacao, {'arquivo': arquivo_boletins, 'motor': 'linha'}),
+            ('validacao_colunar', _etapa_validacao, {'arquivo': arquivo_boletins, 'motor': 'colunar'}),
+            ('agregacao', _etapa_agregacao, {'arquivo': arquivo_boletins}),
+        ]
+
+        with contextlib.ExitStack() as pilha:
+            if backend == 'sqlite':
+                destino = os.path.join(diretorio, f"benchmark_{tamanho}.sqlite3")
+                if os.path.exists(destino):
+                    os.remove(destino)
+            else:
+                destino = pilha.enter_context(ServidorSupabaseSimulado()).url
+
+            gravacao = {'backend': backend, 'destino': destino}
+            etapas += [
+                ('gravacao_boletins', _etapa_gravacao_boletins, {'arquivo': arquivo_boletins, **gravacao}),
+                ('funcionarios_carga', _etapa_gravacao_funcionarios, {'arquivo': arquivo_funcionarios, **gravacao}),
+                ('funcionarios_sem_mudancas', _etapa_gravacao_funcionarios, {'arquivo': arquivo_funcionarios, **gravacao}),
+            ]
+            for nome, etapa, parametros in etapas:
+                resultados.append({'tamanho': tamanho, **executar_etapa(nome, etapa, **parametros)})
+
+    return resultados
+
+def comparar_resultados(atuais: List[Dict[str, Any]], anteriores: List[Dict[str, Any]], tolerancia: float) -> List[str]:
+    """Etapas cuja vazão (linhas/s) caiu mais que `tolerancia` em relação ao resultado anterior"""
+
+    referencia = {(r['tamanho'], r['etapa']): r for r in anteriores}
+    regressoes = []
+    for resultado in atuais:
+        anterior = referencia.get((resultado['tamanho'], resultado['etapa']))
+        if not anterior or not anterior.get('linhas_por_segundo') or not resultado.get('linhas_por_segundo'):
+            continue
+        variacao = resultado['linhas_por_segundo'] / anterior['linhas_por_segundo'] - 1
+        if variacao < -tolerancia:
+            regressoes.append(f"{resultado['etapa']} ({resultado['tamanho']} linhas): "
+                              f"{anterior['linhas_por_segundo']:.0f} → {resultado['linhas_por_segundo']:.0f} linhas/s ({variacao:+.0%})")
+    return regressoes
+
+def main():
+    """Função principal"""
+
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline de importação do __utilitarios')
+    parser.add_argument('--tamanhos', default=','.join(str(t) for t in TAMANHOS_PADRAO),
+                        help='quantidades de linhas separadas por vírgula (padrão: 1000,100000,1000000)')
+    parser.add_argument('--backend', choices=['supabase', 'sqlite'], default='supabase',
+                        help='alvo da gravação: PostgREST simulado local ou SQLite local (padrão: supabase)')
+    parser.add_argument('--saida', default=ARQUIVO_RESULTADO_PADRAO, help='arquivo JSON com os resultados')
+    parser.add_argument('--diretorio', help='onde gerar os CSVs sintéticos (padrão: diretório temporário, apagado no fim)')
+    parser.add_argument('--semente', type=int, default=SEMENTE_PADRAO, help='semente dos dados sintéticos')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior para apontar regressões')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_REGRESSAO_PADRAO,
+                        help='queda de linhas/s tolerada na comparação (padrão: 0.2 = 20%%)')
+    args = parser.parse_args()
+
+    tamanhos = [int(t) for t in args.tamanhos.split(',') if t.strip()]
+
+    print("🏁 Benchmark do pipeline de importação")
+    print(f"   Tamanhos: {', '.join(str(t) for t in tamanhos)} | Gravação: {args.backend}")
+
+    diretorio = args.diretorio or tempfile.mkdtemp(prefix='benchmark_importacao_')
+    os.makedirs(diretorio, exist_ok=True)
+    try:
+        resultados = executar_benchmark(tamanhos, args.backend, diretorio, args.semente)
+    finally:
+        if not args.diretorio:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    relatorio = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'backend': args.backend,
+        'semente': args.semente,
+        'resultados': resultados,
+    }
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            anterior = json.load(arquivo)
+        if anterior.get('backend') != args.backend:
+            print(f"\n⚠️  {args.comparar} foi gerado com gravação em '{anterior.get('backend')}'; as etapas de gravação não são comparáveis")
+        regressoes = comparar_resultados(resultados, anterior['resultados'], args.tolerancia)
+        if regressoes:
+            print(f"\n⚠️  {len(regressoes)} etapa(s) mais lenta(s) que em {args.comparar}:")
+            for regressao in regressoes:
+                print(f"   - {regressao}")
+            sys.exit(1)
+        print(f"\n✅ Nenhuma regressão acima de {args.tolerancia:.0%} em relação a {args.comparar}")
+
+if __name__ == "__main__":
+    main()
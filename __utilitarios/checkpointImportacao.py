@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Checkpoint local (SQLite) das importações de boletins CAV
+
+Registra, por arquivo importado, quais lotes de boletins individuais (com os ids gerados)
+e quais grupos agregados já foram gravados no Supabase. Se a importação for interrompida
+(queda de rede, limite de cota...), rodar de novo com o mesmo arquivo pula o que já foi
+gravado em vez de duplicar os boletins individuais.
+
+O arquivo é identificado pelo hash do conteúdo junto com o tamanho de lote usado,
+já que a numeração dos lotes depende dele, com a configuração que decide quais linhas são
+aceitas (ex.: a impressão das referências do CAV) e com o destino quando não é o Supabase
+(ex.: um SQLite de dry-run), para que um ensaio local não marque o arquivo como importado.
+Uma importação de vários arquivos mesclados é identificada pelos hashes de todos eles, em ordem.
+
+Cada lote guarda também a impressão do seu conteúdo (os hash_boletim, em ordem): na retomada,
+um lote só é pulado se tiver o mesmo número e o mesmo conteúdo (lote_concluido). Um lote que
+mudou é reenviado, e o upsert em hash_boletim evita duplicar o que já estava gravado.
+"""
+
+import os
+import json
+import hashlib
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+# Banco SQLite com os checkpoints, ao lado dos scripts
+ARQUIVO_CHECKPOINT_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoint_importacao.sqlite3')
+
+def impressao_arquivo(caminho: str) -> str:
+    """Hash SHA-1 do conteúdo do arquivo, lido em blocos"""
+
+    sha1 = hashlib.sha1()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            sha1.update(bloco)
+    return sha1.hexdigest()
+
+class CheckpointImportacao:
+    """Lotes e agregados já gravados de uma importação (arquivo + tamanho de lote)"""
+
+    def __init__(self, caminho_csv: Union[str, List[str]], tamanho_lote: int, arquivo_checkpoint: str = ARQUIVO_CHECKPOINT_PADRAO,
+                 destino: Optional[str] = None, configuracao: Optional[str] = None):
+        if isinstance(caminho_csv, str):
+            impressao = impressao_arquivo(caminho_csv)
+            arquivo = os.path.abspath(caminho_csv)
+        else:
+            impressao = hashlib.sha1(':'.join(impressao_arquivo(caminho) for caminho in caminho_csv).encode()).hexdigest()
+            arquivo = ';'.join(os.path.abspath(caminho) for caminho in caminho_csv)
+        self.importacao = f"{impressao}:{tamanho_lote}"
+        if configuracao is not None:
+            self.importacao += f":{configuracao}"
+        if destino is not None:
+            self.importacao += f":{destino}"
+        self.conexao = sqlite3.connect(arquivo_checkpoint)
+        self.conexao.executescript("""
+            CREATE TABLE IF NOT EXISTS importacoes (
+                importacao TEXT PRIMARY KEY,
+                arquivo TEXT NOT NULL,
+                iniciada_em TEXT NOT NULL,
+                concluida_em TEXT
+            );
+            CREATE TABLE IF NOT EXISTS lotes (
+                importacao TEXT NOT NULL,
+                numero INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                ids TEXT,
+                PRIMARY KEY (importacao, numero)
+            );
+            CREATE TABLE IF NOT EXISTS agregados (
+                importacao TEXT NOT NULL,
+                data TEXT NOT NULL,
+                frente TEXT NOT NULL,
+                codigo TEXT NOT NULL,
+                setor TEXT NOT NULL,
+                PRIMARY KEY (importacao, data, frente, codigo, setor)
+            );
+        """)
+        # Checkpoints criados antes da coluna `ids` existir
+        colunas_lotes = {coluna[1] for coluna in self.conexao.execute("PRAGMA table_info(lotes)")}
+        if 'ids' not in colunas_lotes:
+            self.conexao.execute("ALTER TABLE lotes ADD COLUMN ids TEXT")
+        # ... e antes da impressão do conteúdo do lote (lotes sem ela são sempre reenviados)
+        if 'impressao' not in colunas_lotes:
+            self.conexao.execute("ALTER TABLE lotes ADD COLUMN impressao TEXT")
+
+        self.conexao.execute(
+            "INSERT OR IGNORE INTO importacoes (importacao, arquivo, iniciada_em) VALUES (?, ?, ?)",
+            (self.importacao, arquivo, datetime.now().isoformat(timespec='seconds'))
+        )
+        self.conexao.commit()
+
+        self.ids_lotes: Dict[int, Optional[List[Any]]] = {}
+        self.impressoes_lotes: Dict[int, Optional[str]] = {}
+        for numero, ids, impressao_lote in self.conexao.execute(
+                "SELECT numero, ids, impressao FROM lotes WHERE importacao = ?", (self.importacao,)):
+            self.ids_lotes[numero] = json.loads(ids) if ids else None
+            self.impressoes_lotes[numero] = impressao_lote
+        self.lotes_concluidos: Set[int] = set(self.ids_lotes)
+        self.agregados_concluidos: Set[Tuple[str, str, str, str]] = set(self.conexao.execute(
+            "SELECT data, frente, codigo, setor FROM agregados WHERE importacao = ?", (self.importacao,)
+        ))
+
+    @property
+    def retomando(self) -> bool:
+        """Indica se já existe progresso gravado para esta importação"""
+
+        return bool(self.lotes_concluidos or self.agregados_concluidos)
+
+    def lote_concluido(self, numero: int, impressao: str) -> bool:
+        """Se o lote `numero` já foi gravado com o mesmo conteúdo (impressão) e pode ser pulado"""
+
+        return numero in self.lotes_concluidos and self.impressoes_lotes.get(numero) == impressao
+
+    def registrar_lote(self, numero: int, quantidade: int, ids: Optional[List[Any]] = None, impressao: Optional[str] = None):
+        """Marca o lote de boletins individuais como gravado, guardando os ids retornados pelo banco e a impressão do conteúdo"""
+
+        self.conexao.execute(
+            "INSERT OR REPLACE INTO lotes (importacao, numero, quantidade, ids, impressao) VALUES (?, ?, ?, ?, ?)",
+            (self.importacao, numero, quantidade, json.dumps(ids) if ids is not None else None, impressao)
+        )
+        self.conexao.commit()
+        self.lotes_concluidos.add(numero)
+        self.ids_lotes[numero] = ids
+        self.impressoes_lotes[numero] = impressao
+
+    def registrar_agregados(self, chaves: Iterable[Tuple[str, str, str, str]]):
+        """Marca os grupos agregados como gravados"""
+
+        chaves = list(chaves)
+        self.conexao.executemany(
+            "INSERT OR IGNORE INTO agregados (importacao, data, frente, codigo, setor) VALUES (?, ?, ?, ?, ?)",
+            [(self.importacao, *chave) for chave in chaves]
+        )
+        self.conexao.commit()
+        self.agregados_concluidos.update(chaves)
+
+    def concluir(self):
+        """Registra que a importação terminou sem erros"""
+
+        self.conexao.execute(
+            "UPDATE importacoes SET concluida_em = ? WHERE importacao = ?",
+            (datetime.now().isoformat(timespec='seconds'), self.importacao)
+        )
+        self.conexao.commit()
+
+    def fechar(self):
+        """Fecha a conexão com o banco de checkpoints"""
+
+        self.conexao.close()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Horas de motor das frotas (arquivo do diário CAV) para os agregados de boletins
+
+O arquivo de horas traz, por frota, as horas de motor, ociosas e de trabalho de um dia
+(ex.: exemplo-diario-cav.csv, com as colunas frota, h_motor, h_ociosa, h_trabalho). Ele é lido
+uma única vez para um índice em memória por (data, frota), e AgregadorBoletins consulta esse
+índice a cada boletim, na mesma passada que soma a produção, sem consultas ao banco por frota.
+
+A data das horas vem da coluna `data`, se o arquivo tiver uma; senão, do parâmetro `data`
+(--data-horas na linha de comando) ou de uma data AAAA-MM-DD no nome do arquivo.
+
+As horas de uma frota no dia são repartidas entre os grupos (data, frente, codigo, setor) em que
+ela trabalhou, na proporção da sua produção em cada grupo (ou do número de boletins, se a frota
+não produziu nada no dia), de modo que a soma dos grupos é igual às horas do arquivo.
+"""
+
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from instrumentacao import metricas
+from ingestaoCSV import abrir_csv
+
+# Índice das horas: (data AAAA-MM-DD, frota) -> (h_motor, h_ociosa, h_trabalho)
+IndiceHorasFrota = Dict[Tuple[str, int], Tuple[float, float, float]]
+
+# Data no nome do arquivo (ex.: horas-frota-2024-05-01.csv)
+DATA_NO_NOME = re.compile(r'(\d{4}-\d{2}-\d{2})')
+
+def _normalizar_data(valor: str) -> str:
+    """Data dd/MM/yyyy ou yyyy-MM-dd em yyyy-MM-dd (ValueError se inválida)"""
+
+    valor = valor.strip()
+    formato = '%d/%m/%Y' if '/' in valor else '%Y-%m-%d'
+    return datetime.strptime(valor, formato).strftime('%Y-%m-%d')
+
+def _horas(valor: Optional[str], coluna: str) -> float:
+    """Horas de uma célula (aceita vírgula decimal); vazio vale 0"""
+
+    valor = (valor or '').strip().replace(',', '.')
+    horas = float(valor) if valor else 0.0
+    if horas < 0:
+        raise ValueError(f"{coluna} negativo ({horas})")
+    return horas
+
+def _data_do_arquivo(arquivo: str, data: Optional[str]) -> str:
+    if data:
+        return _normalizar_data(data)
+    encontrada = DATA_NO_NOME.search(os.path.basename(arquivo))
+    if encontrada is None:
+        raise ValueError(f"{os.path.basename(arquivo)} não tem coluna data nem data no nome; informe a data das horas")
+    return _normalizar_data(encontrada.group(1))
+
+def ler_horas_frota_csv(arquivo: str, data: Optional[str] = None) -> IndiceHorasFrota:
+    """
+    Lê o arquivo de horas das frotas para o índice (data, frota) -> horas. Sem h_trabalho, vale
+    h_motor - h_ociosa. Linhas repetidas da mesma frota e data são somadas (ex.: uma por turno).
+    """
+
+    indice: IndiceHorasFrota = {}
+    rejeitadas = 0
+
+    with abrir_csv(arquivo) as (reader, _, _):
+        colunas = [coluna.strip() for coluna in reader.fieldnames or []]
+        reader.fieldnames = colunas
+        faltando = [coluna for coluna in ('frota', 'h_motor') if coluna not in colunas]
+        if faltando:
+            raise ValueError(f"{os.path.basename(arquivo)} não tem as colunas: {', '.join(faltando)}")
+        data_arquivo = None if 'data' in colunas else _data_do_arquivo(arquivo, data)
+
+        for i, row in enumerate(reader, 1):
+            try:
+                frota = int((row.get('frota') or '').strip())
+                h_motor = _horas(row.get('h_motor'), 'h_motor')
+                h_ociosa = _horas(row.get('h_ociosa'), 'h_ociosa')
+                h_trabalho = _horas(row.get('h_trabalho'), 'h_trabalho') if 'h_trabalho' in colunas else max(h_motor - h_ociosa, 0.0)
+                chave = (data_arquivo or _normalizar_data(row.get('data') or ''), frota)
+            except ValueError as e:
+                metricas.detalhe(f"⚠️  Horas, linha {i}: {e}, pulando...")
+                rejeitadas += 1
+                continue
+
+            if chave in indice:
+                metricas.detalhe(f"⚠️  Horas, linha {i}: frota {frota} repetida em {chave[0]}, horas somadas")
+                anteriores = indice[chave]
+                indice[chave] = (anteriores[0] + h_motor, anteriores[1] + h_ociosa, anteriores[2] + h_trabalho)
+            else:
+                indice[chave] = (h_motor, h_ociosa, h_trabalho)
+
+    datas = {data_horas for data_horas, _ in indice}
+    print(f"⏱️  Horas de {len(indice)} frota(s)/dia em {len(datas)} data(s) lidas de {os.path.basename(arquivo)}"
+          f"{f' ({rejeitadas} linha(s) rejeitada(s))' if rejeitadas else ''}")
+    return indice
+
+def calcular_utilizacao(producao: float, horas_motor: float, horas_ociosas: float, horas_trabalho: float) -> Dict[str, Any]:
+    """Horas e indicadores de utilização das frotas de um grupo (`producao` das frotas com horas informadas)"""
+
+    return {
+        'horas_motor': round(horas_motor, 2),
+        'horas_ociosas': round(horas_ociosas, 2),
+        'horas_trabalho': round(horas_trabalho, 2),
+        'hectare_por_hora': round(producao / horas_motor, 2) if horas_motor > 0 else 0,
+        'motor_ocioso_perc': round(horas_ociosas / horas_motor * 100, 2) if horas_motor > 0 else 0
+    }
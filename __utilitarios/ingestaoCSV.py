@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Leitura em streaming dos arquivos CSV usados pelos utilitários de importação
+
+A codificação e o delimitador são detectados a partir de uma amostra dos primeiros
+bytes do arquivo; o restante é decodificado aos poucos, linha a linha, sem carregar
+o arquivo inteiro em memória.
+
+- Codificação: BOM (UTF-8 ou UTF-16), senão UTF-8 se a amostra for UTF-8 válido,
+  senão windows-1252.
+- Delimitador: csv.Sniffer sobre as primeiras linhas completas da amostra, que entende
+  campos entre aspas (ex.: observações com ponto e vírgula); se não decidir, vale o
+  separador mais frequente no cabeçalho.
+
+O resultado fica em cache por arquivo (caminho, tamanho e data de modificação), em memória
+e em cache_formato_csv.json, para que execuções seguidas sobre o mesmo arquivo não
+precisem sondá-lo de novo.
+"""
+
+import os
+import csv
+import json
+import codecs
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# Bytes lidos do início do arquivo para detectar codificação e delimitador
+TAMANHO_AMOSTRA = 64 * 1024
+
+# Caracteres da amostra entregues ao csv.Sniffer (cortados na última quebra de linha)
+TAMANHO_AMOSTRA_DELIMITADOR = 16 * 1024
+
+DELIMITADORES_ACEITOS = ';,\t|'
+
+# Cache da detecção por arquivo, ao lado dos scripts, com no máximo LIMITE_CACHE_FORMATO entradas
+ARQUIVO_CACHE_FORMATO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_formato_csv.json')
+LIMITE_CACHE_FORMATO = 256
+
+# BOMs reconhecidos, do mais longo para o mais curto
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Nome do tratador de erros de decodificação registrado abaixo
+TRATADOR_DECODIFICACAO = 'ingestao_csv_fallback'
+
+def _decodificar_com_fallback(erro: UnicodeDecodeError) -> Tuple[str, int]:
+    """
+    Decodifica os bytes inválidos com windows-1252 (ou iso-8859-1, que aceita qualquer byte).
+    Cobre arquivos cuja amostra parecia UTF-8 mas que trazem acentos em ANSI mais adiante.
+    """
+
+    trecho = erro.object[erro.start:erro.end]
+    try:
+        return trecho.decode('windows-1252'), erro.end
+    except UnicodeDecodeError:
+        return trecho.decode('iso-8859-1'), erro.end
+
+codecs.register_error(TRATADOR_DECODIFICACAO, _decodificar_com_fallback)
+
+def impressao_rapida(caminho: str) -> str:
+    """Identifica o arquivo pelo caminho, tamanho e data de modificação (sem ler o conteúdo)"""
+
+    info = os.stat(caminho)
+    return f"{os.path.abspath(caminho)}:{info.st_size}:{info.st_mtime_ns}"
+
+def _detectar_codificacao(amostra: bytes) -> Tuple[str, str]:
+    """Retorna (codificação, texto da amostra)"""
+
+    for bom, encoding in BOMS:
+        if amostra.startswith(bom):
+            return encoding, codecs.getincrementaldecoder(encoding)(errors=TRATADOR_DECODIFICACAO).decode(amostra, final=False)
+
+    # Decodificador incremental: um caractere multibyte cortado no fim da amostra não é erro
+    try:
+        return 'utf-8', codecs.getincrementaldecoder('utf-8')().decode(amostra, final=False)
+    except UnicodeDecodeError:
+        return 'windows-1252', amostra.decode('windows-1252', errors=TRATADOR_DECODIFICACAO)
+
+def _detectar_delimitador(texto: str) -> str:
+    """Delimitador pelo csv.Sniffer nas primeiras linhas completas; senão, o mais frequente no cabeçalho"""
+
+    trecho = texto[:TAMANHO_AMOSTRA_DELIMITADOR]
+    if len(texto) > TAMANHO_AMOSTRA_DELIMITADOR and '\n' in trecho:
+        trecho = trecho[:trecho.rindex('\n') + 1]
+    cabecalho = trecho.splitlines()[0] if trecho else ''
+
+    try:
+        delimitador = csv.Sniffer().sniff(trecho, delimiters=DELIMITADORES_ACEITOS).delimiter
+        # Com uma linha só (ou colunas irregulares) o Sniffer pode escolher um caractere do conteúdo
+        if cabecalho.count(delimitador) > 0:
+            return delimitador
+    except csv.Error:
+        pass
+
+    contagens = {delimitador: cabecalho.count(delimitador) for delimitador in DELIMITADORES_ACEITOS}
+    melhor = max(contagens, key=contagens.get)
+    return melhor if contagens[melhor] > 0 else ','
+
+# Detecções já feitas nesta execução: impressão do arquivo -> (codificação, delimitador)
+_formatos: Dict[str, Tuple[str, str]] = {}
+
+def _ler_cache_formato() -> Dict[str, Tuple[str, str]]:
+    try:
+        with open(ARQUIVO_CACHE_FORMATO, encoding='utf-8') as arquivo:
+            return {chave: tuple(valor) for chave, valor in json.load(arquivo).items()}
+    except (OSError, ValueError):
+        return {}
+
+def _gravar_cache_formato(impressao: str, formato: Tuple[str, str]):
+    cache = _ler_cache_formato()
+    cache.pop(impressao, None)
+    cache[impressao] = formato
+    # Mantém só as entradas mais recentes (o dicionário preserva a ordem de inserção)
+    cache = dict(list(cache.items())[-LIMITE_CACHE_FORMATO:])
+    temporario = f"{ARQUIVO_CACHE_FORMATO}.{os.getpid()}.tmp"
+    try:
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(cache, arquivo, ensure_ascii=False, indent=2)
+        # Troca atômica: processos lendo arquivos em paralelo nunca veem um JSON pela metade
+        os.replace(temporario, ARQUIVO_CACHE_FORMATO)
+    except OSError:
+        pass
+
+def detectar_formato(caminho: str, usar_cache: bool = True) -> Tuple[str, str]:
+    """Retorna (codificação, delimitador) a partir da amostra inicial do arquivo (ou do cache)"""
+
+    impressao: Optional[str] = impressao_rapida(caminho) if usar_cache else None
+    if impressao is not None:
+        formato = _formatos.get(impressao) or _ler_cache_formato().get(impressao)
+        if formato is not None:
+            _formatos[impressao] = formato
+            return formato
+
+    with open(caminho, 'rb') as arquivo:
+        amostra = arquivo.read(TAMANHO_AMOSTRA)
+
+    encoding, texto = _detectar_codificacao(amostra)
+    formato = (encoding, _detectar_delimitador(texto))
+
+    if impressao is not None:
+        _formatos[impressao] = formato
+        _gravar_cache_formato(impressao, formato)
+    return formato
+
+@contextmanager
+def abrir_csv(caminho: str) -> Iterator[Tuple[csv.DictReader, str, str]]:
+    """Abre o CSV em modo streaming e fornece (leitor, codificação, delimitador)"""
+
+    encoding, delimitador = detectar_formato(caminho)
+
+    with open(caminho, 'r', encoding=encoding, errors=TRATADOR_DECODIFICACAO, newline='') as arquivo:
+        yield csv.DictReader(arquivo, delimiter=delimitador), encoding, delimitador
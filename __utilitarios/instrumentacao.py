@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Instrumentação dos importadores (boletins CAV e funcionários)
+
+Acumula o tempo de cada etapa (leitura do CSV, validação, agrupamento, gravação de cada
+lote), contadores (linhas lidas, rejeitadas, retentativas...) e, para cada método + tabela
+da API, número de requisições, bytes enviados/recebidos, status e histograma de latência.
+Ao final da execução o resumo é gravado em JSON.
+
+As mensagens por linha e por lote passam por `detalhe()` e só são exibidas no modo normal;
+no modo silencioso a importação não paga o custo de escrever no console, e linhas de
+progresso periódicas podem substituí-las.
+
+Variáveis de ambiente (também lidas do .env.local):
+VERBOSIDADE_IMPORTACAO=0        # 0 = silencioso, 1 = normal (padrão)
+INTERVALO_PROGRESSO=10          # segundos entre linhas de progresso (0 = desativado, padrão)
+METRICAS_IMPORTACAO=/caminho/para/metricas.json
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional
+import httpx
+
+NIVEL_SILENCIOSO = 0
+NIVEL_NORMAL = 1
+
+# Limites superiores (ms) das faixas do histograma de latência das requisições
+LIMITES_LATENCIA_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Chave usada em request.extensions para guardar o instante de envio
+_INICIO_REQUISICAO = 'instrumentacao_inicio'
+
+class _EstatisticasHTTP:
+    """Totais e histograma de latência de um método + tabela"""
+
+    def __init__(self):
+        self.requisicoes = 0
+        self.bytes_enviados = 0
+        self.bytes_recebidos = 0
+        self.status: Dict[str, int] = {}
+        self.faixas = [0] * (len(LIMITES_LATENCIA_MS) + 1)
+        self.latencia_total_ms = 0.0
+        self.latencia_maxima_ms = 0.0
+
+    def registrar(self, status: int, enviados: int, recebidos: int, latencia_ms: float):
+        self.requisicoes += 1
+        self.bytes_enviados += enviados
+        self.bytes_recebidos += recebidos
+        self.status[str(status)] = self.status.get(str(status), 0) + 1
+        faixa = next((i for i, limite in enumerate(LIMITES_LATENCIA_MS) if latencia_ms <= limite), len(LIMITES_LATENCIA_MS))
+        self.faixas[faixa] += 1
+        self.latencia_total_ms += latencia_ms
+        self.latencia_maxima_ms = max(self.latencia_maxima_ms, latencia_ms)
+
+    def resumo(self) -> Dict[str, Any]:
+        histograma = {f"<={limite}": quantidade for limite, quantidade in zip(LIMITES_LATENCIA_MS, self.faixas)}
+        histograma[f">{LIMITES_LATENCIA_MS[-1]}"] = self.faixas[-1]
+        return {
+            'requisicoes': self.requisicoes,
+            'bytes_enviados': self.bytes_enviados,
+            'bytes_recebidos': self.bytes_recebidos,
+            'status': self.status,
+            'latencia_ms': {
+                'media': round(self.latencia_total_ms / self.requisicoes, 2) if self.requisicoes else None,
+                'maxima': round(self.latencia_maxima_ms, 2),
+                'histograma': histograma,
+            },
+        }
+
+class Instrumentacao:
+    """Tempos por etapa, contadores e estatísticas HTTP de uma execução, compartilhados entre threads"""
+
+    def __init__(self, verbosidade: int = NIVEL_NORMAL, intervalo_progresso: float = 0.0):
+        self.verbosidade = verbosidade
+        self.intervalo_progresso = intervalo_progresso
+        self.arquivo_metricas: Optional[str] = None
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Zera as métricas (início de uma nova execução)"""
+
+        self._lock = threading.Lock()
+        self.iniciada_em = datetime.now()
+        self._inicio = time.perf_counter()
+        self._ultimo_progresso = self._inicio
+        self.etapas: Dict[str, Dict[str, float]] = {}
+        self.contadores: Dict[str, int] = {}
+        self.http: Dict[str, _EstatisticasHTTP] = {}
+
+    def configurar_do_ambiente(self):
+        """Lê VERBOSIDADE_IMPORTACAO, INTERVALO_PROGRESSO e METRICAS_IMPORTACAO"""
+
+        self.verbosidade = int(os.getenv('VERBOSIDADE_IMPORTACAO') or NIVEL_NORMAL)
+        self.intervalo_progresso = float(os.getenv('INTERVALO_PROGRESSO') or 0)
+        self.arquivo_metricas = os.getenv('METRICAS_IMPORTACAO') or None
+
+    @property
+    def silencioso(self) -> bool:
+        return self.verbosidade <= NIVEL_SILENCIOSO
+
+    def detalhe(self, mensagem: str):
+        """Mensagem por linha ou por lote, omitida no modo silencioso"""
+
+        if self.verbosidade > NIVEL_SILENCIOSO:
+            print(mensagem)
+
+    def adicionar_tempo(self, etapa: str, segundos: float):
+        with self._lock:
+            totais = self.etapas.setdefault(etapa, {'segundos': 0.0, 'chamadas': 0})
+            totais['segundos'] += segundos
+            totais['chamadas'] += 1
+
+    @contextmanager
+    def cronometro(self, etapa: str) -> Iterator[None]:
+        """Soma ao total da etapa o tempo gasto dentro do bloco `with`"""
+
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.adicionar_tempo(etapa, time.perf_counter() - inicio)
+
+    def medir_iteracao(self, etapa: str, itens: Iterable[Any]) -> Iterator[Any]:
+        """Repassa os itens de um iterador somando à etapa o tempo gasto para produzir cada um"""
+
+        iterador = iter(itens)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                item = next(iterador)
+            except StopIteration:
+                self.adicionar_tempo(etapa, time.perf_counter() - inicio)
+                return
+            self.adicionar_tempo(etapa, time.perf_counter() - inicio)
+            yield item
+
+    def contar(self, nome: str, quantidade: int = 1):
+        with self._lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def mesclar(self, resumo: Dict[str, Any]):
+        """Soma etapas e contadores de um resumo gerado em outro processo (ex.: leitura paralela)"""
+
+        with self._lock:
+            for etapa, totais in resumo.get('etapas', {}).items():
+                acumulado = self.etapas.setdefault(etapa, {'segundos': 0.0, 'chamadas': 0})
+                acumulado['segundos'] += totais['segundos']
+                acumulado['chamadas'] += totais['chamadas']
+            for nome, quantidade in resumo.get('contadores', {}).items():
+                self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def progresso(self, descricao: str, concluidos: int, total: Optional[int] = None):
+        """Linha de progresso, no máximo uma a cada `intervalo_progresso` segundos"""
+
+        if not self.intervalo_progresso:
+            return
+
+        agora = time.perf_counter()
+        with self._lock:
+            if agora - self._ultimo_progresso < self.intervalo_progresso:
+                return
+            self._ultimo_progresso = agora
+
+        decorrido = agora - self._inicio
+        alvo = f"/{total}" if total is not None else ''
+        print(f"⏳ [{decorrido:6.0f}s] {descricao}: {concluidos}{alvo} ({concluidos / decorrido:.0f}/s)")
+
+    # --- HTTP -----------------------------------------------------------------
+
+    def _ao_enviar(self, request: httpx.Request):
+        request.extensions[_INICIO_REQUISICAO] = time.perf_counter()
+
+    def _ao_receber(self, response: httpx.Response):
+        request = response.request
+        inicio = request.extensions.get(_INICIO_REQUISICAO)
+        latencia_ms = (time.perf_counter() - inicio) * 1000 if inicio is not None else 0.0
+        try:
+            enviados = len(request.content)
+        except httpx.RequestNotRead:
+            enviados = 0
+        recebidos = int(response.headers.get('Content-Length') or 0)
+        chave = f"{request.method} {request.url.path.rstrip('/').split('/')[-1]}"
+
+        with self._lock:
+            estatisticas = self.http.get(chave)
+            if estatisticas is None:
+                estatisticas = self.http[chave] = _EstatisticasHTTP()
+            estatisticas.registrar(response.status_code, enviados, recebidos, latencia_ms)
+
+    def instalar_na_sessao(self, sessao: httpx.Client):
+        """Registra os hooks de medição na sessão HTTP, antes dos demais hooks de resposta"""
+
+        hooks = sessao.event_hooks
+        if self._ao_enviar not in hooks['request']:
+            hooks['request'].append(self._ao_enviar)
+            hooks['response'].insert(0, self._ao_receber)
+            sessao.event_hooks = hooks
+
+    # --- Resumo ---------------------------------------------------------------
+
+    def resumo(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'iniciada_em': self.iniciada_em.isoformat(timespec='seconds'),
+                'duracao_segundos': round(time.perf_counter() - self._inicio, 3),
+                'etapas': {
+                    etapa: {'segundos': round(totais['segundos'], 4), 'chamadas': totais['chamadas']}
+                    for etapa, totais in self.etapas.items()
+                },
+                'contadores': dict(self.contadores),
+                'http': {chave: estatisticas.resumo() for chave, estatisticas in sorted(self.http.items())},
+            }
+
+    def gravar_resumo(self, nome_execucao: str) -> str:
+        """Grava o resumo em METRICAS_IMPORTACAO (ou metricas_<execução>.json ao lado dos scripts)"""
+
+        caminho = self.arquivo_metricas or os.path.join(os.path.dirname(os.path.abspath(__file__)), f"metricas_{nome_execucao}.json")
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump({'execucao': nome_execucao, **self.resumo()}, arquivo, ensure_ascii=False, indent=2)
+        print(f"📊 Métricas da execução gravadas em {caminho}")
+        return caminho
+
+# Instância compartilhada pelos scripts e pelos backends de armazenamento
+metricas = Instrumentacao()
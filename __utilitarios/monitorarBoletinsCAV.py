@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Ingestão contínua dos CSVs de boletins CAV deixados em uma pasta
+
+A exportação de campo cria CSVs na pasta de entrada (por padrão, __utilitarios/) e acrescenta
+linhas a eles ao longo do dia. Em vez de reimportar o arquivo inteiro a cada carga, o monitor
+guarda, por arquivo, até que byte ele já foi importado e, a cada mudança, lê só o que foi
+acrescentado:
+
+- A pasta é observada com inotify (Linux, via ctypes, sem dependência extra). Sem inotify, ou
+  com --polling, os arquivos são conferidos a cada `intervalo` segundos; com inotify, a pasta
+  também é conferida nesse intervalo, cobrindo eventos perdidos.
+- Codificação, delimitador e cabeçalho são detectados uma vez (ingestaoCSV) e guardados junto
+  com a posição; as leituras seguintes decodificam só os bytes novos. Uma linha ainda
+  incompleta no fim do arquivo (sem quebra de linha, ou com aspas abertas) fica para depois.
+- As linhas novas passam pela mesma validação de iterar_boletins_csv e são gravadas por
+  inserir_boletins com agregacao='servidor': só os agregados das chaves (data, frente, codigo,
+  setor) que receberam boletins são recalculados no banco, a partir de todos os boletins
+  gravados (um trecho do arquivo não tem os boletins anteriores do grupo).
+- A posição só avança depois de uma gravação sem erros; se falhar, as mesmas linhas são relidas
+  na próxima conferência, e o hash_boletim impede que fiquem duplicadas.
+- Linhas rejeitadas por uma frente, setor ou turno ainda não cadastrado ficam guardadas junto
+  com a posição e são validadas de novo ao iniciar e a cada releitura das referências
+  (RECARGA_REFERENCIAS): depois do cadastro, entram no banco sem reimportar o arquivo.
+- Arquivo truncado ou substituído (menor que a posição guardada, ou com outro cabeçalho) é
+  relido do início; os boletins já gravados são reconhecidos pelo hash_boletim.
+- Arquivos cujo cabeçalho não tem as colunas dos boletins (ex.: funcionarios.CSV) são ignorados.
+
+As posições ficam no mesmo SQLite dos checkpoints de importação, por arquivo e destino.
+
+Uso (pela linha de comando de importação):
+python importacao.py monitorar --sim
+python importacao.py monitorar /dados/cav/entrada --sim --intervalo 5 --silencioso
+python importacao.py monitorar /dados/cav/entrada --sim --uma-vez
+"""
+
+import io
+import os
+import csv
+import json
+import time
+import codecs
+import ctypes
+import ctypes.util
+import hashlib
+import select
+import sqlite3
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from instrumentacao import metricas
+from armazenamento import BackendArmazenamento
+from checkpointImportacao import ARQUIVO_CHECKPOINT_PADRAO
+from ingestaoCSV import TRATADOR_DECODIFICACAO, detectar_formato
+from referenciasCAV import CONJUNTOS_POR_TIPO, ReferenciasCAV, carregar_referencias
+from atualizarBoletinsCAV import TAMANHO_LOTE_PADRAO, WORKERS_PADRAO, _validar_boletim, inserir_boletins
+
+if TYPE_CHECKING:  # só nas anotações: quem usa o snapshot o abre (abrir_snapshot)
+    from snapshotBoletinsCAV import SnapshotBoletins
+
+# Pasta observada por padrão: a mesma em que os scripts procuram o CSV de boletins
+PASTA_PADRAO = os.path.dirname(os.path.abspath(__file__))
+
+# Segundos entre conferências da pasta (polling, ou segurança contra eventos perdidos do inotify)
+INTERVALO_PADRAO = 2.0
+
+# Espera depois de um evento do inotify para juntar a rajada de escritas de uma exportação
+ESPERA_RAJADA = 0.5
+
+# Bytes lidos por vez de um arquivo: a primeira leitura de um arquivo grande é importada em partes
+TAMANHO_LEITURA = 8 * 1024 * 1024
+
+# Colunas sem as quais o arquivo não é um CSV de boletins
+COLUNAS_OBRIGATORIAS = ('data', 'codigo', 'frente', 'setor')
+
+# Segundos até reler frentes, setores e turnos do banco, sem o cache, e validar de novo as linhas
+# rejeitadas por um valor não cadastrado (a releitura da validação acontece só uma vez por carga)
+RECARGA_REFERENCIAS = 60 * 60
+
+# inotify(7): criação, escrita, fechamento após escrita e arquivo movido para a pasta
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+EVENTOS_INOTIFY = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+class ObservadorInotify:
+    """Espera por mudanças na pasta via inotify; criar() retorna None onde não houver inotify"""
+
+    def __init__(self, pasta: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        if libc.inotify_add_watch(self.fd, os.fsencode(pasta), EVENTOS_INOTIFY) < 0:
+            erro = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(erro, f"inotify_add_watch falhou em {pasta}")
+
+    @classmethod
+    def criar(cls, pasta: str) -> Optional['ObservadorInotify']:
+        try:
+            return cls(pasta)
+        except (OSError, AttributeError):  # AttributeError: libc sem inotify (fora do Linux)
+            return None
+
+    def aguardar(self, timeout: float) -> bool:
+        """Bloqueia até uma mudança na pasta ou até `timeout` segundos; indica se houve mudança"""
+
+        prontos, _, _ = select.select([self.fd], [], [], timeout)
+        if not prontos:
+            return False
+        time.sleep(ESPERA_RAJADA)
+        # Os eventos só acordam o monitor: quais arquivos mudaram é decidido pelo os.stat
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def fechar(self):
+        os.close(self.fd)
+
+class PosicoesArquivos:
+    """Posição (byte) até onde cada arquivo já foi importado em um destino, com o formato detectado"""
+
+    def __init__(self, destino: Optional[str], arquivo_checkpoint: str = ARQUIVO_CHECKPOINT_PADRAO):
+        self.destino = destino or ''
+        self.conexao = sqlite3.connect(arquivo_checkpoint)
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS posicoes_arquivos (
+                arquivo TEXT NOT NULL,
+                destino TEXT NOT NULL,
+                deslocamento INTEGER NOT NULL,
+                linhas INTEGER NOT NULL,
+                codificacao TEXT NOT NULL,
+                delimitador TEXT NOT NULL,
+                cabecalho TEXT NOT NULL,
+                tamanho_cabecalho INTEGER NOT NULL,
+                impressao_cabecalho TEXT NOT NULL,
+                ignorado INTEGER NOT NULL DEFAULT 0,
+                atualizado_em TEXT NOT NULL,
+                PRIMARY KEY (arquivo, destino)
+            )
+        """)
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS linhas_pendentes_arquivos (
+                arquivo TEXT NOT NULL,
+                destino TEXT NOT NULL,
+                linha INTEGER NOT NULL,
+                conteudo TEXT NOT NULL,
+                registrado_em TEXT NOT NULL,
+                PRIMARY KEY (arquivo, destino, linha)
+            )
+        """)
+        self.conexao.commit()
+
+    def obter(self, arquivo: str) -> Optional[Dict[str, Any]]:
+        cursor = self.conexao.execute(
+            "SELECT deslocamento, linhas, codificacao, delimitador, cabecalho, tamanho_cabecalho, impressao_cabecalho, ignorado "
+            "FROM posicoes_arquivos WHERE arquivo = ? AND destino = ?",
+            (os.path.abspath(arquivo), self.destino)
+        )
+        linha = cursor.fetchone()
+        if linha is None:
+            return None
+        posicao = dict(zip((coluna[0] for coluna in cursor.description), linha))
+        posicao['cabecalho'] = json.loads(posicao['cabecalho'])
+        posicao['ignorado'] = bool(posicao['ignorado'])
+        return posicao
+
+    def gravar(self, arquivo: str, posicao: Dict[str, Any], pendentes: List[Tuple[int, Dict[str, str]]] = ()):
+        """Grava a posição e, na mesma transação, as linhas (número, conteúdo) que ficam pendentes"""
+
+        agora = datetime.now().isoformat(timespec='seconds')
+        self.conexao.executemany(
+            "INSERT OR REPLACE INTO linhas_pendentes_arquivos (arquivo, destino, linha, conteudo, registrado_em) VALUES (?, ?, ?, ?, ?)",
+            [(os.path.abspath(arquivo), self.destino, numero, json.dumps(row, ensure_ascii=False), agora)
+             for numero, row in pendentes]
+        )
+        self.conexao.execute(
+            "INSERT OR REPLACE INTO posicoes_arquivos (arquivo, destino, deslocamento, linhas, codificacao, delimitador, "
+            "cabecalho, tamanho_cabecalho, impressao_cabecalho, ignorado, atualizado_em) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (os.path.abspath(arquivo), self.destino, posicao['deslocamento'], posicao['linhas'], posicao['codificacao'],
+             posicao['delimitador'], json.dumps(posicao['cabecalho'], ensure_ascii=False), posicao['tamanho_cabecalho'],
+             posicao['impressao_cabecalho'], int(posicao['ignorado']), agora)
+        )
+        self.conexao.commit()
+
+    def pendentes(self) -> List[Tuple[str, int, Dict[str, str]]]:
+        """(arquivo, número da linha, conteúdo) das linhas pendentes do destino, na ordem dos arquivos"""
+
+        cursor = self.conexao.execute(
+            "SELECT arquivo, linha, conteudo FROM linhas_pendentes_arquivos WHERE destino = ? ORDER BY arquivo, linha",
+            (self.destino,)
+        )
+        return [(arquivo, numero, json.loads(conteudo)) for arquivo, numero, conteudo in cursor]
+
+    def remover_pendentes(self, linhas: List[Tuple[str, int]]):
+        """Remove as linhas (arquivo, número) que não estão mais pendentes"""
+
+        self.conexao.executemany(
+            "DELETE FROM linhas_pendentes_arquivos WHERE arquivo = ? AND destino = ? AND linha = ?",
+            [(arquivo, self.destino, numero) for arquivo, numero in linhas]
+        )
+        self.conexao.commit()
+
+    def descartar_pendentes(self, arquivo: str):
+        """Descarta as linhas pendentes de um arquivo que será relido do início"""
+
+        self.conexao.execute("DELETE FROM linhas_pendentes_arquivos WHERE arquivo = ? AND destino = ?",
+                             (os.path.abspath(arquivo), self.destino))
+        self.conexao.commit()
+
+    def fechar(self):
+        self.conexao.close()
+
+def _codificacao_continuacao(codificacao: str, inicio: bytes) -> Tuple[str, int]:
+    """
+    (codificação para decodificar a partir do meio do arquivo, tamanho do BOM): sem o BOM e,
+    no UTF-16, com a ordem de bytes fixada pelo BOM do início do arquivo
+    """
+
+    if codificacao == 'utf-8-sig':
+        return 'utf-8', len(codecs.BOM_UTF8)
+    if codificacao == 'utf-16':
+        return ('utf-16-be' if inicio.startswith(codecs.BOM_UTF16_BE) else 'utf-16-le'), len(codecs.BOM_UTF16_LE)
+    return codificacao, 0
+
+def _fim_registros_completos(dados: bytes, codificacao: str, considerar_aspas: bool = True) -> int:
+    """
+    Posição logo após a última quebra de linha de `dados` fora de aspas (0 se não houver):
+    o que vem depois é um registro ainda sendo escrito
+    """
+
+    quebra = '\n'.encode(codificacao)
+    aspas = '"'.encode(codificacao)
+    largura = len(quebra)
+
+    # Aspas antes de `posicao`; a quebra está fora de aspas se esse número for par
+    restantes = dados.count(aspas) if considerar_aspas else 0
+    posicao = len(dados)
+    while True:
+        anterior = dados.rfind(quebra, 0, posicao)
+        if anterior == -1:
+            return 0
+        if considerar_aspas:
+            restantes -= dados.count(aspas, anterior, posicao)
+        posicao = anterior
+        # No UTF-16 só valem quebras alinhadas ao caractere
+        if posicao % largura == 0 and restantes % 2 == 0:
+            return posicao + largura
+
+def _fim_primeiro_registro(dados: bytes, codificacao: str) -> int:
+    """Posição logo após a primeira quebra de linha de `dados` fora de aspas (0 se não houver)"""
+
+    quebra = '\n'.encode(codificacao)
+    aspas = '"'.encode(codificacao)
+    largura = len(quebra)
+
+    aspas_antes = 0
+    contadas_ate = 0
+    posicao = dados.find(quebra)
+    while posicao != -1:
+        aspas_antes += dados.count(aspas, contadas_ate, posicao)
+        contadas_ate = posicao
+        if posicao % largura == 0 and aspas_antes % 2 == 0:
+            return posicao + largura
+        posicao = dados.find(quebra, posicao + 1)
+    return 0
+
+def _detectar_cabecalho(caminho: str) -> Optional[Dict[str, Any]]:
+    """Posição inicial de um arquivo novo (ou substituído): formato e cabeçalho; None se o cabeçalho ainda não foi escrito"""
+
+    codificacao, delimitador = detectar_formato(caminho, usar_cache=False)
+    with open(caminho, 'rb') as arquivo:
+        inicio = arquivo.read(TAMANHO_LEITURA)
+
+    continuacao, tamanho_bom = _codificacao_continuacao(codificacao, inicio)
+    fim = _fim_primeiro_registro(inicio[tamanho_bom:], continuacao)
+    if fim == 0:
+        return None
+    fim += tamanho_bom
+
+    texto = inicio[tamanho_bom:fim].decode(continuacao, errors=TRATADOR_DECODIFICACAO)
+    cabecalho = next(csv.reader(io.StringIO(texto, newline=''), delimiter=delimitador), [])
+    return {
+        'deslocamento': fim,
+        'linhas': 0,
+        'codificacao': continuacao,
+        'delimitador': delimitador,
+        'cabecalho': cabecalho,
+        'tamanho_cabecalho': fim,
+        'impressao_cabecalho': hashlib.sha1(inicio[:fim]).hexdigest(),
+        'ignorado': not all(coluna in cabecalho for coluna in COLUNAS_OBRIGATORIAS),
+    }
+
+def _cabecalho_mudou(caminho: str, posicao: Dict[str, Any], tamanho: int) -> bool:
+    """Arquivo truncado ou substituído desde a última leitura"""
+
+    if tamanho < posicao['deslocamento']:
+        return True
+    with open(caminho, 'rb') as arquivo:
+        inicio = arquivo.read(posicao['tamanho_cabecalho'])
+    return hashlib.sha1(inicio).hexdigest() != posicao['impressao_cabecalho']
+
+def _referencia_desconhecida(row: Dict[str, str], referencias: ReferenciasCAV) -> bool:
+    """Se a linha tem uma frente, setor ou turno preenchido e não cadastrado (pode passar a valer com um cadastro novo)"""
+
+    valores = {
+        'frente': (row.get('frente') or '').strip(),
+        'setor': (row.get('setor') or '').strip().upper(),
+        'turno': (row.get('turno') or '').strip().upper(),
+    }
+    return any(valor and valor not in getattr(referencias, CONJUNTOS_POR_TIPO[tipo]) for tipo, valor in valores.items())
+
+def importar_trecho(backend: BackendArmazenamento, caminho: str, posicao: Dict[str, Any], referencias: ReferenciasCAV,
+                    tamanho_lote: int = TAMANHO_LOTE_PADRAO, workers: int = WORKERS_PADRAO,
+                    snapshot: Optional['SnapshotBoletins'] = None
+                    ) -> Optional[Tuple[Dict[str, Any], List[Tuple[int, Dict[str, str]]]]]:
+    """
+    Importa o próximo trecho de registros completos do arquivo a partir de `posicao` (até
+    TAMANHO_LEITURA bytes). Retorna a nova posição e as linhas (número, conteúdo) rejeitadas
+    por uma frente, setor ou turno não cadastrado, que devem ser guardadas como pendentes; ou
+    None se não havia registro completo. Se a gravação tiver erros, levanta RuntimeError sem
+    avançar a posição.
+    """
+
+    with open(caminho, 'rb') as arquivo:
+        arquivo.seek(posicao['deslocamento'])
+        dados = arquivo.read(TAMANHO_LEITURA)
+
+    fim = _fim_registros_completos(dados, posicao['codificacao'])
+    if fim == 0 and len(dados) == TAMANHO_LEITURA:
+        # Aspas sem fechamento: sem este recurso o arquivo nunca mais avançaria
+        print(f"⚠️  {os.path.basename(caminho)}: aspas sem fechamento após o byte {posicao['deslocamento']}; "
+              "o trecho será lido linha a linha")
+        fim = _fim_registros_completos(dados, posicao['codificacao'], considerar_aspas=False)
+    if fim == 0:
+        return None
+
+    with metricas.cronometro('leitura_csv'):
+        texto = dados[:fim].decode(posicao['codificacao'], errors=TRATADOR_DECODIFICACAO)
+        linhas = list(csv.DictReader(io.StringIO(texto, newline=''), fieldnames=posicao['cabecalho'],
+                                     delimiter=posicao['delimitador']))
+
+    # Numeração das linhas continua a do arquivo, como em iterar_boletins_csv
+    boletins, pendentes = [], []
+    with metricas.cronometro('validacao'):
+        for i, row in enumerate(linhas, posicao['linhas'] + 1):
+            boletim = _validar_boletim(i, row, referencias)
+            if boletim is not None:
+                boletins.append(boletim)
+            elif _referencia_desconhecida(row, referencias):
+                pendentes.append((i, row))
+    metricas.contar('linhas_lidas', len(linhas))
+    metricas.contar('linhas_rejeitadas', len(linhas) - len(boletins))
+
+    print(f"📥 {os.path.basename(caminho)}: {len(linhas)} linha(s) nova(s), {len(boletins)} boletim(ns) válido(s)"
+          + (f", {len(pendentes)} pendente(s) de cadastro" if pendentes else ""))
+    if boletins:
+        resumo = inserir_boletins(backend, boletins, tamanho_lote=tamanho_lote, workers=workers,
+                                  referencias=referencias, agregacao='servidor', snapshot=snapshot)
+        if resumo['erros']:
+            raise RuntimeError(f"{resumo['erros']} erro(s) na gravação; as mesmas linhas serão relidas na próxima conferência")
+
+    return {**posicao, 'deslocamento': posicao['deslocamento'] + fim, 'linhas': posicao['linhas'] + len(linhas)}, pendentes
+
+def reprocessar_pendentes(backend: BackendArmazenamento, posicoes: PosicoesArquivos, referencias: ReferenciasCAV,
+                          tamanho_lote: int = TAMANHO_LOTE_PADRAO, workers: int = WORKERS_PADRAO,
+                          snapshot: Optional['SnapshotBoletins'] = None) -> int:
+    """
+    Valida de novo as linhas pendentes de cadastro e grava as que passaram a valer. Continuam
+    pendentes só as que ainda têm um valor não cadastrado; as rejeitadas por outro motivo são
+    descartadas. Retorna o número de boletins gravados; se a gravação tiver erros, levanta
+    RuntimeError e mantém todas as linhas pendentes.
+    """
+
+    pendentes = posicoes.pendentes()
+    if not pendentes:
+        return 0
+
+    boletins, resolvidas = [], []
+    with metricas.cronometro('validacao'):
+        for arquivo, numero, row in pendentes:
+            boletim = _validar_boletim(numero, row, referencias)
+            if boletim is not None:
+                boletins.append(boletim)
+                resolvidas.append((arquivo, numero))
+            elif not _referencia_desconhecida(row, referencias):
+                resolvidas.append((arquivo, numero))
+
+    print(f"🔁 Linhas pendentes de cadastro: {len(pendentes)}, {len(boletins)} boletim(ns) agora válido(s)")
+    if boletins:
+        resumo = inserir_boletins(backend, boletins, tamanho_lote=tamanho_lote, workers=workers,
+                                  referencias=referencias, agregacao='servidor', snapshot=snapshot)
+        if resumo['erros']:
+            raise RuntimeError(f"{resumo['erros']} erro(s) na gravação das linhas pendentes; serão validadas de novo na próxima releitura")
+    posicoes.remover_pendentes(resolvidas)
+    return len(boletins)
+
+def _arquivos_csv(pasta: str) -> List[str]:
+    return sorted(
+        os.path.join(pasta, nome) for nome in os.listdir(pasta)
+        if nome.lower().endswith('.csv') and os.path.isfile(os.path.join(pasta, nome))
+    )
+
+def monitorar_pasta(backend: BackendArmazenamento, pasta: str = PASTA_PADRAO, referencias: Optional[ReferenciasCAV] = None,
+                    intervalo: float = INTERVALO_PADRAO, polling: bool = False, uma_vez: bool = False,
+                    tamanho_lote: int = TAMANHO_LOTE_PADRAO, workers: int = WORKERS_PADRAO,
+                    snapshot: Optional['SnapshotBoletins'] = None) -> Dict[str, int]:
+    """
+    Importa continuamente as linhas acrescentadas aos CSVs de boletins da pasta, até Ctrl+C.
+    Com `uma_vez`, importa o que estiver pendente e retorna. Retorna os totais da execução.
+    """
+
+    if intervalo <= 0:
+        raise ValueError("intervalo deve ser maior que zero")
+
+    referencias = referencias or carregar_referencias(backend)
+    referencias_em = time.monotonic()
+    posicoes = PosicoesArquivos(backend.destino_checkpoint)
+    observador = None if polling or uma_vez else ObservadorInotify.criar(pasta)
+    totais = {'trechos': 0, 'linhas': 0, 'reprocessadas': 0, 'erros': 0}
+    recarregadas = True  # as linhas pendentes de execuções anteriores são conferidas com as referências recém-carregadas
+
+    # (tamanho, mtime, inode) de cada arquivo na última conferência: os inalterados nem são abertos
+    assinaturas: Dict[str, Tuple[int, int, int]] = {}
+
+    if not uma_vez:
+        modo = "inotify" if observador is not None else f"conferência a cada {intervalo:g}s"
+        print(f"👀 Monitorando {pasta} ({modo}); Ctrl+C para encerrar")
+
+    try:
+        while True:
+            if time.monotonic() - referencias_em >= RECARGA_REFERENCIAS:
+                referencias = carregar_referencias(backend, validade=0)
+                referencias_em = time.monotonic()
+                recarregadas = True
+            if recarregadas:
+                try:
+                    totais['reprocessadas'] += reprocessar_pendentes(backend, posicoes, referencias, tamanho_lote, workers, snapshot)
+                    recarregadas = False
+                except Exception as e:
+                    print(f"❌ Falha ao reprocessar as linhas pendentes: {e}")
+                    totais['erros'] += 1
+
+            for caminho in _arquivos_csv(pasta):
+                try:
+                    info = os.stat(caminho)
+                    assinatura = (info.st_size, info.st_mtime_ns, info.st_ino)
+                    if assinaturas.get(caminho) == assinatura:
+                        continue
+
+                    posicao = posicoes.obter(caminho)
+                    if posicao is not None and _cabecalho_mudou(caminho, posicao, info.st_size):
+                        print(f"♻️  {os.path.basename(caminho)} foi truncado ou substituído; relendo do início")
+                        posicoes.descartar_pendentes(caminho)
+                        posicao = None
+                    if posicao is None:
+                        posicao = _detectar_cabecalho(caminho)
+                        if posicao is None:
+                            continue  # cabeçalho ainda incompleto: conferido de novo no próximo ciclo
+                        if posicao['ignorado']:
+                            print(f"⏭️  {os.path.basename(caminho)} não tem as colunas {', '.join(COLUNAS_OBRIGATORIAS)}; ignorado")
+                        posicoes.gravar(caminho, posicao)
+
+                    if not posicao['ignorado']:
+                        while True:
+                            trecho = importar_trecho(backend, caminho, posicao, referencias, tamanho_lote, workers, snapshot)
+                            if trecho is None:
+                                break
+                            nova, pendentes = trecho
+                            totais['trechos'] += 1
+                            totais['linhas'] += nova['linhas'] - posicao['linhas']
+                            posicoes.gravar(caminho, nova, pendentes)
+                            posicao = nova
+
+                    # Com erro de gravação a assinatura não é guardada, e o arquivo é conferido de novo
+                    assinaturas[caminho] = assinatura
+                except Exception as e:
+                    print(f"❌ Falha ao importar {caminho}: {e}")
+                    totais['erros'] += 1
+
+            if uma_vez:
+                break
+            if observador is not None:
+                observador.aguardar(intervalo)
+            else:
+                time.sleep(intervalo)
+    except KeyboardInterrupt:
+        print("\n⏹️  Monitoramento encerrado")
+    finally:
+        posicoes.fechar()
+        if observador is not None:
+            observador.fechar()
+
+    print("\n" + "="*60)
+    print("📈 RESUMO DO MONITORAMENTO:")
+    print(f"   📥 Trechos importados: {totais['trechos']}")
+    print(f"   📄 Linhas lidas: {totais['linhas']}")
+    print(f"   🔁 Boletins pendentes gravados depois do cadastro: {totais['reprocessadas']}")
+    print(f"   ❌ Falhas: {totais['erros']}")
+    print("="*60)
+
+    return totais
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Reagregação do histórico de boletins CAV
+
+Recalcula boletins_cav_agregado a partir dos boletins_cav já gravados, por exemplo depois de
+uma mudança nas fórmulas de calcular_agregados_por_total ou na lâmina alvo de uma frente.
+
+Boletins e agregados do intervalo de datas pedido são lidos em páginas, por chave
+(data, frente, id), seguindo os índices (data, frente) das duas tabelas. Os agregados são
+calculados em memória uma data por vez: só os boletins e os agregados gravados de uma data
+ficam em memória. Cada agregado calculado é comparado com o gravado, as diferenças são
+exibidas e só os agregados novos ou alterados são gravados (upsert em lotes).
+
+Requisitos:
+pip install supabase python-dotenv
+
+Uso (pela linha de comando de importação):
+python importacao.py reagregar --de 2024-05-01 --ate 2024-05-31 --simular
+python importacao.py reagregar --sim
+"""
+
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from instrumentacao import metricas
+from armazenamento import BackendArmazenamento
+from referenciasCAV import ReferenciasCAV, REFERENCIAS_PADRAO
+from atualizarBoletinsCAV import AgregadorBoletins, ChaveGrupo, TAMANHO_LOTE_PADRAO, _em_lotes
+
+# Linhas por requisição na leitura paginada (limite padrão de linhas do PostgREST)
+TAMANHO_PAGINA = 1000
+
+# Ordem da leitura paginada: a data define a janela; frente e id completam a chave única
+ORDEM_LEITURA = ('data', 'frente', 'id')
+
+# Campos de boletins_cav_agregado recalculados e comparados com o valor gravado
+CAMPOS_CALCULADOS = (
+    'total_producao', 'total_viagens_feitas', 'total_viagens_orcadas', 'dif_viagens_perc',
+    'lamina_alvo', 'lamina_aplicada', 'dif_lamina_perc', 'registros_granulares',
+)
+
+COLUNAS_BOLETINS = 'id,data,frente,codigo,setor,producao'
+COLUNAS_AGREGADOS = 'id,data,frente,codigo,setor,' + ','.join(CAMPOS_CALCULADOS)
+
+def iterar_paginado(backend: BackendArmazenamento, tabela: str, colunas: str, intervalo: Tuple[str, Any, Any],
+                    tamanho_pagina: int = TAMANHO_PAGINA) -> Iterator[Dict[str, Any]]:
+    """Lê a tabela em páginas por chave (data, frente, id) dentro do intervalo de datas"""
+
+    apos: Optional[List[Any]] = None
+    while True:
+        with metricas.cronometro(f"leitura_{tabela}"):
+            pagina = backend.buscar_pagina_ordenada(tabela, colunas, ORDEM_LEITURA, apos, tamanho_pagina, intervalo)
+        metricas.contar(f"linhas_lidas_{tabela}", len(pagina))
+        yield from pagina
+        if len(pagina) < tamanho_pagina:
+            return
+        apos = [pagina[-1][coluna] for coluna in ORDEM_LEITURA]
+
+def _janelas(boletins: Iterator[Dict[str, Any]], agregados: Iterator[Dict[str, Any]]) -> Iterator[Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """Junta as duas leituras (ordenadas por data) em (data, boletins da data, agregados da data)"""
+
+    por_data_boletins = ((data, list(linhas)) for data, linhas in groupby(boletins, key=itemgetter('data')))
+    por_data_agregados = ((data, list(linhas)) for data, linhas in groupby(agregados, key=itemgetter('data')))
+    proximo_boletins = next(por_data_boletins, None)
+    proximo_agregados = next(por_data_agregados, None)
+
+    while proximo_boletins is not None or proximo_agregados is not None:
+        data = min(proximo[0] for proximo in (proximo_boletins, proximo_agregados) if proximo is not None)
+        linhas_boletins: List[Dict[str, Any]] = []
+        linhas_agregados: List[Dict[str, Any]] = []
+        if proximo_boletins is not None and proximo_boletins[0] == data:
+            linhas_boletins = proximo_boletins[1]
+            proximo_boletins = next(por_data_boletins, None)
+        if proximo_agregados is not None and proximo_agregados[0] == data:
+            linhas_agregados = proximo_agregados[1]
+            proximo_agregados = next(por_data_agregados, None)
+        yield data, linhas_boletins, linhas_agregados
+
+def _normalizar(campo: str, valor: Any) -> Any:
+    """Valor comparável: números com 2 casas e ids de registros_granulares como texto, ordenados"""
+
+    if valor is None:
+        return None
+    if campo == 'registros_granulares':
+        # A ordem dos ids depende de como os boletins foram lidos ou gravados, não do agregado
+        return sorted(str(registro_id) for registro_id in (valor or {}).get('uuids', []))
+    return round(float(valor), 2)
+
+def diferencas(gravado: Dict[str, Any], calculado: Dict[str, Any]) -> Dict[str, Tuple[Any, Any]]:
+    """{campo: (valor gravado, valor recalculado)} dos campos calculados que mudaram"""
+
+    resultado = {}
+    for campo in CAMPOS_CALCULADOS:
+        antes = _normalizar(campo, gravado.get(campo))
+        depois = _normalizar(campo, calculado.get(campo))
+        if antes != depois:
+            resultado[campo] = (antes, depois)
+    return resultado
+
+def _descrever(chave: ChaveGrupo, mudancas: Dict[str, Tuple[Any, Any]]) -> str:
+    partes = []
+    for campo, (antes, depois) in mudancas.items():
+        if campo == 'registros_granulares':
+            antes = f"{len(antes)} boletins" if antes is not None else None
+            depois = f"{len(depois)} boletins"
+        partes.append(f"{campo} {antes} → {depois}")
+    return f"    ✏️  {' | '.join(chave)}: {'; '.join(partes)}"
+
+def reagregar_boletins(backend: BackendArmazenamento, data_inicial: Optional[str] = None, data_final: Optional[str] = None,
+                       referencias: Optional[ReferenciasCAV] = None, simular: bool = False,
+                       tamanho_lote: int = TAMANHO_LOTE_PADRAO, tamanho_pagina: int = TAMANHO_PAGINA) -> Dict[str, int]:
+    """
+    Recalcula os agregados das datas entre `data_inicial` e `data_final` (inclusive; None = sem
+    limite) e grava, via upsert em lotes de `tamanho_lote`, apenas os novos ou alterados.
+    Com `simular`, só exibe as diferenças. Agregados sem nenhum boletim na data são apenas
+    informados. Retorna os totais exibidos no resumo.
+    """
+
+    if tamanho_lote < 1:
+        raise ValueError("tamanho_lote deve ser maior que zero")
+
+    referencias = referencias or REFERENCIAS_PADRAO
+    intervalo = ('data', data_inicial, data_final)
+    totais = {'datas': 0, 'boletins': 0, 'novos': 0, 'alterados': 0, 'inalterados': 0, 'orfaos': 0, 'gravados': 0, 'erros': 0}
+    pendentes: List[Dict[str, Any]] = []
+
+    def gravar(lote: List[Dict[str, Any]]):
+        try:
+            with metricas.cronometro('gravacao_agregados'):
+                backend.upsert('boletins_cav_agregado', lote, 'data,frente,codigo,setor')
+            totais['gravados'] += len(lote)
+            metricas.detalhe(f"    ✅ Lote de agregados gravado: {len(lote)} registros")
+        except Exception as e:
+            print(f"    ❌ Erro ao gravar lote de {len(lote)} agregados: {e}")
+            totais['erros'] += len(lote)
+
+    print(f"🔁 Reagregando boletins de {data_inicial or 'início'} até {data_final or 'fim'}"
+          f"{' (simulação: nada será gravado)' if simular else ''}...")
+
+    boletins = iterar_paginado(backend, 'boletins_cav', COLUNAS_BOLETINS, intervalo, tamanho_pagina)
+    agregados = iterar_paginado(backend, 'boletins_cav_agregado', COLUNAS_AGREGADOS, intervalo, tamanho_pagina)
+
+    for data, linhas_boletins, linhas_agregados in _janelas(boletins, agregados):
+        totais['datas'] += 1
+        totais['boletins'] += len(linhas_boletins)
+
+        with metricas.cronometro('calculo_agregados'):
+            agregador = AgregadorBoletins(referencias)
+            for boletim in linhas_boletins:
+                agregador.adicionar(boletim)
+            calculados = agregador.agregados()
+
+        gravados = {(a['data'], a['frente'], a['codigo'], a['setor']): a for a in linhas_agregados}
+        for chave, calculado in calculados.items():
+            if chave not in gravados:
+                totais['novos'] += 1
+                metricas.detalhe(f"    ➕ {' | '.join(chave)}: agregado ausente, será criado")
+            else:
+                mudancas = diferencas(gravados[chave], calculado)
+                if not mudancas:
+                    totais['inalterados'] += 1
+                    continue
+                totais['alterados'] += 1
+                metricas.detalhe(_descrever(chave, mudancas))
+            # Na simulação os agregados só são contados: guardá-los manteria em memória todos os do intervalo
+            if not simular:
+                pendentes.append(calculado)
+
+        for chave in sorted(gravados.keys() - calculados.keys(), key=str):
+            totais['orfaos'] += 1
+            metricas.detalhe(f"    ⚠️  {' | '.join(str(parte) for parte in chave)}: agregado sem boletins (mantido)")
+
+        while len(pendentes) >= tamanho_lote:
+            gravar(pendentes[:tamanho_lote])
+            pendentes = pendentes[tamanho_lote:]
+
+        metricas.progresso('datas reagregadas', totais['datas'])
+
+    for lote in _em_lotes(pendentes, tamanho_lote):
+        gravar(lote)
+
+    print("\n" + "="*60)
+    print("📈 RESUMO DA REAGREGAÇÃO:")
+    print(f"   📅 Datas processadas: {totais['datas']}")
+    print(f"   📄 Boletins lidos: {totais['boletins']}")
+    print(f"   ➕ Agregados novos: {totais['novos']}")
+    print(f"   ✏️  Agregados alterados: {totais['alterados']}")
+    print(f"   ⏸️  Agregados inalterados: {totais['inalterados']}")
+    print(f"   ⚠️  Agregados sem boletins: {totais['orfaos']}")
+    if simular:
+        print("   🧪 Simulação: nenhum agregado foi gravado")
+    else:
+        print(f"   ✅ Agregados gravados: {totais['gravados']}")
+    print(f"   ❌ Erros: {totais['erros']}")
+    print("="*60)
+
+    return totais
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Reconciliação dos CSVs de origem com o banco (boletins CAV, agregados e funcionários)
+
+Confere se boletins_cav, boletins_cav_agregado e funcionarios têm exatamente o que está nos
+CSVs, sem SQL manual, em uma passada linear por tabela:
+
+- O lado do CSV vira um índice em memória pela chave de hash de cada linha (hash_boletim para
+  boletins, CPF para funcionários), com os agregados calculados dos mesmos boletins.
+- O lado do banco é lido em páginas por chave (data, frente, id), como na reagregação, e cada
+  linha é procurada no índice uma única vez: encontrada, é comparada; não encontrada, é extra.
+  O que sobra no índice está ausente do banco.
+
+Boletins são comparados pelo hash_boletim (data, codigo, frente, setor, frota, turno, operador e
+produção) e, quando o hash bate, pela observação e lâmina alvo. Um boletim ausente e um extra com
+a mesma data, frente, codigo, setor, frota, turno e operador são informados como uma divergência
+de produção. Os agregados do CSV usam a produção com 2 casas, como gravada no banco.
+
+O escopo da comparação são as datas e frentes presentes nos CSVs: boletins e agregados de outras
+frentes, ou de dias que os CSVs não trazem, não são considerados extras. Com --de/--ate, os CSVs
+passam a ser a origem de todo o intervalo, em todas as frentes.
+
+Opcionalmente, as diferenças viram um plano de correção (JSON) com o mínimo de operações em
+lotes: exclusão dos boletins extras, upsert dos ausentes e alterados pelo hash_boletim,
+recálculo no banco dos agregados afetados (recalcular_agregados_cav, que também remove os agregados
+sem boletins), upsert dos funcionários pelo CPF e desativação dos ativos ausentes do CSV (como
+--desativar-ausentes). O plano guarda o destino em que foi gerado e só é aplicado nele.
+
+Requisitos:
+pip install supabase python-dotenv
+
+Uso (pela linha de comando de importação):
+python importacao.py reconciliar --boletins /dados/cav/safra/ --funcionarios /dados/rh/ --plano plano.json
+python importacao.py reconciliar --aplicar plano.json --sim
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from instrumentacao import metricas
+from armazenamento import BackendArmazenamento
+from referenciasCAV import ReferenciasCAV, REFERENCIAS_PADRAO
+from atualizarBoletinsCAV import (AgregadorBoletins, ChaveGrupo, CHAVES_POR_RECALCULO, TAMANHO_LOTE_PADRAO, _em_lotes,
+                                  _preparar_boletim_insert)
+from atualizarListaFuncionarios import TAMANHO_LOTE_FILTRO, _hash_funcionario, buscar_hashes_funcionarios
+from reagregarBoletinsCAV import CAMPOS_CALCULADOS, TAMANHO_PAGINA, _normalizar, iterar_paginado
+
+# Campos de cada boletim guardados no índice do CSV, na ordem das tuplas do índice
+CAMPOS_BOLETIM = ('data', 'codigo', 'frente', 'setor', 'frota', 'turno', 'operador', 'producao', 'observacoes', 'lamina_alvo')
+
+# Campos fora do hash_boletim, comparados quando o hash bate
+CAMPOS_FORA_DO_HASH = ('observacoes', 'lamina_alvo')
+
+# Identificação de um boletim sem a produção: liga um ausente a um extra como divergência
+CHAVE_NATURAL = ('data', 'frente', 'codigo', 'setor', 'frota', 'turno', 'operador')
+
+# Campos dos agregados comparados (registros_granulares depende dos ids gravados, não do CSV)
+CAMPOS_AGREGADO = tuple(campo for campo in CAMPOS_CALCULADOS if campo != 'registros_granulares')
+
+# Campos derivados da produção: o cálculo deste script (float) e o do banco (NUMERIC) podem
+# arredondar a última casa de um valor terminado em 5 para lados diferentes
+CAMPOS_COM_TOLERANCIA = ('total_viagens_feitas', 'total_viagens_orcadas', 'dif_viagens_perc', 'lamina_aplicada', 'dif_lamina_perc')
+TOLERANCIA_AGREGADO = 0.011
+
+COLUNAS_BOLETINS = 'id,hash_boletim,' + ','.join(CAMPOS_BOLETIM)
+COLUNAS_AGREGADOS = 'id,data,frente,codigo,setor,' + ','.join(CAMPOS_AGREGADO)
+
+# Índice do CSV: hash_boletim -> valores de CAMPOS_BOLETIM
+IndiceBoletins = Dict[str, Tuple[Any, ...]]
+
+def _comparavel(campo: str, valor: Any) -> Any:
+    """Valor comparável entre CSV e banco: números com 2 casas e texto vazio como None"""
+
+    if valor is None or valor == '':
+        return None
+    if campo in ('producao', 'lamina_alvo'):
+        return round(float(valor), 2)
+    return valor
+
+def _agregado_difere(campo: str, gravado: Any, calculado: Any) -> bool:
+    antes, depois = _normalizar(campo, gravado), _normalizar(campo, calculado)
+    if campo in CAMPOS_COM_TOLERANCIA and antes is not None and depois is not None:
+        return abs(antes - depois) > TOLERANCIA_AGREGADO
+    return antes != depois
+
+def _descrever_boletim(valores: Dict[str, Any]) -> str:
+    return (f"{valores['data']} | {valores['frente']} | {valores['codigo']} | {valores['setor']} | "
+            f"frota {valores['frota']} | turno {valores['turno'] or '-'} | {valores['operador'] or '-'}")
+
+def indexar_boletins(boletins: Iterable[Dict[str, Any]], referencias: ReferenciasCAV,
+                     data_inicial: Optional[str] = None, data_final: Optional[str] = None) -> Tuple[IndiceBoletins, AgregadorBoletins, int]:
+    """
+    Índice hash_boletim -> boletim dos CSVs no intervalo (boletins repetidos contam uma vez, como
+    na importação) e o agregador com a produção de cada grupo. Retorna (índice, agregador, repetidos).
+    """
+
+    indice: IndiceBoletins = {}
+    agregador = AgregadorBoletins(referencias)
+    repetidos = 0
+
+    with metricas.cronometro('indexacao_csv'):
+        for boletim in boletins:
+            if (data_inicial and boletim['data'] < data_inicial) or (data_final and boletim['data'] > data_final):
+                continue
+            linha = _preparar_boletim_insert(boletim, referencias)
+            if linha['hash_boletim'] in indice:
+                repetidos += 1
+                continue
+            linha['producao'] = round(linha['producao'], 2)
+            indice[linha['hash_boletim']] = tuple(linha[campo] for campo in CAMPOS_BOLETIM)
+            agregador.adicionar(linha)
+
+    return indice, agregador, repetidos
+
+def _operacoes(base: Dict[str, Any], campo: str, itens: List[Any], tamanho: int) -> List[Dict[str, Any]]:
+    """A mesma operação do plano em lotes de até `tamanho` itens em `campo`"""
+
+    return [{**base, campo: lote} for lote in _em_lotes(itens, tamanho)]
+
+def reconciliar_boletins(backend: BackendArmazenamento, boletins: Iterable[Dict[str, Any]],
+                         referencias: Optional[ReferenciasCAV] = None, data_inicial: Optional[str] = None,
+                         data_final: Optional[str] = None, tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+                         tamanho_pagina: int = TAMANHO_PAGINA) -> Tuple[Dict[str, int], List[Dict[str, Any]]]:
+    """
+    Compara os boletins dos CSVs (e os agregados calculados deles) com boletins_cav e
+    boletins_cav_agregado. Com `data_inicial`/`data_final`, só os boletins do intervalo são
+    comparados e o intervalo inteiro, em todas as frentes, entra no escopo; sem eles, só as
+    datas e frentes presentes nos CSVs. Retorna (totais, operações do plano de correção).
+    """
+
+    if tamanho_lote < 1:
+        raise ValueError("tamanho_lote deve ser maior que zero")
+
+    referencias = referencias or REFERENCIAS_PADRAO
+    indice, agregador, repetidos = indexar_boletins(boletins, referencias, data_inicial, data_final)
+    totais = {
+        'boletins_csv': len(indice), 'repetidos_csv': repetidos, 'boletins_banco': 0, 'boletins_iguais': 0,
+        'boletins_ausentes': 0, 'boletins_extras': 0, 'boletins_divergentes': 0, 'boletins_alterados': 0,
+        'agregados_iguais': 0, 'agregados_ausentes': 0, 'agregados_extras': 0, 'agregados_alterados': 0,
+    }
+
+    intervalo_explicito = data_inicial is not None or data_final is not None
+    posicao_data = CAMPOS_BOLETIM.index('data')
+    posicao_frente = CAMPOS_BOLETIM.index('frente')
+    particoes = {(valores[posicao_data], valores[posicao_frente]) for valores in indice.values()}
+    datas = sorted(data for data, _ in particoes)
+    if not datas and not intervalo_explicito:
+        print("⚠️  Nenhum boletim válido nos CSVs: nada a reconciliar")
+        return totais, []
+    # Sem --de/--ate, o intervalo lido do banco vai da primeira à última data dos CSVs
+    intervalo = ('data', data_inicial or (datas[0] if datas else None), data_final or (datas[-1] if datas else None))
+
+    def no_escopo(linha: Dict[str, Any]) -> bool:
+        return intervalo_explicito or (linha['data'], linha['frente']) in particoes
+
+    print(f"🔎 Reconciliando {len(indice)} boletins dos CSVs com o banco, de {intervalo[1] or 'início'} até {intervalo[2] or 'fim'}...")
+
+    # 1. Boletins: cada linha do banco é procurada no índice uma única vez
+    vistos = set()
+    extras: List[Dict[str, Any]] = []
+    alterados: List[str] = []
+    for linha in iterar_paginado(backend, 'boletins_cav', COLUNAS_BOLETINS, intervalo, tamanho_pagina):
+        if not no_escopo(linha):
+            continue
+        totais['boletins_banco'] += 1
+        metricas.progresso('boletins conferidos', totais['boletins_banco'])
+        valores = indice.get(linha.get('hash_boletim'))
+        if valores is None or linha['hash_boletim'] in vistos:
+            extras.append(linha)
+            continue
+        vistos.add(linha['hash_boletim'])
+        csv = dict(zip(CAMPOS_BOLETIM, valores))
+        mudancas = [f"{campo} {linha.get(campo)!r} → {csv[campo]!r}" for campo in CAMPOS_FORA_DO_HASH
+                    if _comparavel(campo, linha.get(campo)) != _comparavel(campo, csv[campo])]
+        if mudancas:
+            totais['boletins_alterados'] += 1
+            alterados.append(linha['hash_boletim'])
+            metricas.detalhe(f"    ✏️  {_descrever_boletim(csv)}: {'; '.join(mudancas)}")
+        else:
+            totais['boletins_iguais'] += 1
+
+    ausentes = [hash_boletim for hash_boletim in indice if hash_boletim not in vistos]
+
+    # Ausente e extra com a mesma identificação: a produção (ou outro campo do hash) diverge
+    ausentes_por_chave: Dict[Tuple[Any, ...], List[str]] = {}
+    for hash_boletim in ausentes:
+        csv = dict(zip(CAMPOS_BOLETIM, indice[hash_boletim]))
+        ausentes_por_chave.setdefault(tuple(csv[campo] for campo in CHAVE_NATURAL), []).append(hash_boletim)
+    for linha in extras:
+        pares = ausentes_por_chave.get(tuple(linha.get(campo) for campo in CHAVE_NATURAL))
+        if pares:
+            csv = dict(zip(CAMPOS_BOLETIM, indice[pares.pop()]))
+            totais['boletins_divergentes'] += 1
+            metricas.detalhe(f"    ✏️  {_descrever_boletim(csv)}: producao {_comparavel('producao', linha.get('producao'))} → "
+                             f"{csv['producao']}")
+        else:
+            totais['boletins_extras'] += 1
+            metricas.detalhe(f"    ➖ {_descrever_boletim(linha)}: boletim {linha['id']} no banco sem linha nos CSVs")
+    totais['boletins_ausentes'] = sum(len(pares) for pares in ausentes_por_chave.values())
+    for pares in ausentes_por_chave.values():
+        for hash_boletim in pares:
+            metricas.detalhe(f"    ➕ {_descrever_boletim(dict(zip(CAMPOS_BOLETIM, indice[hash_boletim])))}: boletim ausente no banco")
+
+    # 2. Agregados: os calculados dos CSVs contra os gravados
+    calculados = agregador.agregados()
+    afetados = set()
+    for gravado in iterar_paginado(backend, 'boletins_cav_agregado', COLUNAS_AGREGADOS, intervalo, tamanho_pagina):
+        if not no_escopo(gravado):
+            continue
+        chave: ChaveGrupo = (gravado['data'], gravado['frente'], gravado['codigo'], gravado['setor'])
+        calculado = calculados.pop(chave, None)
+        if calculado is None:
+            totais['agregados_extras'] += 1
+            afetados.add(chave)
+            metricas.detalhe(f"    ➖ {' | '.join(chave)}: agregado no banco sem boletins nos CSVs")
+            continue
+        mudancas = [f"{campo} {_normalizar(campo, gravado.get(campo))} → {_normalizar(campo, calculado[campo])}"
+                    for campo in CAMPOS_AGREGADO if _agregado_difere(campo, gravado.get(campo), calculado[campo])]
+        if mudancas:
+            totais['agregados_alterados'] += 1
+            afetados.add(chave)
+            metricas.detalhe(f"    ✏️  {' | '.join(chave)}: {'; '.join(mudancas)}")
+        else:
+            totais['agregados_iguais'] += 1
+    totais['agregados_ausentes'] = len(calculados)
+    for chave in calculados:
+        afetados.add(chave)
+        metricas.detalhe(f"    ➕ {' | '.join(chave)}: agregado ausente no banco")
+
+    # 3. Plano: exclui os extras, grava ausentes e alterados e recalcula os agregados afetados
+    gravar = [dict(zip(CAMPOS_BOLETIM, indice[hash_boletim]), hash_boletim=hash_boletim) for hash_boletim in ausentes + alterados]
+    for linha in extras + gravar:
+        afetados.add((linha['data'], linha['frente'], linha['codigo'], linha['setor']))
+    chaves = [{'data': data, 'frente': frente, 'codigo': codigo, 'setor': setor} for data, frente, codigo, setor in sorted(afetados)]
+    operacoes = (
+        _operacoes({'operacao': 'excluir', 'tabela': 'boletins_cav', 'coluna': 'id'}, 'filtro',
+                   [str(linha['id']) for linha in extras], TAMANHO_LOTE_FILTRO)
+        + _operacoes({'operacao': 'upsert', 'tabela': 'boletins_cav', 'conflito': 'hash_boletim'}, 'linhas', gravar, tamanho_lote)
+        + _operacoes({'operacao': 'recalcular_agregados'}, 'chaves', chaves, CHAVES_POR_RECALCULO)
+    )
+
+    print("\n" + "="*60)
+    print("📈 RECONCILIAÇÃO DOS BOLETINS:")
+    print(f"   📄 Boletins nos CSVs: {totais['boletins_csv']}"
+          f"{f' (+{repetidos} repetidos)' if repetidos else ''} | no banco: {totais['boletins_banco']}")
+    print(f"   ✅ Iguais: {totais['boletins_iguais']}")
+    print(f"   ➕ Ausentes no banco: {totais['boletins_ausentes']}")
+    print(f"   ➖ Extras no banco: {totais['boletins_extras']}")
+    print(f"   ✏️  Com produção divergente: {totais['boletins_divergentes']}")
+    print(f"   ✏️  Com observação ou lâmina alvo diferente: {totais['boletins_alterados']}")
+    print(f"   📊 Agregados iguais: {totais['agregados_iguais']} | ausentes: {totais['agregados_ausentes']} | "
+          f"extras: {totais['agregados_extras']} | diferentes: {totais['agregados_alterados']}")
+    print("="*60)
+
+    return totais, operacoes
+
+def reconciliar_funcionarios(backend: BackendArmazenamento, funcionarios: List[Dict[str, Any]],
+                             tamanho_lote: int = TAMANHO_LOTE_PADRAO) -> Tuple[Dict[str, int], List[Dict[str, Any]]]:
+    """
+    Compara os funcionários dos CSVs (para CPF repetido vale a última linha) com a tabela
+    funcionarios. Extras são os CPFs ativos no banco que não constam nos CSVs.
+    Retorna (totais, operações do plano de correção).
+    """
+
+    if tamanho_lote < 1:
+        raise ValueError("tamanho_lote deve ser maior que zero")
+
+    por_cpf = {funcionario['cpf']: funcionario for funcionario in funcionarios}
+    print(f"🔎 Reconciliando {len(por_cpf)} funcionários dos CSVs com o banco...")
+    with metricas.cronometro('busca_existentes'):
+        existentes = buscar_hashes_funcionarios(backend)
+
+    totais = {'funcionarios_csv': len(por_cpf), 'funcionarios_banco': len(existentes), 'funcionarios_iguais': 0,
+              'funcionarios_ausentes': 0, 'funcionarios_extras': 0, 'funcionarios_alterados': 0}
+    gravar = []
+    for cpf, funcionario in por_cpf.items():
+        existente = existentes.get(cpf)
+        if existente is None:
+            totais['funcionarios_ausentes'] += 1
+            metricas.detalhe(f"    ➕ {funcionario['nome']} ({cpf}): funcionário ausente no banco")
+        elif existente[0] != _hash_funcionario(funcionario):
+            totais['funcionarios_alterados'] += 1
+            metricas.detalhe(f"    ✏️  {funcionario['nome']} ({cpf}): nome, função, situação ou unidade diferente")
+        else:
+            totais['funcionarios_iguais'] += 1
+            continue
+        gravar.append({campo: funcionario[campo] for campo in ('nome', 'cpf', 'funcao', 'ativo', 'unidade')})
+
+    extras = [cpf for cpf, (_, ativo) in existentes.items() if ativo and cpf not in por_cpf]
+    totais['funcionarios_extras'] = len(extras)
+    for cpf in extras:
+        metricas.detalhe(f"    ➖ {cpf}: ativo no banco e ausente dos CSVs")
+
+    operacoes = (
+        _operacoes({'operacao': 'upsert', 'tabela': 'funcionarios', 'conflito': 'cpf'}, 'linhas', gravar, tamanho_lote)
+        + _operacoes({'operacao': 'atualizar', 'tabela': 'funcionarios', 'valores': {'ativo': False}, 'coluna': 'cpf'},
+                     'filtro', extras, TAMANHO_LOTE_FILTRO)
+    )
+
+    print("\n" + "="*60)
+    print("📈 RECONCILIAÇÃO DOS FUNCIONÁRIOS:")
+    print(f"   📄 Funcionários nos CSVs: {totais['funcionarios_csv']} | no banco: {totais['funcionarios_banco']}")
+    print(f"   ✅ Iguais: {totais['funcionarios_iguais']}")
+    print(f"   ➕ Ausentes no banco: {totais['funcionarios_ausentes']}")
+    print(f"   ➖ Ativos no banco e ausentes dos CSVs: {totais['funcionarios_extras']}")
+    print(f"   ✏️  Diferentes: {totais['funcionarios_alterados']}")
+    print("="*60)
+
+    return totais, operacoes
+
+def gravar_plano(backend: BackendArmazenamento, operacoes: List[Dict[str, Any]], arquivo: str):
+    """Grava o plano de correção (JSON) com o destino em que foi gerado"""
+
+    plano = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'destino': backend.destino_checkpoint,
+        'operacoes': operacoes,
+    }
+    with open(arquivo, 'w', encoding='utf-8') as saida:
+        json.dump(plano, saida, ensure_ascii=False, indent=1)
+    print(f"📝 Plano de correção com {len(operacoes)} operação(ões) gravado em {arquivo}")
+
+def aplicar_plano(backend: BackendArmazenamento, arquivo: str) -> Dict[str, int]:
+    """
+    Aplica as operações do plano, em ordem, pelos métodos de gravação do backend. Uma operação
+    com erro não interrompe as seguintes. Levanta ValueError se o plano foi gerado em outro destino.
+    """
+
+    with open(arquivo, encoding='utf-8') as entrada:
+        plano = json.load(entrada)
+    if plano.get('destino') != backend.destino_checkpoint:
+        raise ValueError(f"O plano foi gerado para outro destino ({plano.get('destino') or 'Supabase'}); "
+                         f"reconcilie de novo em {backend.destino_checkpoint or 'Supabase'}")
+
+    operacoes = plano['operacoes']
+    totais = {'operacoes': 0, 'linhas': 0, 'erros': 0}
+    print(f"🛠️  Aplicando {len(operacoes)} operação(ões) do plano de {plano.get('gerado_em')}...")
+
+    for n, operacao in enumerate(operacoes, 1):
+        tipo = operacao['operacao']
+        try:
+            with metricas.cronometro(f"plano_{tipo}"):
+                if tipo == 'excluir':
+                    backend.excluir_onde_em(operacao['tabela'], operacao['coluna'], operacao['filtro'])
+                    linhas = len(operacao['filtro'])
+                elif tipo == 'upsert':
+                    backend.upsert(operacao['tabela'], operacao['linhas'], operacao['conflito'])
+                    linhas = len(operacao['linhas'])
+                elif tipo == 'atualizar':
+                    backend.atualizar_onde_em(operacao['tabela'], operacao['valores'], operacao['coluna'], operacao['filtro'])
+                    linhas = len(operacao['filtro'])
+                elif tipo == 'recalcular_agregados':
+                    backend.recalcular_agregados(operacao['chaves'])
+                    linhas = len(operacao['chaves'])
+                else:
+                    raise ValueError(f"operação desconhecida: {tipo}")
+            totais['operacoes'] += 1
+            totais['linhas'] += linhas
+            metricas.detalhe(f"    ✅ [{n:3d}/{len(operacoes)}] {tipo} {operacao.get('tabela', 'boletins_cav_agregado')}: {linhas} registros")
+        except Exception as e:
+            totais['erros'] += 1
+            print(f"    ❌ [{n:3d}/{len(operacoes)}] Erro em {tipo} {operacao.get('tabela', 'boletins_cav_agregado')}: {e}")
+        metricas.progresso('operações do plano', n, len(operacoes))
+
+    print(f"✅ {totais['operacoes']} operação(ões) aplicada(s), {totais['linhas']} registros | ❌ Erros: {totais['erros']}")
+    return totais
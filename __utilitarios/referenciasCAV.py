@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Valores de referência usados na validação e na agregação dos boletins CAV
+
+Frentes (com a lâmina alvo de cada uma), setores e turnos válidos vêm das tabelas
+cav_frentes, cav_setores e cav_turnos, lidas uma vez por execução pela view cav_referencias
+(uma única consulta). O resultado fica em um cache local com validade; enquanto ele estiver
+válido para o mesmo destino, a importação não consulta o banco. Cadastrar uma nova frente
+é só um INSERT em cav_frentes, sem mudar o código: se a validação encontrar uma frente, setor
+ou turno desconhecido, as referências são relidas do banco uma vez (ReferenciasCAV.aceita)
+antes de a linha ser rejeitada, então um cadastro novo vale mesmo com o cache ainda válido.
+
+Se o banco não responder, usa o cache mesmo vencido e, por último, os valores padrão abaixo
+(os mesmos da migração que criou as tabelas).
+
+Variável de ambiente (também lida do .env.local):
+VALIDADE_CACHE_REFERENCIAS=900     # segundos de validade do cache (0 = sempre consulta o banco)
+"""
+
+import os
+import json
+import time
+import hashlib
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+LAMINA_ALVO_PADRAO = 2.5
+
+# Cache das referências, ao lado dos scripts
+ARQUIVO_CACHE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_referencias_cav.json')
+
+# Validade padrão do cache: 15 minutos
+VALIDADE_CACHE_PADRAO = 15 * 60
+
+# View que junta frentes, setores e turnos ativos: (tipo, codigo, lamina_alvo)
+VIEW_REFERENCIAS = 'cav_referencias'
+LIMITE_REFERENCIAS = 1000
+
+# Complemento das mensagens de frente, setor ou turno inválido
+DICA_REFERENCIA_DESCONHECIDA = ("valor não cadastrado no banco, ou cache de referências desatualizado: "
+                                "apague cache_referencias_cav.json ou use VALIDADE_CACHE_REFERENCIAS=0")
+
+# Atributo de ReferenciasCAV com os valores válidos de cada tipo
+CONJUNTOS_POR_TIPO = {'frente': 'frentes', 'setor': 'setores', 'turno': 'turnos'}
+
+class ReferenciasCAV:
+    """Frentes, setores e turnos válidos (frozensets) e a lâmina alvo de cada frente"""
+
+    def __init__(self, laminas_por_frente: Dict[str, float], setores: Iterable[str], turnos: Iterable[str]):
+        self.laminas = dict(laminas_por_frente)
+        self.frentes = frozenset(self.laminas)
+        self.setores = frozenset(setores)
+        self.turnos = frozenset(turnos)
+        # Vieram do cache local (carregar_referencias), e não de uma leitura do banco nesta execução
+        self.do_cache = False
+        # Releitura do banco (carregar_referencias), feita no máximo uma vez
+        self._recarregar: Optional[Callable[[], Optional['ReferenciasCAV']]] = None
+
+    def __getstate__(self):
+        # A releitura depende da conexão do processo que carregou as referências
+        estado = dict(self.__dict__)
+        estado['_recarregar'] = None
+        return estado
+
+    def recarregar(self) -> bool:
+        """
+        Relê as referências do banco, sem o cache, e atualiza este objeto. Só acontece uma vez
+        (e nunca nos valores padrão); retorna True se algum valor mudou.
+        """
+
+        recarregar, self._recarregar = self._recarregar, None
+        if recarregar is None:
+            return False
+        novas = recarregar()
+        if novas is None:
+            return False
+        self.do_cache = False
+        if novas.para_linhas() == self.para_linhas():
+            return False
+        self.laminas, self.frentes, self.setores, self.turnos = novas.laminas, novas.frentes, novas.setores, novas.turnos
+        return True
+
+    def aceita(self, tipo: str, valor: str) -> bool:
+        """Se `valor` é uma frente, setor ou turno (`tipo`) válido; se não for, relê o banco uma vez e confere de novo"""
+
+        conjunto = CONJUNTOS_POR_TIPO[tipo]
+        return valor in getattr(self, conjunto) or (self.recarregar() and valor in getattr(self, conjunto))
+
+    def lamina_alvo(self, frente: str) -> float:
+        return self.laminas.get(frente, LAMINA_ALVO_PADRAO)
+
+    @classmethod
+    def de_linhas(cls, linhas: Iterable[Dict[str, Any]]) -> 'ReferenciasCAV':
+        """Monta as referências a partir das linhas da view cav_referencias"""
+
+        laminas, setores, turnos = {}, [], []
+        for linha in linhas:
+            if linha['tipo'] == 'frente':
+                lamina = linha.get('lamina_alvo')
+                laminas[linha['codigo']] = float(lamina) if lamina is not None else LAMINA_ALVO_PADRAO
+            elif linha['tipo'] == 'setor':
+                setores.append(linha['codigo'])
+            elif linha['tipo'] == 'turno':
+                turnos.append(linha['codigo'])
+        return cls(laminas, setores, turnos)
+
+    def para_linhas(self) -> List[Dict[str, Any]]:
+        return ([{'tipo': 'frente', 'codigo': frente, 'lamina_alvo': lamina} for frente, lamina in sorted(self.laminas.items())]
+                + [{'tipo': 'setor', 'codigo': setor, 'lamina_alvo': None} for setor in sorted(self.setores)]
+                + [{'tipo': 'turno', 'codigo': turno, 'lamina_alvo': None} for turno in sorted(self.turnos)])
+
+    def impressao(self) -> str:
+        """Hash SHA-1 das referências (muda se qualquer frente, lâmina, setor ou turno mudar)"""
+
+        return hashlib.sha1(json.dumps(self.para_linhas(), sort_keys=True).encode()).hexdigest()
+
+# Valores usados quando nem o banco nem o cache estão disponíveis
+REFERENCIAS_PADRAO = ReferenciasCAV(
+    {frente: LAMINA_ALVO_PADRAO for frente in ('Frente 1', 'Frente 2', 'Frente 3', 'Iturama', 'Ouroeste')},
+    ('GUA', 'MOE', 'ALE'),
+    ('A', 'B', 'C'),
+)
+
+def _ler_cache(arquivo_cache: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(arquivo_cache, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+def _gravar_cache(arquivo_cache: str, destino: str, referencias: ReferenciasCAV):
+    try:
+        with open(arquivo_cache, 'w', encoding='utf-8') as arquivo:
+            json.dump({'destino': destino, 'gravado_em': time.time(), 'linhas': referencias.para_linhas()},
+                      arquivo, ensure_ascii=False, indent=2)
+    except OSError as e:
+        print(f"⚠️  Não foi possível gravar o cache de referências: {e}")
+
+def _ler_do_banco(backend: Any) -> ReferenciasCAV:
+    """Lê a view cav_referencias; levanta exceção se falhar ou se faltar algum tipo de valor"""
+
+    linhas = backend.buscar_pagina(VIEW_REFERENCIAS, 'tipo,codigo,lamina_alvo', 'codigo', None, LIMITE_REFERENCIAS)
+    referencias = ReferenciasCAV.de_linhas(linhas)
+    if not (referencias.frentes and referencias.setores and referencias.turnos):
+        raise ValueError("frentes, setores ou turnos sem nenhum valor ativo")
+    return referencias
+
+def _reler_do_banco(backend: Any, arquivo_cache: str, destino: str) -> Optional[ReferenciasCAV]:
+    """Releitura usada por ReferenciasCAV.recarregar: lê o banco e atualiza o cache; None se falhar"""
+
+    try:
+        referencias = _ler_do_banco(backend)
+    except Exception as e:
+        print(f"⚠️  Não foi possível reler {VIEW_REFERENCIAS} ({e})")
+        return None
+    _gravar_cache(arquivo_cache, destino, referencias)
+    print(f"📚 Referências relidas do banco: {len(referencias.frentes)} frentes, {len(referencias.setores)} setores, {len(referencias.turnos)} turnos")
+    return referencias
+
+def carregar_referencias(backend: Any, arquivo_cache: str = ARQUIVO_CACHE_PADRAO, validade: Optional[float] = None) -> ReferenciasCAV:
+    """
+    Retorna as referências do destino do `backend` (BackendArmazenamento): do cache, se ainda
+    válido, ou da view cav_referencias, atualizando o cache. Em caso de falha, usa o cache
+    vencido ou os valores padrão. As referências devolvidas (exceto os valores padrão) podem
+    ser relidas do banco uma vez durante a validação (ReferenciasCAV.aceita).
+    """
+
+    if validade is None:
+        validade = float(os.getenv('VALIDADE_CACHE_REFERENCIAS') or VALIDADE_CACHE_PADRAO)
+    destino = backend.destino_checkpoint or backend.descricao
+
+    cache = _ler_cache(arquivo_cache)
+    if cache is not None and cache.get('destino') != destino:
+        cache = None
+    reler = partial(_reler_do_banco, backend, arquivo_cache, destino)
+
+    if cache is not None and time.time() - cache.get('gravado_em', 0) < validade:
+        referencias = ReferenciasCAV.de_linhas(cache['linhas'])
+        referencias.do_cache = True
+        referencias._recarregar = reler
+        print(f"📚 Referências do cache: {len(referencias.frentes)} frentes, {len(referencias.setores)} setores, {len(referencias.turnos)} turnos")
+        return referencias
+
+    try:
+        referencias = _ler_do_banco(backend)
+    except Exception as e:
+        if cache is not None:
+            print(f"⚠️  Não foi possível ler {VIEW_REFERENCIAS} ({e}); usando o cache anterior")
+            referencias = ReferenciasCAV.de_linhas(cache['linhas'])
+            referencias.do_cache = True
+            referencias._recarregar = reler
+            return referencias
+        print(f"⚠️  Não foi possível ler {VIEW_REFERENCIAS} ({e}); usando os valores padrão")
+        return REFERENCIAS_PADRAO
+
+    _gravar_cache(arquivo_cache, destino, referencias)
+    referencias._recarregar = reler
+    print(f"📚 Referências do banco: {len(referencias.frentes)} frentes, {len(referencias.setores)} setores, {len(referencias.turnos)} turnos")
+    return referencias
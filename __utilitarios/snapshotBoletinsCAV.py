@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Snapshot local (Parquet) dos boletins CAV gravados pelos importadores
+
+Os boletins que cada importação grava no banco também vão para um dataset Parquet local,
+particionado por data e frente (data=AAAA-MM-DD/frente=.../*.parquet). Conferir o que foi
+carregado em uma data ou frente, ou recalcular agregados a partir desses boletins, vira uma
+leitura local, só das partições pedidas, em vez de paginar boletins_cav pela API:
+
+    snapshot = abrir_snapshot(backend)
+    snapshot.resumo('2024-05-01', '2024-05-31', ['Frente 1'])
+    agregar_boletins(snapshot.boletins('2024-05-01', '2024-05-31'), referencias)
+
+- Um snapshot por destino (Supabase, SQLite de dry-run, Postgres direto), cada um em uma
+  subpasta: um ensaio local não se mistura aos dados de produção.
+- Os boletins ficam em memória durante a importação e são gravados no fim dela (ou a cada
+  LIMITE_PENDENTES boletins), um arquivo por partição, em vez de um arquivo minúsculo por lote.
+  Cada arquivo é escrito com outro nome e renomeado, então a leitura nunca vê um arquivo pela metade.
+- A leitura usa memory-map e só abre as partições do filtro. Um boletim gravado mais de uma vez
+  aparece uma única vez (vale a gravação mais recente do mesmo hash_boletim).
+- O snapshot é um cache: uma falha ao gravá-lo é informada e não interrompe a importação.
+  Só contém o que passou pelos importadores desta máquina; boletins lançados por outra via
+  (ou já gravados antes do snapshot existir) não aparecem nele.
+
+Requisitos:
+pip install pyarrow
+
+Variável de ambiente (também lida do .env.local pelos scripts):
+SNAPSHOT_BOLETINS_CAV=/caminho/para/pasta   # grava o snapshot das importações nesta pasta
+
+Uso (pela linha de comando de importação):
+python importacao.py boletins /dados/cav/ --sim --snapshot
+python importacao.py snapshot --de 2024-05-01 --ate 2024-05-31 --frente "Frente 1" --agregados
+"""
+
+import os
+import re
+import time
+import uuid
+from urllib.parse import quote
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from instrumentacao import metricas
+from armazenamento import BackendArmazenamento
+
+# Módulos do pyarrow, importados só quando um snapshot é aberto (_carregar_pyarrow): o import custa
+# cerca de 90 MB de memória e meio segundo, que as importações sem snapshot não precisam pagar
+pa = pc = ds = pq = fs = None
+
+# Pasta padrão dos snapshots, ao lado dos scripts
+PASTA_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshot_boletins_cav')
+
+# Boletins em memória antes de gravar as partições
+LIMITE_PENDENTES = 100000
+
+# Colunas dos arquivos: as de boletins_cav enviadas pelo importador, o id devolvido pelo banco
+# (texto: uuid no Supabase, inteiro no SQLite) e o instante da gravação; data e frente ficam no caminho
+COLUNAS_ARQUIVO = (
+    ('id', 'string'), ('codigo', 'string'), ('setor', 'string'), ('frota', 'int64'), ('turno', 'string'),
+    ('operador', 'string'), ('producao', 'float64'), ('observacoes', 'string'), ('lamina_alvo', 'float64'),
+    ('hash_boletim', 'string'), ('gravado_em', 'int64'),
+)
+COLUNAS_PARTICAO = (('data', 'string'), ('frente', 'string'))
+
+def _carregar_pyarrow():
+    """Importa o pyarrow na primeira vez que é usado; ImportError com a instrução de instalação se faltar"""
+
+    global pa, pc, ds, pq, fs
+    if pa is not None:
+        return
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.parquet
+        import pyarrow.fs
+    except ImportError:
+        raise ImportError("O snapshot local requer o pyarrow: pip install pyarrow") from None
+    pa, pc, ds, pq, fs = pyarrow, pyarrow.compute, pyarrow.dataset, pyarrow.parquet, pyarrow.fs
+
+def _esquema(colunas: Sequence[Tuple[str, str]]) -> 'pa.Schema':
+    return pa.schema([(nome, pa.type_for_alias(tipo)) for nome, tipo in colunas])
+
+def _sem_repetidos(tabela: 'pa.Table') -> 'pa.Table':
+    """Uma linha por hash_boletim: a de gravado_em mais recente"""
+
+    if tabela.num_rows == 0 or pc.count_distinct(tabela['hash_boletim']).as_py() == tabela.num_rows:
+        return tabela
+    tabela = tabela.sort_by([('gravado_em', 'descending')])
+    tabela = tabela.append_column('_ordem', pa.array(range(tabela.num_rows), pa.int64()))
+    primeiras = tabela.group_by('hash_boletim', use_threads=False).aggregate([('_ordem', 'min')])
+    return tabela.take(pc.sort_indices(primeiras['_ordem_min'])).drop_columns(['_ordem'])
+
+class SnapshotBoletins:
+    """Dataset Parquet local dos boletins gravados em um destino, particionado por data e frente"""
+
+    def __init__(self, pasta: str, destino: Optional[str] = None):
+        _carregar_pyarrow()
+        self.destino = destino or 'supabase'
+        self.pasta = os.path.join(os.path.abspath(pasta), re.sub(r'[^0-9A-Za-z.-]+', '_', self.destino).strip('_'))
+        self.esquema_arquivo = _esquema(COLUNAS_ARQUIVO)
+        self.esquema_particao = _esquema(COLUNAS_PARTICAO)
+        self.esquema = pa.unify_schemas([self.esquema_arquivo, self.esquema_particao])
+        self._pendentes: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._quantidade_pendentes = 0
+
+    # --- Gravação -------------------------------------------------------------
+
+    def gravar(self, boletins: Iterable[Dict[str, Any]]):
+        """Guarda boletins gravados no banco (linhas de _preparar_boletim_insert, com o id, se houver)"""
+
+        for boletim in boletins:
+            linha = {nome: boletim.get(nome) for nome, _ in COLUNAS_ARQUIVO}
+            if linha['id'] is not None:
+                linha['id'] = str(linha['id'])
+            self._pendentes.setdefault((boletim['data'], boletim['frente']), []).append(linha)
+            self._quantidade_pendentes += 1
+        if self._quantidade_pendentes >= LIMITE_PENDENTES:
+            self.descarregar()
+
+    def descarregar(self):
+        """Grava os boletins pendentes, um arquivo por partição (data, frente)"""
+
+        if not self._pendentes:
+            return
+        gravado_em = time.time_ns()
+        quantidade = self._quantidade_pendentes
+        try:
+            with metricas.cronometro('gravacao_snapshot'):
+                for (data, frente), linhas in self._pendentes.items():
+                    pasta = os.path.join(self.pasta, f"data={data}", f"frente={quote(frente, safe='')}")
+                    os.makedirs(pasta, exist_ok=True)
+                    for linha in linhas:
+                        linha['gravado_em'] = gravado_em
+                    nome = f"{gravado_em}-{uuid.uuid4().hex[:8]}.parquet"
+                    # Arquivos começados por "." são ignorados na leitura até a troca de nome
+                    temporario = os.path.join(pasta, f".{nome}.tmp")
+                    pq.write_table(pa.Table.from_pylist(linhas, schema=self.esquema_arquivo), temporario)
+                    os.replace(temporario, os.path.join(pasta, nome))
+            metricas.contar('boletins_snapshot', quantidade)
+        except (OSError, pa.ArrowException) as e:
+            print(f"⚠️  Não foi possível gravar {quantidade} boletins no snapshot local ({self.pasta}): {e}")
+        finally:
+            self._pendentes = {}
+            self._quantidade_pendentes = 0
+
+    # --- Leitura --------------------------------------------------------------
+
+    def ler(self, data_inicial: Optional[str] = None, data_final: Optional[str] = None,
+            frentes: Optional[Sequence[str]] = None, colunas: Optional[Sequence[str]] = None) -> 'pa.Table':
+        """
+        Tabela Arrow dos boletins entre as datas (inclusive; None = sem limite) e das frentes
+        pedidas (None = todas), ordenada por data, frente, codigo e setor
+        """
+
+        if not os.path.isdir(self.pasta):
+            tabela = self.esquema.empty_table()
+        else:
+            conjunto = ds.dataset(self.pasta, schema=self.esquema, format='parquet',
+                                  partitioning=ds.partitioning(self.esquema_particao, flavor='hive'),
+                                  filesystem=fs.LocalFileSystem(use_mmap=True))
+            filtro = None
+            for condicao in (
+                ds.field('data') >= data_inicial if data_inicial else None,
+                ds.field('data') <= data_final if data_final else None,
+                ds.field('frente').isin(list(frentes)) if frentes else None,
+            ):
+                if condicao is not None:
+                    filtro = condicao if filtro is None else filtro & condicao
+            with metricas.cronometro('leitura_snapshot'):
+                tabela = conjunto.to_table(filter=filtro)
+
+        tabela = _sem_repetidos(tabela).sort_by([('data', 'ascending'), ('frente', 'ascending'),
+                                                  ('codigo', 'ascending'), ('setor', 'ascending'),
+                                                  ('gravado_em', 'ascending')])
+        return tabela.select(list(colunas)) if colunas else tabela
+
+    def boletins(self, data_inicial: Optional[str] = None, data_final: Optional[str] = None,
+                 frentes: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Boletins do filtro como dicionários, no formato aceito por AgregadorBoletins/agregar_boletins"""
+
+        for lote in self.ler(data_inicial, data_final, frentes).to_batches():
+            yield from lote.to_pylist()
+
+    def resumo(self, data_inicial: Optional[str] = None, data_final: Optional[str] = None,
+               frentes: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """[{data, frente, boletins, producao}] por data e frente: o que foi carregado em cada partição"""
+
+        tabela = self.ler(data_inicial, data_final, frentes, colunas=('data', 'frente', 'producao'))
+        totais = tabela.group_by(['data', 'frente']).aggregate([('producao', 'count'), ('producao', 'sum')])
+        return sorted(
+            ({'data': linha['data'], 'frente': linha['frente'], 'boletins': linha['producao_count'],
+              'producao': round(linha['producao_sum'] or 0, 2)} for linha in totais.to_pylist()),
+            key=lambda linha: (linha['data'], linha['frente'])
+        )
+
+def abrir_snapshot(backend: BackendArmazenamento, pasta: Optional[str] = None) -> Optional[SnapshotBoletins]:
+    """Snapshot do destino do backend na pasta indicada (ou em SNAPSHOT_BOLETINS_CAV); None se nenhuma"""
+
+    pasta = pasta or os.getenv('SNAPSHOT_BOLETINS_CAV')
+    return SnapshotBoletins(pasta, backend.destino_checkpoint) if pasta else None
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Motor colunar de validação e normalização dos boletins CAV
+
+Em vez de validar o CSV linha a linha, cada bloco de linhas é transposto em colunas e as
+regras (campos obrigatórios, setor/frente/turno válidos, datas e números) são aplicadas
+coluna a coluna. Datas, frotas e produções são convertidas uma única vez por valor
+distinto, o que torna a validação desprezível perto do I/O em arquivos grandes.
+
+Linhas rejeitadas (ou irregulares) são repassadas ao validador linha a linha, de forma que
+o relatório de rejeições tenha exatamente as mesmas mensagens, na mesma ordem.
+"""
+
+import math
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable, Iterable
+
+# Campos lidos do CSV de boletins
+CAMPOS = ('data', 'codigo', 'frente', 'setor', 'frota', 'turno', 'operador', 'producao', 'observacoes')
+
+def _normalizar_data(data: str) -> Optional[str]:
+    """Mesma regra do validador linha a linha: dd/MM/yyyy vira ISO, yyyy-MM-dd é apenas validada"""
+
+    try:
+        if '/' in data:
+            return datetime.strptime(data, '%d/%m/%Y').strftime('%Y-%m-%d')
+        if '-' in data and len(data) == 10:
+            datetime.strptime(data, '%Y-%m-%d')
+            return data
+    except ValueError:
+        pass
+    return None
+
+def _converter_producao(valor: str) -> float:
+    """Produção aceita pelo banco (producao >= 0); as demais são rejeitadas como as não numéricas"""
+
+    producao = float(valor)
+    if not math.isfinite(producao) or producao < 0:
+        raise ValueError(f"Produção inválida: {valor}")
+    return producao
+
+def _converter_distintos(valores: Iterable[str], conversor: Callable[[str], Any]) -> Dict[str, Any]:
+    """Converte cada valor distinto uma única vez; falhas de conversão viram None"""
+
+    convertidos = {}
+    for valor in set(valores):
+        try:
+            convertidos[valor] = conversor(valor)
+        except (ValueError, TypeError):
+            convertidos[valor] = None
+    return convertidos
+
+def _normalizar_colunas(colunas: Dict[str, List[str]]) -> Dict[str, List[Any]]:
+    """Normaliza as colunas de texto (strip/upper) de uma só vez"""
+
+    return {
+        'data': [v.strip() for v in colunas['data']],
+        'codigo': [v.strip() for v in colunas['codigo']],
+        'frente': [v.strip() for v in colunas['frente']],
+        'setor': [v.strip().upper() for v in colunas['setor']],
+        'turno': [v.strip().upper() for v in colunas['turno']],
+        'operador': [v.strip() for v in colunas['operador']],
+        'frota_vazia': [not v.strip() for v in colunas['frota']],
+        'producao_vazia': [not v.strip() for v in colunas['producao']],
+    }
+
+def _mascara_aceitos(normalizadas: Dict[str, List[Any]], datas: Dict[str, Optional[str]],
+                     frotas: Dict[str, Any], producoes: Dict[str, Any],
+                     colunas: Dict[str, List[str]], setores_validos: frozenset,
+                     frentes_validas: frozenset, turnos_validos: frozenset) -> List[bool]:
+    """Linhas que passam em todas as regras (qualquer falha é delegada ao validador linha a linha)"""
+
+    return [
+        codigo != '' and setor in setores_validos and frente in frentes_validas
+        and turno in turnos_validos
+        and datas[data] is not None
+        and not frota_vazia and frotas[frota] is not None
+        and (producao_vazia or producoes[producao] is not None)
+        for codigo, setor, frente, turno, data, frota_vazia, frota, producao_vazia, producao in zip(
+            normalizadas['codigo'], normalizadas['setor'], normalizadas['frente'], normalizadas['turno'],
+            normalizadas['data'], normalizadas['frota_vazia'], colunas['frota'],
+            normalizadas['producao_vazia'], colunas['producao'])
+    ]
+
+def validar_bloco(cabecalho: List[str], linhas: List[List[str]], primeira_linha: int,
+                  setores_validos: frozenset, frentes_validas: frozenset, turnos_validos: frozenset,
+                  validar_linha: Callable[[int, Dict[str, Any]], Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Valida um bloco de linhas cruas do csv.reader (sem linhas em branco) e retorna os boletins
+    aceitos, na ordem do arquivo. `primeira_linha` é o número (base 1) da primeira linha do bloco,
+    contado como no csv.DictReader. Linhas irregulares ou rejeitadas são enviadas a
+    `validar_linha`, que gera a mesma mensagem de rejeição do modo linha a linha.
+    """
+
+    # Mesma semântica do csv.DictReader: a última coluna com o mesmo nome prevalece
+    posicoes = {}
+    for indice, nome in enumerate(cabecalho):
+        posicoes[nome] = indice
+
+    def como_dict(linha: List[str]) -> Dict[str, Any]:
+        registro = dict(zip(cabecalho, linha))
+        if len(linha) > len(cabecalho):
+            registro[None] = linha[len(cabecalho):]
+        for nome in cabecalho[len(linha):]:
+            registro[nome] = None
+        return registro
+
+    # Linhas com quantidade de campos diferente do cabeçalho seguem pelo validador linha a linha
+    if all(len(linha) == len(cabecalho) for linha in linhas):
+        regulares = linhas
+    else:
+        regulares = [linha for linha in linhas if len(linha) == len(cabecalho)]
+
+    transposta = list(zip(*regulares)) if regulares else [()] * len(cabecalho)
+    colunas = {}
+    for nome in CAMPOS:
+        if nome in posicoes:
+            colunas[nome] = transposta[posicoes[nome]]
+        elif nome == 'observacoes':
+            colunas[nome] = (None,) * len(regulares)
+        else:
+            colunas[nome] = ('',) * len(regulares)
+
+    normalizadas = _normalizar_colunas(colunas)
+    datas = {data: _normalizar_data(data) if data else None for data in set(normalizadas['data'])}
+    frotas = _converter_distintos(colunas['frota'], int)
+    producoes = _converter_distintos(colunas['producao'], _converter_producao)
+    aceitos = _mascara_aceitos(normalizadas, datas, frotas, producoes, colunas,
+                               setores_validos, frentes_validas, turnos_validos)
+
+    # Valores finais de cada linha regular, na ordem do bloco
+    valores = zip(
+        aceitos,
+        [datas[data] for data in normalizadas['data']],
+        normalizadas['codigo'],
+        normalizadas['frente'],
+        normalizadas['setor'],
+        [None if vazia else frotas[frota] for vazia, frota in zip(normalizadas['frota_vazia'], colunas['frota'])],
+        normalizadas['turno'],
+        normalizadas['operador'],
+        [0.0 if vazia else producoes[producao] for vazia, producao in zip(normalizadas['producao_vazia'], colunas['producao'])],
+        [observacoes.strip() if observacoes else None for observacoes in colunas['observacoes']]
+    )
+
+    boletins = []
+    for indice, linha in enumerate(linhas):
+        if len(linha) == len(cabecalho):
+            aceito, *campos = next(valores)
+            if aceito:
+                boletins.append(dict(zip(CAMPOS, campos)))
+                continue
+
+        boletim = validar_linha(primeira_linha + indice, como_dict(linha))
+        if boletim is not None:
+            boletins.append(boletim)
+
+    return boletins
@@ -0,0 +1,97 @@
+-- Migração para mover os valores válidos do CAV (frentes, setores, turnos) para tabelas de referência
+-- Data: 2025-02-01
+-- Descrição: Cria cav_frentes (com a lâmina alvo de cada frente), cav_setores e cav_turnos,
+--            troca os CHECKs fixos de frente/setor/turno por chaves estrangeiras e expõe tudo
+--            na view cav_referencias, lida em uma única consulta pelos importadores.
+--            Para cadastrar uma nova frente basta um INSERT em cav_frentes.
+
+-- 1️⃣ Tabelas de referência
+CREATE TABLE IF NOT EXISTS cav_frentes (
+    nome VARCHAR(50) PRIMARY KEY,
+    lamina_alvo NUMERIC(5,2) NOT NULL DEFAULT 2.5 CHECK (lamina_alvo > 0),
+    ativo BOOLEAN NOT NULL DEFAULT true,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS cav_setores (
+    codigo VARCHAR(10) PRIMARY KEY,
+    nome VARCHAR(50),
+    ativo BOOLEAN NOT NULL DEFAULT true,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS cav_turnos (
+    codigo CHAR(1) PRIMARY KEY,
+    ativo BOOLEAN NOT NULL DEFAULT true,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL
+);
+
+-- 2️⃣ Valores atuais (os mesmos dos CHECKs e a lâmina padrão de 2.5)
+INSERT INTO cav_frentes (nome, lamina_alvo) VALUES
+    ('Frente 1', 2.5), ('Frente 2', 2.5), ('Frente 3', 2.5), ('Iturama', 2.5), ('Ouroeste', 2.5)
+ON CONFLICT (nome) DO NOTHING;
+
+INSERT INTO cav_setores (codigo, nome) VALUES
+    ('GUA', 'Guarani'), ('MOE', 'Moema'), ('ALE', 'Alegria')
+ON CONFLICT (codigo) DO NOTHING;
+
+INSERT INTO cav_turnos (codigo) VALUES ('A'), ('B'), ('C')
+ON CONFLICT (codigo) DO NOTHING;
+
+-- 3️⃣ Troca os CHECKs fixos por chaves estrangeiras
+ALTER TABLE boletins_cav DROP CONSTRAINT IF EXISTS check_frente_values;
+ALTER TABLE boletins_cav DROP CONSTRAINT IF EXISTS boletins_cav_setor_check;
+ALTER TABLE boletins_cav DROP CONSTRAINT IF EXISTS boletins_cav_turno_check;
+ALTER TABLE boletins_cav_agregado DROP CONSTRAINT IF EXISTS check_frente_values_agregado;
+ALTER TABLE boletins_cav_agregado DROP CONSTRAINT IF EXISTS boletins_cav_agregado_setor_check;
+
+ALTER TABLE boletins_cav
+ADD CONSTRAINT boletins_cav_frente_fkey FOREIGN KEY (frente) REFERENCES cav_frentes(nome) ON UPDATE CASCADE,
+ADD CONSTRAINT boletins_cav_setor_fkey FOREIGN KEY (setor) REFERENCES cav_setores(codigo) ON UPDATE CASCADE,
+ADD CONSTRAINT boletins_cav_turno_fkey FOREIGN KEY (turno) REFERENCES cav_turnos(codigo) ON UPDATE CASCADE;
+
+ALTER TABLE boletins_cav_agregado
+ADD CONSTRAINT boletins_cav_agregado_frente_fkey FOREIGN KEY (frente) REFERENCES cav_frentes(nome) ON UPDATE CASCADE,
+ADD CONSTRAINT boletins_cav_agregado_setor_fkey FOREIGN KEY (setor) REFERENCES cav_setores(codigo) ON UPDATE CASCADE;
+
+-- 4️⃣ View única lida pelos importadores (apenas valores ativos)
+CREATE OR REPLACE VIEW cav_referencias AS
+    SELECT 'frente'::text AS tipo, nome::text AS codigo, lamina_alvo FROM cav_frentes WHERE ativo
+    UNION ALL
+    SELECT 'setor'::text, codigo::text, NULL::numeric FROM cav_setores WHERE ativo
+    UNION ALL
+    SELECT 'turno'::text, codigo::text, NULL::numeric FROM cav_turnos WHERE ativo;
+
+-- 5️⃣ Triggers para updated_at
+CREATE TRIGGER update_cav_frentes_updated_at
+    BEFORE UPDATE ON cav_frentes
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_cav_setores_updated_at
+    BEFORE UPDATE ON cav_setores
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_cav_turnos_updated_at
+    BEFORE UPDATE ON cav_turnos
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- 6️⃣ RLS (Row Level Security)
+ALTER TABLE cav_frentes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE cav_setores ENABLE ROW LEVEL SECURITY;
+ALTER TABLE cav_turnos ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "cav_frentes_select" ON cav_frentes FOR SELECT USING (auth.role() = 'authenticated');
+CREATE POLICY "cav_setores_select" ON cav_setores FOR SELECT USING (auth.role() = 'authenticated');
+CREATE POLICY "cav_turnos_select" ON cav_turnos FOR SELECT USING (auth.role() = 'authenticated');
+
+-- 7️⃣ Comentários
+COMMENT ON TABLE cav_frentes IS 'Frentes operacionais válidas do CAV e a lâmina alvo de cada uma';
+COMMENT ON TABLE cav_setores IS 'Setores operacionais válidos do CAV: GUA (Guarani), MOE (Moema), ALE (Alegria)';
+COMMENT ON TABLE cav_turnos IS 'Turnos válidos dos boletins CAV';
+COMMENT ON VIEW cav_referencias IS 'Frentes, setores e turnos ativos (tipo, codigo, lamina_alvo) para os importadores';
@@ -0,0 +1,111 @@
+-- Migração para recalcular boletins_cav_agregado no banco a partir de boletins_cav
+-- Data: 2025-02-02
+-- Descrição: Cria a função recalcular_agregados_cav, chamada via RPC pelos importadores.
+--            Recebe as chaves (data, frente, codigo, setor) afetadas por uma importação e,
+--            em um único comando, recalcula os agregados dessas chaves a partir de TODOS os
+--            boletins granulares gravados, com as mesmas fórmulas de calcular_agregados_por_total
+--            (atualizarBoletinsCAV.py) e a lâmina alvo da frente em cav_frentes.
+--            Chaves que não têm mais boletins granulares perdem o agregado: as chaves órfãs são
+--            separadas primeiro (normalmente nenhuma) e só elas são buscadas no agregado, para que
+--            uma carga grande não leia o agregado de cada chave recebida.
+--            dif_viagens_perc e dif_lamina_perc passam de NUMERIC(5,2) para NUMERIC(10,2): com estas
+--            fórmulas e a lâmina alvo padrão (2,5) a diferença de viagens passa de 1000%, e a
+--            gravação do agregado falhava com "numeric field overflow".
+
+ALTER TABLE boletins_cav_agregado
+    ALTER COLUMN dif_viagens_perc TYPE NUMERIC(10,2),
+    ALTER COLUMN dif_lamina_perc TYPE NUMERIC(10,2);
+
+CREATE OR REPLACE FUNCTION recalcular_agregados_cav(
+    p_chaves jsonb  -- [{"data": "2024-05-01", "frente": "Frente 1", "codigo": "C1", "setor": "GUA"}, ...]
+) RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_gravados integer;
+BEGIN
+    -- 1. Agregados das chaves com boletins granulares (fórmulas de calcular_agregados_por_total)
+    WITH chaves AS (
+        SELECT DISTINCT (c->>'data')::date AS data, c->>'frente' AS frente, c->>'codigo' AS codigo, c->>'setor' AS setor
+        FROM jsonb_array_elements(p_chaves) AS c
+    ),
+    grupos AS (
+        SELECT
+            b.data, b.frente, b.codigo, b.setor,
+            SUM(b.producao) AS total_producao,
+            COALESCE(MAX(f.lamina_alvo), 2.5) AS lamina_alvo,
+            jsonb_build_object('uuids', jsonb_agg(b.id ORDER BY b.id)) AS registros_granulares
+        FROM boletins_cav b
+        JOIN chaves k
+          ON b.data = k.data AND b.frente = k.frente AND b.codigo = k.codigo AND b.setor = k.setor
+        LEFT JOIN cav_frentes f ON f.nome = b.frente
+        GROUP BY b.data, b.frente, b.codigo, b.setor
+    ),
+    viagens AS (
+        SELECT
+            g.*,
+            g.total_producao * 0.5 AS total_viagens_feitas,
+            g.total_producao * g.lamina_alvo / 60 AS total_viagens_orcadas
+        FROM grupos g
+    ),
+    calculados AS (
+        SELECT
+            v.*,
+            CASE WHEN v.total_producao > 0 THEN v.total_viagens_feitas * 60 / v.total_producao ELSE 0 END AS lamina_aplicada
+        FROM viagens v
+    )
+    INSERT INTO boletins_cav_agregado (
+        data, frente, codigo, setor,
+        total_producao, total_viagens_feitas, total_viagens_orcadas, dif_viagens_perc,
+        lamina_alvo, lamina_aplicada, dif_lamina_perc, registros_granulares
+    )
+    SELECT
+        c.data, c.frente, c.codigo, c.setor,
+        ROUND(c.total_producao, 2),
+        ROUND(c.total_viagens_feitas, 2),
+        ROUND(c.total_viagens_orcadas, 2),
+        ROUND(CASE WHEN c.total_viagens_orcadas > 0
+                   THEN (c.total_viagens_feitas - c.total_viagens_orcadas) / c.total_viagens_orcadas * 100 ELSE 0 END, 2),
+        c.lamina_alvo,
+        ROUND(c.lamina_aplicada, 2),
+        ROUND(CASE WHEN c.lamina_alvo > 0 THEN (c.lamina_aplicada - c.lamina_alvo) / c.lamina_alvo * 100 ELSE 0 END, 2),
+        c.registros_granulares
+    FROM calculados c
+    ON CONFLICT (data, frente, codigo, setor) DO UPDATE SET
+        total_producao = EXCLUDED.total_producao,
+        total_viagens_feitas = EXCLUDED.total_viagens_feitas,
+        total_viagens_orcadas = EXCLUDED.total_viagens_orcadas,
+        dif_viagens_perc = EXCLUDED.dif_viagens_perc,
+        lamina_alvo = EXCLUDED.lamina_alvo,
+        lamina_aplicada = EXCLUDED.lamina_aplicada,
+        dif_lamina_perc = EXCLUDED.dif_lamina_perc,
+        registros_granulares = EXCLUDED.registros_granulares;
+
+    GET DIAGNOSTICS v_gravados = ROW_COUNT;
+
+    -- 2. Remove agregados de chaves que ficaram sem boletins granulares
+    WITH chaves AS (
+        SELECT DISTINCT (c->>'data')::date AS data, c->>'frente' AS frente, c->>'codigo' AS codigo, c->>'setor' AS setor
+        FROM jsonb_array_elements(p_chaves) AS c
+    ),
+    orfas AS MATERIALIZED (
+        SELECT k.*
+        FROM chaves k
+        WHERE NOT EXISTS (
+            SELECT 1 FROM boletins_cav b
+            WHERE b.data = k.data AND b.frente = k.frente AND b.codigo = k.codigo AND b.setor = k.setor
+        )
+    )
+    DELETE FROM boletins_cav_agregado a
+    USING orfas o
+    WHERE a.data = o.data AND a.frente = o.frente AND a.codigo = o.codigo AND a.setor = o.setor;
+
+    RETURN v_gravados;
+END;
+$$;
+
+-- Índice usado pelo JOIN com as chaves recalculadas
+CREATE INDEX IF NOT EXISTS idx_boletins_cav_chave_agregado ON boletins_cav(data, frente, codigo, setor);
+
+COMMENT ON FUNCTION recalcular_agregados_cav(jsonb) IS
+'Recalcula boletins_cav_agregado (upsert) para as chaves (data, frente, codigo, setor) informadas, a partir de boletins_cav. Retorna a quantidade de agregados gravados.';
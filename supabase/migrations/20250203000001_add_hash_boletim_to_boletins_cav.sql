@@ -0,0 +1,70 @@
+-- Migração para impedir boletins granulares duplicados em reimportações
+-- Data: 2025-02-03
+-- Descrição: Adiciona a coluna hash_boletim (SHA-256 de data, codigo, frente, setor, frota, turno,
+--            operador e producao, no mesmo formato de _hash_boletim em atualizarBoletinsCAV.py),
+--            preenche as linhas existentes e cria a constraint única usada pelo upsert
+--            (on_conflict=hash_boletim) dos importadores. Reimportar um CSV que se sobrepõe a um
+--            já importado deixa de duplicar a produção.
+
+-- 1. Adicionar a nova coluna
+ALTER TABLE boletins_cav
+ADD COLUMN IF NOT EXISTS hash_boletim TEXT;
+
+-- 2. Popular linhas existentes (campos separados por U+001F; producao com 2 casas)
+UPDATE boletins_cav
+SET hash_boletim = encode(
+    sha256(convert_to(
+        concat_ws(
+            chr(31),
+            to_char(data, 'YYYY-MM-DD'),
+            COALESCE(codigo, ''),
+            COALESCE(frente, ''),
+            COALESCE(setor, ''),
+            COALESCE(frota::text, ''),
+            COALESCE(turno, ''),
+            COALESCE(operador, ''),
+            to_char(producao, 'FM9999999990.00')
+        ),
+        'UTF8'
+    )),
+    'hex'
+)
+WHERE hash_boletim IS NULL;
+
+-- 3. Duplicatas já gravadas: a linha mais antiga (menor id) fica com o hash; as demais ficam
+--    sem hash (NULL não conflita na constraint única) e são apenas contadas para revisão manual
+DO $$
+DECLARE
+    duplicadas INTEGER;
+BEGIN
+    WITH repetidas AS (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY hash_boletim ORDER BY id) AS ordem
+        FROM boletins_cav
+        WHERE hash_boletim IS NOT NULL
+    )
+    UPDATE boletins_cav b
+    SET hash_boletim = NULL
+    FROM repetidas r
+    WHERE b.id = r.id AND r.ordem > 1;
+
+    GET DIAGNOSTICS duplicadas = ROW_COUNT;
+
+    RAISE NOTICE '=== RESULTADOS DA MIGRAÇÃO ===';
+    RAISE NOTICE 'Boletins duplicados encontrados (sem hash_boletim): %', duplicadas;
+END $$;
+
+-- 4. Constraint única usada pelo on_conflict das inserções em lote
+ALTER TABLE boletins_cav
+ADD CONSTRAINT boletins_cav_hash_boletim_key UNIQUE (hash_boletim);
+
+-- 5. Queries de verificação manual (comentadas, descomente para debug)
+/*
+-- Boletins duplicados deixados sem hash pela migração
+SELECT id, data, codigo, frente, setor, frota, turno, operador, producao, created_at
+FROM boletins_cav
+WHERE hash_boletim IS NULL
+ORDER BY data, frente, codigo;
+*/
+
+COMMENT ON COLUMN boletins_cav.hash_boletim IS
+'SHA-256 de data, codigo, frente, setor, frota, turno, operador e producao (separados por U+001F, producao com 2 casas). Identifica o boletim para que reimportações não dupliquem linhas.';
@@ -0,0 +1,22 @@
+-- Migração para guardar a utilização das frotas nos agregados de boletins CAV
+-- Data: 2025-02-05
+-- Descrição: Adiciona a boletins_cav_agregado as horas de motor, ociosas e de trabalho das frotas
+--            (arquivo de horas por frota do diário CAV: frota, h_motor, h_ociosa, h_trabalho),
+--            repartidas entre os grupos (data, frente, codigo, setor) pela produção de cada frota
+--            no grupo, e os indicadores derivados (hectares por hora de motor e % de motor ocioso).
+--            Preenchidas pela importação de boletins com --horas-frota; ficam NULL nos agregados
+--            importados sem o arquivo de horas.
+
+ALTER TABLE boletins_cav_agregado
+ADD COLUMN IF NOT EXISTS horas_motor NUMERIC(10,2),
+ADD COLUMN IF NOT EXISTS horas_ociosas NUMERIC(10,2),
+ADD COLUMN IF NOT EXISTS horas_trabalho NUMERIC(10,2),
+ADD COLUMN IF NOT EXISTS hectare_por_hora NUMERIC(10,2),
+ADD COLUMN IF NOT EXISTS motor_ocioso_perc NUMERIC(10,2);
+
+COMMENT ON COLUMN boletins_cav_agregado.horas_motor IS
+'Horas de motor das frotas do grupo, repartidas pela produção de cada frota no grupo (data, frota).';
+COMMENT ON COLUMN boletins_cav_agregado.hectare_por_hora IS
+'Produção das frotas com horas informadas dividida por horas_motor.';
+COMMENT ON COLUMN boletins_cav_agregado.motor_ocioso_perc IS
+'horas_ociosas / horas_motor * 100.';